@@ -11,3 +11,16 @@ SELECT
 FROM information_schema.tables
 WHERE table_schema = 'public'
 ORDER BY pg_total_relation_size(quote_ident(table_name)) DESC;
+
+-- =====================================================
+-- tails_2d (1 row / giải) vs draw_tails (1 row / kỳ, migration 05)
+-- =====================================================
+SELECT 'tails_2d' AS table_name,
+       count(*) AS row_count,
+       pg_size_pretty(pg_total_relation_size('public.tails_2d')) AS total_size
+FROM public.tails_2d
+UNION ALL
+SELECT 'draw_tails',
+       count(*),
+       pg_size_pretty(pg_total_relation_size('public.draw_tails'))
+FROM public.draw_tails;
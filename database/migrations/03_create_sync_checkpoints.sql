@@ -0,0 +1,29 @@
+-- Migration: 03_create_sync_checkpoints.sql
+-- Checkpoint cho các bước sync tăng dần (vd build_tails: lottery_draws → tails_2d)
+-- và view anti-join tìm các kỳ chưa có tails_2d ngay trên server.
+
+CREATE TABLE IF NOT EXISTS public.sync_checkpoints (
+    name            TEXT PRIMARY KEY,           -- vd 'tails_2d'
+    last_id         BIGINT,                     -- watermark: id lottery_draws lớn nhất đã xử lý liên tục
+    last_date       DATE,                       -- draw_date của kỳ last_id (để đọc log)
+    rows_processed  BIGINT NOT NULL DEFAULT 0,  -- số tails ghi trong lần sync gần nhất
+    updated_at      TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL
+);
+
+COMMENT ON TABLE public.sync_checkpoints IS 'Watermark của các bước sync tăng dần (build_tails.py)';
+
+-- Kỳ quay chưa có tails_2d (NOT EXISTS dùng idx_tails_draw_id), đọc qua PostgREST như 1 bảng
+CREATE OR REPLACE VIEW public.pending_tail_draws AS
+SELECT d.*
+FROM public.lottery_draws d
+WHERE NOT EXISTS (
+    SELECT 1 FROM public.tails_2d t WHERE t.draw_id = d.id
+);
+
+COMMENT ON VIEW public.pending_tail_draws IS 'lottery_draws chưa được trích tails_2d (anti-join)';
+
+ALTER TABLE public.sync_checkpoints ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Enable read access for all users" ON public.sync_checkpoints FOR SELECT USING (true);
+CREATE POLICY "Service insert access" ON public.sync_checkpoints FOR INSERT WITH CHECK (auth.role() = 'service_role');
+CREATE POLICY "Service update access" ON public.sync_checkpoints FOR UPDATE USING (auth.role() = 'service_role');
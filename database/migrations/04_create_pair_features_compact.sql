@@ -0,0 +1,63 @@
+-- Migration: 04_create_pair_features_compact.sql
+-- Layout gọn của pair_features: 1 row / (feature_date, region, province) thay vì 100 rows,
+-- mỗi feature là mảng 100 phần tử theo pair 0..99 (phần tử i = cặp i).
+-- is_even / is_high / sum_digits suy ra từ pair nên không lưu.
+-- Đọc/ghi: PAIR_FEATURES_LAYOUT=compact (src/features/feature_builder.py: encode_compact / decode_compact_columns).
+
+CREATE TABLE IF NOT EXISTS public.pair_features_compact (
+    id              SERIAL PRIMARY KEY,
+    feature_date    DATE NOT NULL,
+    region          VARCHAR(10) NOT NULL,
+    province        VARCHAR(50),
+    day_of_week     SMALLINT,           -- 0=Mon ... 6=Sun
+
+    freq_30         FLOAT8[] NOT NULL,  -- 100 phần tử
+    freq_60         FLOAT8[] NOT NULL,
+    freq_100        FLOAT8[] NOT NULL,
+    gap_since_last  INT[]    NOT NULL,
+    avg_gap_100     FLOAT8[] NOT NULL,
+    std_gap_100     FLOAT8[] NOT NULL,
+    gap_zscore      FLOAT8[] NOT NULL,
+
+    hit             BOOLEAN[],          -- NULL = chưa có label cho ngày đó
+
+    -- XSMB có province NULL → NULLS NOT DISTINCT để upsert không sinh row trùng (Postgres 15+)
+    CONSTRAINT pair_features_compact_unique UNIQUE NULLS NOT DISTINCT (feature_date, region, province),
+    CONSTRAINT pair_features_compact_len CHECK (
+        cardinality(freq_30) = 100 AND cardinality(gap_since_last) = 100
+        AND (hit IS NULL OR cardinality(hit) = 100)
+    )
+);
+
+COMMENT ON TABLE public.pair_features_compact IS 'pair_features dạng mảng: 1 row / ngày / đài, phần tử i = cặp i';
+CREATE INDEX IF NOT EXISTS idx_pfc_region_date ON public.pair_features_compact(region, province, feature_date);
+
+-- Chuyển dữ liệu từ pair_features (chỉ ngày đủ 100 cặp); chạy lại an toàn nhờ ON CONFLICT
+INSERT INTO public.pair_features_compact (
+    feature_date, region, province, day_of_week,
+    freq_30, freq_60, freq_100, gap_since_last, avg_gap_100, std_gap_100, gap_zscore, hit
+)
+SELECT
+    feature_date, region, province, min(day_of_week),
+    array_agg(freq_30        ORDER BY pair),
+    array_agg(freq_60        ORDER BY pair),
+    array_agg(freq_100       ORDER BY pair),
+    array_agg(gap_since_last ORDER BY pair),
+    array_agg(avg_gap_100    ORDER BY pair),
+    array_agg(std_gap_100    ORDER BY pair),
+    array_agg(gap_zscore     ORDER BY pair),
+    CASE WHEN bool_and(hit IS NOT NULL) THEN array_agg(hit ORDER BY pair) END
+FROM public.pair_features
+GROUP BY feature_date, region, province
+HAVING count(DISTINCT pair) = 100 AND count(*) = 100
+ON CONFLICT ON CONSTRAINT pair_features_compact_unique DO NOTHING;
+
+ALTER TABLE public.pair_features_compact ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Public read access" ON public.pair_features_compact FOR SELECT USING (true);
+CREATE POLICY "Service insert access" ON public.pair_features_compact FOR INSERT WITH CHECK (auth.role() = 'service_role');
+CREATE POLICY "Service update access" ON public.pair_features_compact FOR UPDATE USING (auth.role() = 'service_role');
+
+-- Sau khi đặt PAIR_FEATURES_LAYOUT=compact và kiểm tra train/predict chạy đúng,
+-- có thể giải phóng dung lượng bảng cũ:
+--   TRUNCATE public.pair_features;
@@ -0,0 +1,41 @@
+-- Migration: 05_create_draw_tails.sql
+-- Tails đóng gói: 1 row / kỳ thay cho 18–27 row tails_2d / kỳ.
+--   tail_mask   = 100 bit dạng hex (25 ký tự), bit p = cặp p xuất hiện
+--   tail_counts = số lần xuất hiện của từng cặp có mặt, 1 byte / cặp theo pair tăng dần, dạng hex
+-- Encode/decode: src/features/tail_set.py (TailSet.to_packed / from_packed).
+-- Dựng / backfill: TAILS_LAYOUT=bitmap python src/scripts/build_tails.py --backfill
+-- Đọc: build_features.py / predict_v3.py / verify_v3.py với TAILS_LAYOUT=bitmap.
+
+CREATE TABLE IF NOT EXISTS public.draw_tails (
+    draw_id      INT PRIMARY KEY REFERENCES public.lottery_draws(id) ON DELETE CASCADE,
+    draw_date    DATE NOT NULL,
+    region       VARCHAR(10) NOT NULL,   -- 'XSMB' | 'XSMN'
+    province     VARCHAR(50),            -- NULL cho XSMB, slug cho XSMN
+    tail_mask    CHAR(25) NOT NULL,
+    tail_counts  VARCHAR(200) NOT NULL,
+    n_tails      SMALLINT NOT NULL,      -- tổng số giải (= số row tails_2d tương ứng)
+    created_at   TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL
+);
+
+COMMENT ON TABLE public.draw_tails IS 'TAIL_SET đóng gói theo kỳ: bitmask 100 cặp + số lần xuất hiện (thay tails_2d)';
+CREATE INDEX IF NOT EXISTS idx_draw_tails_station ON public.draw_tails(region, province, draw_date);
+
+-- Kỳ chưa có draw_tails (anti-join theo PK), cho build_tails.py khi TAILS_LAYOUT=bitmap
+CREATE OR REPLACE VIEW public.pending_draw_tails AS
+SELECT d.*
+FROM public.lottery_draws d
+WHERE NOT EXISTS (
+    SELECT 1 FROM public.draw_tails t WHERE t.draw_id = d.id
+);
+
+COMMENT ON VIEW public.pending_draw_tails IS 'lottery_draws chưa có draw_tails (anti-join)';
+
+ALTER TABLE public.draw_tails ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Public read access" ON public.draw_tails FOR SELECT USING (true);
+CREATE POLICY "Service insert access" ON public.draw_tails FOR INSERT WITH CHECK (auth.role() = 'service_role');
+CREATE POLICY "Service update access" ON public.draw_tails FOR UPDATE USING (auth.role() = 'service_role');
+
+-- Sau khi backfill và chuyển mọi job sang TAILS_LAYOUT=bitmap, có thể giải phóng tails_2d:
+--   TRUNCATE public.tails_2d;
+-- (so sánh dung lượng trước/sau bằng database/analyze_db_size.sql)
@@ -0,0 +1,21 @@
+-- Migration: 06_create_no_draw_dates.sql
+-- Ngày đã xác nhận không quay theo region (trang kết quả tải được nhưng không có kỳ nào),
+-- ghi bởi src/scripts/backfill.py. Planner của backfill và DrawCalendar.from_db bỏ qua các ngày này
+-- → không bao giờ request lại. Xóa row để buộc crawl lại 1 ngày (hoặc backfill.py --force).
+
+CREATE TABLE IF NOT EXISTS public.no_draw_dates (
+    draw_date     DATE NOT NULL,
+    region        VARCHAR(10) NOT NULL,           -- 'XSMB' | 'XSMN'
+    reason        TEXT,                           -- vd 'empty_page'
+    confirmed_at  TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL,
+    PRIMARY KEY (draw_date, region)
+);
+
+COMMENT ON TABLE public.no_draw_dates IS 'Ngày không quay đã xác nhận (Tết, nghỉ lễ...) — backfill không request lại';
+
+ALTER TABLE public.no_draw_dates ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Public read access" ON public.no_draw_dates FOR SELECT USING (true);
+CREATE POLICY "Service insert access" ON public.no_draw_dates FOR INSERT WITH CHECK (auth.role() = 'service_role');
+CREATE POLICY "Service update access" ON public.no_draw_dates FOR UPDATE USING (auth.role() = 'service_role');
+CREATE POLICY "Service delete access" ON public.no_draw_dates FOR DELETE USING (auth.role() = 'service_role');
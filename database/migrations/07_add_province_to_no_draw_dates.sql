@@ -0,0 +1,14 @@
+-- Migration: 07_add_province_to_no_draw_dates.sql
+-- no_draw_dates theo từng đài: province = '' là cả region không quay (trang có thông báo nghỉ),
+-- province = slug là đài có lịch tuần nhưng không có trên trang kết quả đã tải được ngày đó
+-- (lịch thay đổi, đài nghỉ riêng). backfill.py ghi, DrawCalendar.from_db đọc → ngày XSMN đã tải
+-- đủ không bị request lại chỉ vì lịch tuần tĩnh khác lịch thật.
+
+ALTER TABLE public.no_draw_dates
+    ADD COLUMN IF NOT EXISTS province VARCHAR(50) NOT NULL DEFAULT '';
+
+ALTER TABLE public.no_draw_dates DROP CONSTRAINT IF EXISTS no_draw_dates_pkey;
+ALTER TABLE public.no_draw_dates ADD PRIMARY KEY (draw_date, region, province);
+
+COMMENT ON COLUMN public.no_draw_dates.province IS
+    '''' = cả region không quay; slug XSMN = riêng đài đó không quay ngày draw_date';
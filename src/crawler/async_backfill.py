@@ -0,0 +1,278 @@
+"""
+Async Backfill Engine
+Crawl nhiều ngày song song trên nền XSMBCrawler / XSMNCrawler:
+  - bounded concurrency (asyncio.Semaphore)
+  - token bucket giới hạn requests/giây + burst
+  - politeness theo host (khoảng cách tối thiểu giữa 2 request tới cùng host)
+  - parse HTML trong process pool (không chặn event loop), mỗi worker dựng parser 1 lần
+  - checkpoint JSON: chạy lại sẽ bỏ qua các ngày đã xong
+  - trang không có kết quả chỉ được coi là ngày nghỉ khi có thông báo nghỉ (is_holiday_page),
+    còn lại là lỗi → lần chạy sau thử lại
+"""
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from .xsmb_crawler import XSMBCrawler
+from .xsmn_crawler import XSMNCrawler
+
+
+class TokenBucket:
+    """Token bucket: trung bình `rate` request/giây, cho phép dồn tối đa `burst` request."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate phải > 0")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostPoliteness:
+    """Giữ khoảng cách tối thiểu `min_interval` giây giữa 2 request tới cùng 1 host."""
+
+    def __init__(self, min_interval: float = 0.5):
+        self.min_interval = min_interval
+        self._next_slot: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, url: str):
+        host = urlparse(url).netloc
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class BackfillCheckpoint:
+    """
+    Lưu tiến độ backfill ra file JSON:
+        {"XSMB": {"2025-01-01": "saved" | "holiday"}, "XSMN": {...}}
+    Một ngày chỉ được đánh dấu 'saved' SAU khi draws đã ghi vào DB.
+    'holiday' = trang có thông báo nghỉ quay. Trạng thái khác (vd 'empty' của checkpoint cũ,
+    khi mọi trang rỗng đều bị coi là ngày nghỉ) không được tính là xong → crawl lại.
+    """
+
+    DONE = ("saved", "holiday")
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.state: Dict[str, Dict[str, str]] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def is_done(self, region: str, target_date: date) -> bool:
+        return self.state.get(region, {}).get(target_date.isoformat()) in self.DONE
+
+    def mark(self, region: str, dates: Iterable[date], status: str):
+        bucket = self.state.setdefault(region, {})
+        for d in dates:
+            bucket[d.isoformat()] = status
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=0, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+_WORKER_PARSERS: Dict[str, object] = {}  # region → crawler dùng để parse, 1 bộ / process
+
+
+def _init_parse_worker(parser: Optional[str] = None):
+    """Initializer của process pool: dựng crawler (chỉ để parse) 1 lần cho mỗi worker."""
+    _WORKER_PARSERS["XSMB"] = XSMBCrawler(parser=parser)
+    _WORKER_PARSERS["XSMN"] = XSMNCrawler(parser=parser)
+
+
+def _parse_page(region: str, html: bytes, target_date: date) -> Tuple[List[Dict], bool]:
+    """
+    Chạy trong process pool: parse HTML → (draws, holiday).
+    holiday=True chỉ khi không có kết quả VÀ trang có thông báo nghỉ quay.
+    """
+    if not _WORKER_PARSERS:
+        _init_parse_worker()
+    crawler = _WORKER_PARSERS[region]
+    if region == "XSMB":
+        result = crawler.parse_results(html, target_date)
+        draws = [result] if result else []
+    else:
+        draws = crawler.parse_batch_results(html, target_date)
+    return draws, not draws and crawler.is_holiday_page(html)
+
+
+class AsyncBackfillEngine:
+    """Engine crawl song song nhiều (region, date) và ghi DB theo lô."""
+
+    def __init__(
+        self,
+        save_fn: Callable[[List[Dict]], Tuple[int, int]],
+        concurrency: int = 4,
+        rate: float = 2.0,
+        burst: int = 4,
+        host_interval: float = 0.25,
+        parse_workers: Optional[int] = None,
+        checkpoint_path: Optional[str] = None,
+        flush_every: int = 200,
+        retries: int = 2,
+    ):
+        """
+        Args:
+            save_fn: hàm ghi list draws vào DB, trả về (saved, failed) — vd backfill.save_draws
+            concurrency: số request đồng thời tối đa
+            rate, burst: token bucket (request/giây, số request dồn tối đa)
+            host_interval: khoảng cách tối thiểu giữa 2 request tới cùng host (giây)
+            parse_workers: số process parse HTML (None = số CPU)
+            checkpoint_path: file checkpoint (None = không lưu tiến độ)
+            flush_every: số draws gom lại trước mỗi lần save_fn
+            retries: số lần thử lại khi fetch lỗi
+        """
+        self.save_fn = save_fn
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.politeness = HostPoliteness(host_interval)
+        self.parse_workers = parse_workers
+        self.checkpoint = BackfillCheckpoint(checkpoint_path)
+        self.flush_every = flush_every
+        self.retries = retries
+        self.crawlers = {"XSMB": XSMBCrawler(), "XSMN": XSMNCrawler()}
+
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._pending: Dict[str, List[Dict]] = {}      # region → draws chờ ghi
+        self._pending_dates: Dict[str, set] = {}      # region → ngày tương ứng
+        self.parsed: Dict[str, Dict[date, List[Optional[str]]]] = {}  # region → ngày → province đã parse được
+        self._write_lock: Optional[asyncio.Lock] = None
+
+    def _count(self, region: str, key: str, n: int = 1):
+        bucket = self.stats.setdefault(region, {"saved": 0, "empty": 0, "failed": 0, "skipped": 0})
+        bucket[key] += n
+
+    async def _fetch(self, region: str, target_date: date) -> Optional[bytes]:
+        crawler = self.crawlers[region]
+        cache = crawler.page_cache
+        if cache is not None:
+            # Cache hit không tốn request → không qua token bucket
+            html = cache.get(crawler.MIEN, target_date)
+            if html is not None or cache.replay:
+                return html
+
+        url = crawler.build_url(target_date)
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire()
+            await self.politeness.wait(url)
+            try:
+                html = await asyncio.to_thread(crawler.fetch_page, target_date, False)
+                if html is not None:
+                    return html
+            except Exception as e:
+                print(f"  ⚠️ {region} {target_date}: fetch lỗi lần {attempt + 1}: {e}")
+            if attempt < self.retries:
+                await asyncio.sleep(2 ** attempt)
+        return None
+
+    async def _flush(self, region: str):
+        """Ghi các draws đang chờ của region rồi mới đánh dấu checkpoint 'saved'."""
+        draws = self._pending.pop(region, [])
+        dates = self._pending_dates.pop(region, set())
+        if not draws:
+            return
+        saved, failed = await asyncio.to_thread(self.save_fn, draws)
+        self._count(region, "saved", saved)
+        self._count(region, "failed", failed)
+        if failed == 0:
+            self.checkpoint.mark(region, dates, "saved")
+
+    async def _process(self, region: str, target_date: date, semaphore: asyncio.Semaphore, pool, progress: str):
+        async with semaphore:
+            html = await self._fetch(region, target_date)
+        if html is None:
+            self._count(region, "failed")
+            print(f"  ❌ {progress} {region} {target_date}: không tải được trang (hoặc không có trong cache)")
+            return
+
+        loop = asyncio.get_running_loop()
+        try:
+            draws, holiday = await loop.run_in_executor(pool, _parse_page, region, html, target_date)
+        except Exception as e:
+            self._count(region, "failed")
+            print(f"  ❌ {progress} {region} {target_date}: parse lỗi: {e}")
+            return
+
+        async with self._write_lock:
+            if not draws:
+                cache = self.crawlers[region].page_cache
+                if cache is not None:
+                    cache.reject(self.crawlers[region].MIEN, target_date, any_age=not holiday)
+                if holiday:
+                    self._count(region, "empty")
+                    self.checkpoint.mark(region, [target_date], "holiday")
+                    print(f"  ⚠️  {progress} {region} {target_date}: No data (holiday/off)")
+                else:
+                    # Không có bảng kết quả lẫn thông báo nghỉ: lỗi trang / bị chặn / đổi giao diện
+                    self._count(region, "failed")
+                    print(f"  ❌ {progress} {region} {target_date}: trang không có kết quả, không phải ngày nghỉ")
+                return
+            self._pending.setdefault(region, []).extend(draws)
+            self.parsed.setdefault(region, {})[target_date] = [d.get("province") for d in draws]
+            self._pending_dates.setdefault(region, set()).add(target_date)
+            print(f"  ✅ {progress} {region} {target_date}: {len(draws)} draw(s)")
+            if len(self._pending[region]) >= self.flush_every:
+                await self._flush(region)
+
+    async def run(self, jobs: List[Tuple[str, date]]) -> Dict[str, Dict[str, int]]:
+        """
+        Crawl tất cả jobs (region, date). Bỏ qua các job đã có trong checkpoint.
+
+        Returns:
+            Thống kê theo region: {'XSMB': {'saved', 'empty', 'failed', 'skipped'}, ...}
+        """
+        self._write_lock = asyncio.Lock()
+        todo = []
+        for region, d in jobs:
+            self._count(region, "skipped", 0)
+            if self.checkpoint.is_done(region, d):
+                self._count(region, "skipped")
+            else:
+                todo.append((region, d))
+        if len(todo) < len(jobs):
+            print(f"⏭️  Checkpoint: bỏ qua {len(jobs) - len(todo)} ngày đã xong")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        with ProcessPoolExecutor(max_workers=self.parse_workers, initializer=_init_parse_worker,
+                                 initargs=(self.crawlers["XSMB"].parser,)) as pool:
+            tasks = [
+                self._process(region, d, semaphore, pool, f"[{i + 1}/{len(todo)}]")
+                for i, (region, d) in enumerate(todo)
+            ]
+            await asyncio.gather(*tasks)
+            async with self._write_lock:
+                for region in list(self._pending):
+                    await self._flush(region)
+
+        return self.stats
@@ -0,0 +1,109 @@
+"""
+Fast Parser
+Backend parse HTML bằng lxml cho các crawler Minh Ngọc.
+
+Thay vì dựng toàn bộ cây BeautifulSoup (html.parser, thuần Python) rồi mới tìm
+bảng kết quả, lxml parse trang bằng C và các ô giải được lấy bằng XPath biên dịch sẵn.
+Các helper ở đây mô phỏng đúng ngữ nghĩa BeautifulSoup mà parser cũ dùng:
+  - find_first / find_all  ~ soup.find / soup.find_all(tag, class_=...)  (theo thứ tự tài liệu)
+  - get_text               ~ tag.get_text(separator)  (bỏ qua comment, script, style, …)
+nên kết quả parse giống hệt parser BeautifulSoup (kiểm tra bằng src/scripts/bench_parsers.py).
+
+Chọn backend: tham số `parser` của crawler, hoặc biến môi trường CRAWLER_PARSER=lxml|bs4.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Union
+
+from bs4.dammit import UnicodeDammit
+
+try:
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+PARSER_BACKENDS = ("lxml", "bs4")
+
+# BeautifulSoup.get_text() không lấy chuỗi nằm trong các thẻ này
+_NON_TEXT_TAGS = ("script", "style", "template", "rt", "rp")
+
+
+def default_backend() -> str:
+    """Backend mặc định: CRAWLER_PARSER nếu có, ngược lại lxml (nếu đã cài)."""
+    backend = os.environ.get("CRAWLER_PARSER", "lxml").strip().lower()
+    return resolve_backend(backend)
+
+
+def resolve_backend(backend: Optional[str]) -> str:
+    """Kiểm tra tên backend; tự lùi về bs4 nếu chưa cài lxml."""
+    if backend is None:
+        return default_backend()
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Parser backend không hợp lệ: {backend} (chọn {', '.join(PARSER_BACKENDS)})")
+    if backend == "lxml" and not LXML_AVAILABLE:
+        print("⚠️ lxml chưa được cài, dùng parser BeautifulSoup")
+        return "bs4"
+    return backend
+
+
+if LXML_AVAILABLE:
+    _local = threading.local()  # lxml parser không dùng chung giữa các thread
+
+    def _parser() -> "etree.HTMLParser":
+        parser = getattr(_local, "parser", None)
+        if parser is None:
+            parser = _local.parser = etree.HTMLParser()
+        return parser
+
+    _XPATH_CACHE: Dict[tuple, "etree.XPath"] = {}
+
+    _TEXT_XPATH = etree.XPath(
+        ".//text()[not(" + " or ".join(f"ancestor::{t}" for t in _NON_TEXT_TAGS) + ")]"
+    )
+
+
+def _xpath(tag: Union[str, tuple], class_name: Optional[str], first: bool) -> "etree.XPath":
+    """
+    XPath biên dịch sẵn cho (tag, class). tag có thể là tuple như find_all(['td', 'th']).
+    Khớp class như BeautifulSoup: 1 trong các token của @class.
+    """
+    key = (tag, class_name, first)
+    xp = _XPATH_CACHE.get(key)
+    if xp is None:
+        if isinstance(tag, tuple):
+            expr = ".//*[" + " or ".join(f"self::{t}" for t in tag) + "]"
+        else:
+            expr = f".//{tag}"
+        if class_name:
+            expr += f"[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+        xp = _XPATH_CACHE[key] = etree.XPath(f"({expr})[1]" if first else expr)
+    return xp
+
+
+def parse_html(html: Union[bytes, str]):
+    """Parse trang HTML → phần tử gốc lxml. Giải mã bytes giống BeautifulSoup (UnicodeDammit)."""
+    if isinstance(html, bytes):
+        html = UnicodeDammit(html, is_html=True).unicode_markup
+    if not html:
+        return None
+    return etree.fromstring(html, _parser())
+
+
+def find_first(el, tag: Union[str, tuple], class_name: Optional[str] = None):
+    """Phần tử con cháu đầu tiên (thứ tự tài liệu) — như el.find(tag, class_=class_name)."""
+    if el is None:
+        return None
+    found = _xpath(tag, class_name, True)(el)
+    return found[0] if found else None
+
+
+def find_all(el, tag: Union[str, tuple], class_name: Optional[str] = None) -> List:
+    """Mọi phần tử con cháu khớp — như el.find_all(tag, class_=class_name)."""
+    return _xpath(tag, class_name, False)(el)
+
+
+def get_text(el, separator: str = "") -> str:
+    """Như tag.get_text(separator): nối các text node con cháu (bỏ comment/script/style)."""
+    return separator.join(_TEXT_XPATH(el))
@@ -0,0 +1,153 @@
+"""
+Page Cache
+Cache HTML trang kết quả Minh Ngọc trên đĩa, theo (mien, ngày):
+  - content-addressed: nội dung gzip lưu theo sha256 (objects/ab/abcd….html.gz),
+    trang giống nhau chỉ lưu 1 lần
+  - index/mien<m>/<YYYY-MM-DD>.json trỏ tới sha256 + url + thời điểm tải
+  - trang của ngày cũ không bao giờ đổi → không hết hạn;
+    chỉ ngày gần hôm nay (recent_days) mới hết hạn sau recent_ttl giây
+  - replay=True: chỉ đọc cache, KHÔNG gọi network (cache miss = không có trang)
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+DEFAULT_CACHE_DIR = os.path.join("data", "html_cache")
+
+
+class PageCache:
+    """Cache HTML nén, content-addressed, key = (mien, date)."""
+
+    def __init__(
+        self,
+        root: str = DEFAULT_CACHE_DIR,
+        replay: bool = False,
+        recent_days: int = 2,
+        recent_ttl: int = 3600,
+    ):
+        """
+        Args:
+            root: thư mục cache
+            replay: chỉ đọc từ cache, không tải trang mới
+            recent_days: các ngày trong khoảng này so với hôm nay được coi là "gần đây"
+            recent_ttl: thời gian sống (giây) của entry ngày gần đây
+        """
+        self.root = root
+        self.replay = replay
+        self.recent_days = recent_days
+        self.recent_ttl = recent_ttl
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0}
+        self._lock = threading.Lock()
+
+    # ==================== PATHS ====================
+
+    def _index_path(self, mien: int, target_date: date) -> str:
+        return os.path.join(self.root, "index", f"mien{mien}", f"{target_date.isoformat()}.json")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.html.gz")
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    # ==================== API ====================
+
+    def is_recent(self, target_date: date) -> bool:
+        return target_date >= date.today() - timedelta(days=self.recent_days)
+
+    def lookup(self, mien: int, target_date: date) -> Optional[Dict]:
+        """Đọc entry index (None nếu chưa có / hỏng)."""
+        path = self._index_path(mien, target_date)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, mien: int, target_date: date) -> Optional[bytes]:
+        """HTML đã cache của (mien, date), hoặc None nếu miss / hết hạn / hỏng."""
+        entry = self.lookup(mien, target_date)
+        if entry is None:
+            self._count("misses")
+            return None
+
+        if not self.replay and self.is_recent(target_date) and time.time() - entry["fetched_at"] > self.recent_ttl:
+            self._count("expired")
+            return None
+
+        try:
+            with open(self._object_path(entry["sha256"]), "rb") as f:
+                html = gzip.decompress(f.read())
+        except (OSError, EOFError, gzip.BadGzipFile):
+            self._count("misses")
+            return None
+        if hashlib.sha256(html).hexdigest() != entry["sha256"]:
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        return html
+
+    def put(self, mien: int, target_date: date, url: str, html: bytes) -> str:
+        """Lưu HTML vào cache. Trả về sha256 của nội dung."""
+        digest = hashlib.sha256(html).hexdigest()
+        obj_path = self._object_path(digest)
+        if not os.path.exists(obj_path):
+            self._write_atomic(obj_path, gzip.compress(html, compresslevel=6, mtime=0))
+        entry = {"sha256": digest, "url": url, "fetched_at": time.time(), "size": len(html)}
+        self._write_atomic(self._index_path(mien, target_date), json.dumps(entry).encode())
+        self._count("writes")
+        return digest
+
+    def reject(self, mien: int, target_date: date, any_age: bool = False):
+        """
+        Bỏ entry của ngày gần đây khi parse không ra kết quả
+        (trang có thể chưa cập nhật xong, lần crawl sau phải tải lại).
+        Ngày cũ giữ nguyên: trang rỗng của ngày nghỉ vẫn đáng cache.
+        any_age=True: bỏ cả ngày cũ — trang không có kết quả mà cũng không phải thông báo nghỉ
+        (lỗi / trang chặn / đổi giao diện), không được cache mãi.
+        """
+        if self.replay or not (any_age or self.is_recent(target_date)):
+            return
+        try:
+            os.remove(self._index_path(mien, target_date))
+        except FileNotFoundError:
+            pass
+
+    def print_summary(self):
+        s = self.stats
+        mode = "replay" if self.replay else "read-through"
+        print(f"📦 HTML cache ({mode}, {self.root}): {s['hits']} hits | {s['misses']} misses | "
+              f"{s['expired']} expired | {s['writes']} writes")
+
+
+_page_cache: Optional[PageCache] = None
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """Cache dùng chung cho cả process (None = chưa bật cache)."""
+    return _page_cache
+
+
+def configure_page_cache(root: Optional[str] = DEFAULT_CACHE_DIR, **kwargs) -> Optional[PageCache]:
+    """Bật cache dùng chung cho mọi crawler (root=None để tắt)."""
+    global _page_cache
+    _page_cache = PageCache(root, **kwargs) if root else None
+    return _page_cache
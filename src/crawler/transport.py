@@ -0,0 +1,223 @@
+"""
+Crawler HTTP transport
+Một requests.Session dùng chung cho tất cả crawler:
+  - keep-alive + connection pooling (không bắt tay TCP/TLS lại cho mỗi trang)
+  - Accept-Encoding gzip/deflate (+ br nếu đã cài package `brotli`)
+  - pool size / timeout / retry cấu hình được
+  - đo thời gian từng request: DNS / connect (TCP+TLS) / TTFB / download
+"""
+
+import socket
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+try:
+    import brotli  # noqa: F401  (urllib3 tự giải nén 'br' khi có package này)
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+DEFAULT_USER_AGENT = (
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
+    'AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/120.0.0.0 Safari/537.36'
+)
+
+
+# ==================== TIMED CONNECTIONS ====================
+
+class _TimedConnectionMixin:
+    """Ghi lại thời gian DNS + connect mỗi khi mở kết nối MỚI (kết nối reuse không đi qua đây)."""
+
+    _connect_timing: Optional[Dict[str, float]] = None
+
+    def connect(self):
+        # Đo DNS bằng 1 lần getaddrinfo riêng; KHÔNG ghim IP vào self._dns_host: urllib3 2.x dùng
+        # _dns_host làm self.host cho SNI + kiểm tra chứng chỉ, và tự thử lần lượt mọi địa chỉ (IPv6 → IPv4).
+        # Lần resolve trong super().connect() thường trúng cache của resolver nên connect ≈ TCP + TLS.
+        t0 = time.perf_counter()
+        try:
+            socket.getaddrinfo(self._dns_host, self.port, type=socket.SOCK_STREAM)
+        except (socket.gaierror, UnicodeError):
+            pass  # để super().connect() báo NameResolutionError như bình thường
+        t1 = time.perf_counter()
+        super().connect()
+        t2 = time.perf_counter()
+        self._connect_timing = {"dns": t1 - t0, "connect": t2 - t1}
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter dùng connection pool có đo thời gian."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+# ==================== TRANSPORT ====================
+
+class CrawlerTransport:
+    """Session HTTP dùng chung + thống kê thời gian request."""
+
+    def __init__(
+        self,
+        pool_connections: int = 4,
+        pool_maxsize: int = 10,
+        timeout: Union[float, Tuple[float, float]] = (10, 15),
+        retries: int = 2,
+        backoff_factor: float = 0.5,
+        user_agent: str = DEFAULT_USER_AGENT,
+        keep_timings: int = 5000,
+    ):
+        """
+        Args:
+            pool_connections: số host được giữ pool riêng
+            pool_maxsize: số kết nối keep-alive tối đa mỗi host (nên >= số request đồng thời)
+            timeout: (connect, read) timeout giây, hoặc 1 số cho cả hai
+            retries: số lần retry ở tầng urllib3 cho lỗi kết nối / 429 / 5xx
+            backoff_factor: hệ số backoff giữa các lần retry
+            user_agent: User-Agent mặc định
+            keep_timings: số request gần nhất giữ lại để thống kê
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+
+        encodings = "gzip, deflate, br" if BROTLI_AVAILABLE else "gzip, deflate"
+        self.session = requests.Session()
+        self.session.headers.update({
+            "User-Agent": user_agent,
+            "Accept-Encoding": encodings,
+            "Connection": "keep-alive",
+        })
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            raise_on_status=False,
+        )
+        adapter = _TimedHTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.timings: deque = deque(maxlen=keep_timings)
+        self._lock = threading.Lock()
+
+    def get(self, url: str, headers: Optional[Dict] = None, timeout=None, **kwargs) -> requests.Response:
+        """
+        GET qua session dùng chung. Body được đọc hết trước khi trả về,
+        response.timing = {'dns', 'connect', 'ttfb', 'download', 'reused', 'bytes', 'status'} (giây).
+        """
+        t0 = time.perf_counter()
+        response = self.session.get(
+            url, headers=headers, timeout=timeout or self.timeout, stream=True, **kwargs
+        )
+        t_headers = time.perf_counter()
+
+        conn = getattr(response.raw, "connection", None)
+        conn_timing = getattr(conn, "_connect_timing", None)
+        if conn is not None:
+            conn._connect_timing = None  # lần dùng sau của kết nối này = reused
+        dns = conn_timing["dns"] if conn_timing else 0.0
+        connect = conn_timing["connect"] if conn_timing else 0.0
+
+        content = response.content  # đọc hết body, trả kết nối về pool
+        t_done = time.perf_counter()
+
+        response.timing = {
+            "dns":      dns,
+            "connect":  connect,
+            "ttfb":     max(0.0, (t_headers - t0) - dns - connect),
+            "download": t_done - t_headers,
+            "reused":   conn_timing is None,
+            "bytes":    len(content),
+            "status":   response.status_code,
+        }
+        with self._lock:
+            self.timings.append(response.timing)
+        return response
+
+    def summary(self) -> Dict:
+        """Thống kê các request gần nhất: số request, tỉ lệ reuse, trung bình / p95 từng pha (ms)."""
+        with self._lock:
+            timings = list(self.timings)
+        if not timings:
+            return {"requests": 0}
+
+        result = {
+            "requests": len(timings),
+            "reused":   sum(1 for t in timings if t["reused"]),
+            "bytes":    sum(t["bytes"] for t in timings),
+        }
+        for phase in ("dns", "connect", "ttfb", "download"):
+            values = sorted(t[phase] for t in timings)
+            result[f"{phase}_avg_ms"] = round(sum(values) / len(values) * 1000, 1)
+            result[f"{phase}_p95_ms"] = round(values[int(0.95 * (len(values) - 1))] * 1000, 1)
+        return result
+
+    def print_summary(self):
+        s = self.summary()
+        if not s["requests"]:
+            return
+        print(f"🌐 HTTP: {s['requests']} requests | {s['reused']} reused connections | "
+              f"{s['bytes'] / 1024 / 1024:.1f} MB")
+        print(f"   avg  dns {s['dns_avg_ms']}ms | connect {s['connect_avg_ms']}ms | "
+              f"ttfb {s['ttfb_avg_ms']}ms | download {s['download_avg_ms']}ms")
+        print(f"   p95  dns {s['dns_p95_ms']}ms | connect {s['connect_p95_ms']}ms | "
+              f"ttfb {s['ttfb_p95_ms']}ms | download {s['download_p95_ms']}ms")
+
+    def close(self):
+        self.session.close()
+
+
+_transport: Optional[CrawlerTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> CrawlerTransport:
+    """Transport dùng chung cho cả process (tạo lần đầu với cấu hình mặc định)."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = CrawlerTransport()
+        return _transport
+
+
+def configure_transport(**kwargs) -> CrawlerTransport:
+    """Thay transport dùng chung bằng cấu hình mới (vd pool_maxsize = concurrency của backfill)."""
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+        _transport = CrawlerTransport(**kwargs)
+        return _transport
@@ -3,12 +3,15 @@ XSMB Crawler - MINH NGOC VERSION
 Crawl lottery results from minhngoc.net.vn (mien=2)
 """
 
-import requests
 from bs4 import BeautifulSoup
 from datetime import date
 from typing import Optional, Dict
 import time
 
+from .fast_parser import find_first, get_text, parse_html, resolve_backend
+from .page_cache import PageCache, get_page_cache
+from .transport import CrawlerTransport, get_transport
+
 class XSMBCrawler:
     """Crawler for XSMB (Northern Vietnam Lottery) results from Minh Ngoc"""
     
@@ -23,12 +26,47 @@ class XSMBCrawler:
         6: 'thai-binh'    # Sunday
     }
 
-    def __init__(self):
+    MIEN = 2  # tham số mien trên Minh Ngọc
+
+    # Thông báo nghỉ quay trên trang không có bảng kết quả
+    HOLIDAY_KEYWORDS = ("nghỉ tết", "nghỉ lễ", "lịch tết", "miền bắc nghỉ")
+
+    # (class của ô giải, cột DB, là mảng?) — theo đúng thứ tự parser gốc
+    PRIZE_FIELDS = [
+        ('giaidb', 'special_prize', False),
+        ('giai1', 'first_prize', False),
+        ('giai2', 'second_prize', True),
+        ('giai3', 'third_prize', True),
+        ('giai4', 'fourth_prize', True),
+        ('giai5', 'fifth_prize', True),
+        ('giai6', 'sixth_prize', True),
+        ('giai7', 'seventh_prize', True),
+    ]
+
+    def __init__(
+        self,
+        transport: Optional[CrawlerTransport] = None,
+        page_cache: Optional[PageCache] = None,
+        parser: Optional[str] = None,
+    ):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
                          'AppleWebKit/537.36 (KHTML, like Gecko) '
                          'Chrome/120.0.0.0 Safari/537.36'
         }
+        self._transport = transport
+        self._page_cache = page_cache
+        self.parser = resolve_backend(parser)  # 'lxml' (nhanh) hoặc 'bs4' (parser gốc)
+
+    @property
+    def transport(self) -> CrawlerTransport:
+        """Transport riêng nếu được truyền vào, mặc định dùng session chung (keep-alive)."""
+        return self._transport or get_transport()
+
+    @property
+    def page_cache(self) -> Optional[PageCache]:
+        """Cache HTML riêng nếu được truyền vào, mặc định dùng cache chung (None = không cache)."""
+        return self._page_cache or get_page_cache()
     
     def fetch_results(self, target_date: date) -> Optional[Dict]:
         """
@@ -72,22 +110,117 @@ class XSMBCrawler:
                 cleaned.append(p)
         return cleaned
 
+    def build_url(self, target_date: date) -> str:
+        """URL trang tra cứu Minh Ngọc cho XSMB (mien=2)"""
+        return f"https://www.minhngoc.net/tra-cuu-ket-qua-xo-so.html?mien=2&ngay={target_date.day}&thang={target_date.month}&nam={target_date.year}"
+
+    def fetch_page(self, target_date: date, read_cache: bool = True) -> Optional[bytes]:
+        """
+        Tải HTML trang kết quả (đọc cache trước nếu đã bật).
+        Trả về None nếu HTTP status != 200 hoặc cache miss ở chế độ replay.
+        read_cache=False: bỏ qua bước đọc cache (caller đã tự kiểm tra), vẫn ghi cache sau khi tải.
+        """
+        url = self.build_url(target_date)
+        cache = self.page_cache
+        if cache is not None and read_cache:
+            html = cache.get(self.MIEN, target_date)
+            if html is not None:
+                print(f"📦 Cache XSMB: {target_date}")
+                return html
+            if cache.replay:
+                print(f"  ⚠️ Replay: không có trang XSMB {target_date} trong cache")
+                return None
+
+        print(f"🔍 Crawling XSMB: {url}")
+
+        response = self.transport.get(url, headers=self.headers)
+        # Check if successful
+        if response.status_code != 200:
+            print(f"  ❌ Failed to fetch: {response.status_code}")
+            return None
+        if cache is not None:
+            cache.put(self.MIEN, target_date, url, response.content)
+        return response.content
+
     def _crawl_from_minhngoc(self, target_date: date) -> Optional[Dict]:
         """Crawl from minhngoc.net.vn (Search Interface mien=2)"""
-        
-        # URL: mien=2 for XSMB
-        url = f"https://www.minhngoc.net/tra-cuu-ket-qua-xo-so.html?mien=2&ngay={target_date.day}&thang={target_date.month}&nam={target_date.year}"
-        
-        print(f"🔍 Crawling XSMB: {url}")
-        
         try:
-            response = requests.get(url, headers=self.headers, timeout=15)
-            # Check if successful
-            if response.status_code != 200:
-                print(f"  ❌ Failed to fetch: {response.status_code}")
+            html = self.fetch_page(target_date)
+        except Exception as e:
+            print(f"  ❌ Fetch error: {e}")
+            return None
+        if html is None:
+            return None
+        result = self.parse_results(html, target_date)
+        if result is None and self.page_cache is not None:
+            self.page_cache.reject(self.MIEN, target_date)
+        return result
+
+    def parse_results(self, html: bytes, target_date: date) -> Optional[Dict]:
+        """
+        Parse HTML trang kết quả XSMB (không cần network).
+        Tách riêng khỏi fetch để có thể chạy trong process pool / replay từ cache.
+        """
+        if self.parser == 'lxml':
+            return self._parse_results_lxml(html, target_date)
+        return self._parse_results_bs4(html, target_date)
+
+    def is_holiday_page(self, html: bytes) -> bool:
+        """
+        Trang không có bảng kết quả nhưng có thông báo nghỉ quay (Tết / lễ).
+        Phân biệt ngày nghỉ thật với trang lỗi / bị chặn / đổi giao diện — cũng parse ra None.
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+        if soup.find('table', class_=['bkqmienbac', 'bkqmiennam']):
+            return False
+        page_text = soup.get_text().lower()
+        return any(kw in page_text for kw in self.HOLIDAY_KEYWORDS)
+
+    def _parse_results_lxml(self, html: bytes, target_date: date) -> Optional[Dict]:
+        """Như _parse_results_bs4 nhưng dùng lxml + XPath biên dịch sẵn."""
+        try:
+            root = parse_html(html)
+            table = find_first(root, 'table', 'bkqmienbac')
+            if table is None:
+                table = find_first(root, 'table', 'bkqmiennam')
+            if table is None:
+                # Trang không có bảng (ngày nghỉ / lỗi) — hiếm gặp, để parser gốc nhận diện ngày nghỉ
+                return self._parse_results_bs4(html, target_date)
+
+            province_slug = self.XSMB_SCHEDULE.get(target_date.weekday(), 'ha-noi')
+
+            prizes = {}
+            for class_name, db_field, is_array in self.PRIZE_FIELDS:
+                td = find_first(table, 'td', class_name)
+                if td is None:
+                    continue
+                values = self._clean_prize_list(get_text(td, '|'))
+                if values:
+                    prizes[db_field] = values if is_array else values[0]
+
+            if 'special_prize' not in prizes:
+                print(f"  ⚠️ No special prize found for XSMB")
                 return None
-                
-            soup = BeautifulSoup(response.content, 'html.parser')
+
+            print(f"  ✅ Special Prize: {prizes.get('special_prize')}")
+            print(f"  ✅ Province: {province_slug}")
+            return {
+                'draw_date': target_date,
+                'region': 'XSMB',
+                'province': province_slug,
+                **prizes
+            }
+
+        except Exception as e:
+            print(f"  ❌ Parse error: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+
+    def _parse_results_bs4(self, html: bytes, target_date: date) -> Optional[Dict]:
+        """Parser gốc: BeautifulSoup (html.parser) trên toàn trang."""
+        try:
+            soup = BeautifulSoup(html, 'html.parser')
             
             # Determine table (try refined selector first)
             table = soup.find('table', class_='bkqmienbac')
@@ -98,7 +231,7 @@ class XSMBCrawler:
             if not table:
                 # Check for Holiday
                 page_text = soup.get_text().lower()
-                if any(kw in page_text for kw in ["nghỉ tết", "nghỉ lễ", "lịch tết", "miền bắc nghỉ"]):
+                if any(kw in page_text for kw in self.HOLIDAY_KEYWORDS):
                     print(f"  ⚠️ Holiday detected: XSMB is not drawn today.")
                     return None
 
@@ -3,21 +3,25 @@ XSMB Crawler for MinhNgoc.net.vn
 Crawls XSMB lottery results with province information
 """
 
-import requests
 from bs4 import BeautifulSoup
 from datetime import date
 from typing import Dict, Optional, List
 import re
 
+from .fast_parser import find_all, get_text, parse_html, resolve_backend
+from .transport import CrawlerTransport, get_transport
+
 
 class XSMBMinhNgocCrawler:
     """Crawler for XSMB results from minhngoc.net.vn"""
     
-    def __init__(self):
+    def __init__(self, transport: Optional[CrawlerTransport] = None, parser: Optional[str] = None):
         self.base_url = "https://www.minhngoc.net/ket-qua-xo-so/mien-bac/{date}.html"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
+        self._transport = transport
+        self.parser = resolve_backend(parser)  # 'lxml' (nhanh) hoặc 'bs4' (parser gốc)
         
         # Province mapping
         self.province_map = {
@@ -29,6 +33,11 @@ class XSMBMinhNgocCrawler:
             'Quảng Ninh': 'quang-ninh'
         }
     
+    @property
+    def transport(self) -> CrawlerTransport:
+        """Transport riêng nếu được truyền vào, mặc định dùng session chung (keep-alive)."""
+        return self._transport or get_transport()
+
     def fetch_results(self, target_date: date) -> Optional[Dict]:
         """
         Fetch XSMB results for a specific date
@@ -56,59 +65,88 @@ class XSMBMinhNgocCrawler:
         print(f"🔍 Crawling: {url}")
         
         try:
-            response = requests.get(url, headers=self.headers, timeout=15)
+            response = self.transport.get(url, headers=self.headers)
             response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Find result table - look for table containing target date
-            # Format: "18/01/2024" or "Ngày: 18/01/2024"
-            # Note: Page may have multiple tables, we want the LAST one (most specific)
-            target_date_str = target_date.strftime('%d/%m/%Y')
-            matching_tables = []
-            
-            for table in soup.find_all('table'):
-                text = table.get_text()
-                # Check if table contains both the date and prize info
-                if target_date_str in text and 'Giải' in text and ('ĐB' in text or 'Đặc biệt' in text):
-                    matching_tables.append(table)
-            
-            if not matching_tables:
-                print(f"  ❌ Result table not found for {target_date_str}")
-                return None
-            
-            # Use the LAST matching table (most specific to target date)
-            result_table = matching_tables[-1]
-            
-            # Extract province from day of week
-            province = self._extract_province(target_date)
-            print(f"  📍 Province: {province}")
-            
-            # Extract prizes
-            prizes = self._extract_prizes(result_table)
-            
-            if not prizes:
-                print(f"  ❌ Failed to extract prizes")
-                return None
-            
-            # Build result
-            result = {
-                'draw_date': target_date,
-                'region': 'XSMB',
-                'province': province,
-                **prizes
-            }
-            
-            print(f"  ✅ Special Prize: {result['special_prize']}")
-            print(f"  ✅ First Prize: {result['first_prize']}")
-            print(f"✅ Successfully crawled XSMB for {target_date}")
-            
-            return result
+            return self.parse_results(response.content, target_date)
             
         except Exception as e:
             print(f"  ❌ Error: {e}")
             return None
     
+    def parse_results(self, html: bytes, target_date: date) -> Optional[Dict]:
+        """Parse HTML trang kết quả (không cần network)."""
+        # Find result table - look for table containing target date
+        # Format: "18/01/2024" or "Ngày: 18/01/2024"
+        target_date_str = target_date.strftime('%d/%m/%Y')
+        if self.parser == 'lxml':
+            rows = self._result_rows_lxml(html, target_date_str)
+        else:
+            rows = self._result_rows_bs4(html, target_date_str)
+        
+        if rows is None:
+            print(f"  ❌ Result table not found for {target_date_str}")
+            return None
+        
+        # Extract province from day of week
+        province = self._extract_province(target_date)
+        print(f"  📍 Province: {province}")
+        
+        # Extract prizes
+        prizes = self._extract_prizes(rows)
+        
+        if not prizes:
+            print(f"  ❌ Failed to extract prizes")
+            return None
+        
+        # Build result
+        result = {
+            'draw_date': target_date,
+            'region': 'XSMB',
+            'province': province,
+            **prizes
+        }
+        
+        print(f"  ✅ Special Prize: {result['special_prize']}")
+        print(f"  ✅ First Prize: {result['first_prize']}")
+        print(f"✅ Successfully crawled XSMB for {target_date}")
+        
+        return result
+    
+    @staticmethod
+    def _is_result_table(text: str, target_date_str: str) -> bool:
+        """Table chứa cả ngày cần tìm và thông tin giải"""
+        return target_date_str in text and 'Giải' in text and ('ĐB' in text or 'Đặc biệt' in text)
+    
+    def _result_rows_bs4(self, html: bytes, target_date_str: str) -> Optional[List[List[str]]]:
+        """Parser gốc (BeautifulSoup): text các ô (td/th) của từng dòng trong bảng kết quả."""
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Note: Page may have multiple tables, we want the LAST one (most specific)
+        matching_tables = []
+        for table in soup.find_all('table'):
+            if self._is_result_table(table.get_text(), target_date_str):
+                matching_tables.append(table)
+        
+        if not matching_tables:
+            return None
+        
+        result_table = matching_tables[-1]
+        return [
+            [cell.get_text() for cell in row.find_all(['td', 'th'])]
+            for row in result_table.find_all('tr')
+        ]
+    
+    def _result_rows_lxml(self, html: bytes, target_date_str: str) -> Optional[List[List[str]]]:
+        """Như _result_rows_bs4 nhưng dùng lxml; duyệt ngược để dừng ngay ở table khớp cuối cùng."""
+        tables = find_all(parse_html(html), 'table')
+        for table in reversed(tables):
+            if self._is_result_table(get_text(table), target_date_str):
+                return [
+                    [get_text(cell) for cell in find_all(row, ('td', 'th'))]
+                    for row in find_all(table, 'tr')
+                ]
+        return None
+    
     def _extract_province(self, target_date: date) -> str:
         """
         Extract province based on day of week
@@ -135,9 +173,9 @@ class XSMBMinhNgocCrawler:
         
         return province_schedule.get(day_of_week, 'ha-noi')
     
-    def _extract_prizes(self, table) -> Optional[Dict]:
+    def _extract_prizes(self, rows: List[List[str]]) -> Optional[Dict]:
         """
-        Extract all prizes from table
+        Extract all prizes from table rows (text của các ô td/th mỗi dòng)
         XSMB has specific number formats:
         - ĐB, G1: 5 digits
         - G2-G5: 5 digits each
@@ -148,23 +186,17 @@ class XSMBMinhNgocCrawler:
         try:
             prizes = {}
             
-            # Find all rows
-            rows = table.find_all('tr')
-            
-            for row in rows:
-                cells = row.find_all(['td', 'th'])
+            for cells in rows:
                 if len(cells) < 2:
                     continue
                 
                 # Get prize label
-                label_cell = cells[0]
-                label = label_cell.get_text().strip()
+                label = cells[0].strip()
                 
                 # Get prize numbers from cells
-                number_cells = cells[1:]
                 cell_text = ''
-                for cell in number_cells:
-                    cell_text += cell.get_text().strip()
+                for cell in cells[1:]:
+                    cell_text += cell.strip()
                 
                 # Remove all non-digit characters
                 digits_only = re.sub(r'\D', '', cell_text)
@@ -3,12 +3,15 @@ XSMN Crawler - MINH NGOC VERSION
 Crawl lottery results from minhngoc.net.vn (Search Interface)
 """
 
-import requests
 from bs4 import BeautifulSoup
 from datetime import date
 from typing import Optional, Dict
 import time
 
+from .fast_parser import find_all, find_first, get_text, parse_html, resolve_backend
+from .page_cache import PageCache, get_page_cache
+from .transport import CrawlerTransport, get_transport
+
 class XSMNCrawler:
     """Crawler for XSMN (Southern Vietnam Lottery) results from Minh Ngoc"""
     
@@ -48,12 +51,48 @@ class XSMNCrawler:
         6: ['tien-giang', 'kien-giang', 'da-lat']
     }
 
-    def __init__(self):
+    MIEN = 1  # tham số mien trên Minh Ngọc
+
+    # Thông báo nghỉ quay trên trang không có bảng kết quả
+    HOLIDAY_KEYWORDS = ("nghỉ tết", "nghỉ lễ", "lịch tết", "miền nam nghỉ")
+
+    # (class của ô giải, cột DB, là mảng?) — theo đúng thứ tự parser gốc
+    PRIZE_FIELDS = [
+        ('giai8', 'eighth_prize', False),
+        ('giai7', 'seventh_prize', True),
+        ('giai6', 'sixth_prize', True),
+        ('giai5', 'fifth_prize', True),
+        ('giai4', 'fourth_prize', True),
+        ('giai3', 'third_prize', True),
+        ('giai2', 'second_prize', True),
+        ('giai1', 'first_prize', False),
+        ('giaidb', 'special_prize', False),
+    ]
+
+    def __init__(
+        self,
+        transport: Optional[CrawlerTransport] = None,
+        page_cache: Optional[PageCache] = None,
+        parser: Optional[str] = None,
+    ):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
                          'AppleWebKit/537.36 (KHTML, like Gecko) '
                          'Chrome/120.0.0.0 Safari/537.36'
         }
+        self._transport = transport
+        self._page_cache = page_cache
+        self.parser = resolve_backend(parser)  # 'lxml' (nhanh) hoặc 'bs4' (parser gốc)
+
+    @property
+    def transport(self) -> CrawlerTransport:
+        """Transport riêng nếu được truyền vào, mặc định dùng session chung (keep-alive)."""
+        return self._transport or get_transport()
+
+    @property
+    def page_cache(self) -> Optional[PageCache]:
+        """Cache HTML riêng nếu được truyền vào, mặc định dùng cache chung (None = không cache)."""
+        return self._page_cache or get_page_cache()
     
     def get_provinces_for_date(self, target_date: date) -> list:
         """Get list of provinces for a specific date based on schedule"""
@@ -96,22 +135,203 @@ class XSMNCrawler:
         cleaned = [p.strip() for p in parts if p.strip()]
         return cleaned
 
+    def build_url(self, target_date: date) -> str:
+        """URL trang tra cứu Minh Ngọc cho XSMN (mien=1) — 1 trang chứa tất cả đài trong ngày"""
+        return f"https://www.minhngoc.net/tra-cuu-ket-qua-xo-so.html?mien=1&ngay={target_date.day}&thang={target_date.month}&nam={target_date.year}"
+
+    def fetch_page(self, target_date: date, read_cache: bool = True) -> Optional[bytes]:
+        """
+        Tải HTML trang kết quả (đọc cache trước nếu đã bật).
+        Trả về None nếu HTTP status != 200 hoặc cache miss ở chế độ replay.
+        read_cache=False: bỏ qua bước đọc cache (caller đã tự kiểm tra), vẫn ghi cache sau khi tải.
+        """
+        url = self.build_url(target_date)
+        cache = self.page_cache
+        if cache is not None and read_cache:
+            html = cache.get(self.MIEN, target_date)
+            if html is not None:
+                print(f"  📦 Cache XSMN: {target_date}")
+                return html
+            if cache.replay:
+                print(f"  ⚠️ Replay: không có trang XSMN {target_date} trong cache")
+                return None
+
+        response = self.transport.get(url, headers=self.headers)
+        # Check if successful
+        if response.status_code != 200:
+            print(f"  ❌ Failed to fetch: {response.status_code}")
+            return None
+        if cache is not None:
+            cache.put(self.MIEN, target_date, url, response.content)
+        return response.content
+
     def _crawl_from_minhngoc(self, target_date: date, target_province_slug: str) -> Optional[Dict]:
         """Crawl from minhngoc.net.vn (Search Interface)"""
-        
-        # URL: mien=1 for XSMN
-        url = f"https://www.minhngoc.net/tra-cuu-ket-qua-xo-so.html?mien=1&ngay={target_date.day}&thang={target_date.month}&nam={target_date.year}"
-        
-        print(f"🔍 Crawling XSMN ({target_province_slug}): {url}")
-        
+        print(f"🔍 Crawling XSMN ({target_province_slug}): {self.build_url(target_date)}")
         try:
-            response = requests.get(url, headers=self.headers, timeout=15)
-            # Check if successful
-            if response.status_code != 200:
-                print(f"  ❌ Failed to fetch: {response.status_code}")
+            html = self.fetch_page(target_date)
+        except Exception as e:
+            print(f"  ❌ Fetch error: {e}")
+            return None
+        if html is None:
+            return None
+        result = self.parse_province_results(html, target_date, target_province_slug)
+        if result is None and self.page_cache is not None:
+            self.page_cache.reject(self.MIEN, target_date)
+        return result
+
+    def parse_province_results(self, html: bytes, target_date: date, target_province_slug: str) -> Optional[Dict]:
+        """Parse kết quả của 1 đài từ HTML trang XSMN (không cần network)."""
+        if self.parser == 'lxml':
+            return self._parse_province_results_lxml(html, target_date, target_province_slug)
+        return self._parse_province_results_bs4(html, target_date, target_province_slug)
+
+    # ==================== LXML BACKEND ====================
+
+    def _block_prizes_lxml(self, rows: list) -> Dict:
+        """Giải của 1 đài: với mỗi class giải, lấy ô đầu tiên tìm thấy trong các dòng của khối."""
+        prizes = {}
+        for class_name, db_field, is_array in self.PRIZE_FIELDS:
+            text = None
+            for r in rows:
+                td = find_first(r, 'td', class_name)
+                if td is not None:
+                    text = get_text(td, '|')
+                    break
+            if not text:
+                continue
+            values = self._clean_prize_list(text)
+            if values:
+                prizes[db_field] = values if is_array else values[0]
+        return prizes
+
+    @staticmethod
+    def _is_header_block(prizes: Dict) -> bool:
+        """Khối tiêu đề ('Giải tám', …) thay vì số trúng."""
+        g8 = prizes.get('eighth_prize')
+        return bool(g8 and ('Giải' in str(g8) or not str(g8).replace('|', '').isdigit()))
+
+    def _parse_province_results_lxml(self, html: bytes, target_date: date, target_province_slug: str) -> Optional[Dict]:
+        """Như _parse_province_results_bs4 nhưng dùng lxml + XPath biên dịch sẵn."""
+        try:
+            table = find_first(parse_html(html), 'table', 'bkqmiennam')
+            if table is None:
+                print(f"  ⚠️ XSMN table (bkqmiennam) not found")
                 return None
-                
-            soup = BeautifulSoup(response.content, 'html.parser')
+
+            expected_name = self.PROVINCE_MAP.get(target_province_slug)
+            if not expected_name:
+                print(f"  ⚠️ Unknown province slug: {target_province_slug}")
+                return None
+
+            for idx, row in enumerate(find_all(table, 'tr')):
+                td_tinh = find_first(row, 'td', 'tinh')
+                if td_tinh is None:
+                    continue
+                prov_name_text = get_text(td_tinh).strip()
+                if expected_name.lower() != prov_name_text.lower():
+                    continue
+
+                print(f"  ✅ Found province row {idx}: {prov_name_text}")
+                prizes = self._block_prizes_lxml([row])
+                if self._is_header_block(prizes):
+                    print(f"  ⚠️ Skipping header row for {expected_name} (Value: {prizes['eighth_prize']})")
+                    continue
+
+                if 'special_prize' not in prizes:
+                    print(f"  ⚠️ No special prize found for {target_province_slug}")
+                    return None
+
+                print(f"  ✅ Special Prize: {prizes.get('special_prize')}")
+                return {
+                    'draw_date': target_date,
+                    'region': 'XSMN',
+                    'province': target_province_slug,
+                    **prizes
+                }
+
+            print(f"  ⚠️ Province {expected_name} not found in results table")
+            return None
+
+        except Exception as e:
+            print(f"  ❌ Parse error: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+
+    def _parse_batch_results_lxml(self, html: bytes, target_date: date) -> list:
+        """Như _parse_batch_results_bs4 nhưng dùng lxml + XPath biên dịch sẵn."""
+        try:
+            table = find_first(parse_html(html), 'table', 'bkqmiennam')
+            if table is None:
+                print(f"  ⚠️ XSMN table (bkqmiennam) not found")
+                return []
+
+            name_to_slug = {v.lower(): k for k, v in self.PROVINCE_MAP.items()}
+
+            # Gom dòng thành khối theo từng đài (xem _parse_batch_results_bs4)
+            blocks = []
+            current_slug = None
+            current_rows = []
+            for row in find_all(table, 'tr'):
+                all_tinh_tds = find_all(row, 'td', 'tinh')
+                if len(all_tinh_tds) > 1:
+                    continue
+                elif len(all_tinh_tds) == 1:
+                    if current_slug and current_rows:
+                        blocks.append((current_slug, current_rows))
+
+                    prov_name = get_text(all_tinh_tds[0]).strip()
+                    prov_lower = prov_name.lower()
+                    slug = name_to_slug.get(prov_lower)
+                    if not slug:
+                        if 'đà lạt' in prov_lower:
+                            slug = 'da-lat'
+                        elif 'hcm' in prov_lower:
+                            slug = 'tp-hcm'
+                        else:
+                            current_slug = None
+                            current_rows = []
+                            continue
+
+                    print(f"  ✅ Found province: {prov_name} ({slug})")
+                    current_slug = slug
+                    current_rows = [row]
+                elif current_slug is not None:
+                    current_rows.append(row)
+
+            if current_slug and current_rows:
+                blocks.append((current_slug, current_rows))
+
+            results = []
+            for slug, block_rows in blocks:
+                prizes = self._block_prizes_lxml(block_rows)
+                if self._is_header_block(prizes):
+                    continue
+                if 'special_prize' in prizes:
+                    results.append({
+                        'draw_date': target_date,
+                        'region': 'XSMN',
+                        'province': slug,
+                        **prizes
+                    })
+                else:
+                    print(f"  ⚠️ No special prize found for {slug}, skipping")
+
+            return results
+
+        except Exception as e:
+            print(f"  ❌ Batch Parse error: {e}")
+            import traceback
+            traceback.print_exc()
+            return []
+
+    # ==================== BS4 BACKEND (parser gốc) ====================
+
+    def _parse_province_results_bs4(self, html: bytes, target_date: date, target_province_slug: str) -> Optional[Dict]:
+        """Parser gốc: BeautifulSoup (html.parser) trên toàn trang."""
+        try:
+            soup = BeautifulSoup(html, 'html.parser')
             table = soup.find('table', class_='bkqmiennam')
             
             if not table:
@@ -227,16 +447,43 @@ class XSMNCrawler:
         
         We group rows into province blocks by detecting 'tinh' rows as separators.
         """
-        url = f"https://www.minhngoc.net/tra-cuu-ket-qua-xo-so.html?mien=1&ngay={target_date.day}&thang={target_date.month}&nam={target_date.year}"
-        print(f"🔍 Crawling Batch XSMN: {url}")
-        
+        print(f"🔍 Crawling Batch XSMN: {self.build_url(target_date)}")
         try:
-            response = requests.get(url, headers=self.headers, timeout=15)
-            if response.status_code != 200:
-                print(f"  ❌ Failed to fetch: {response.status_code}")
-                return []
-                
-            soup = BeautifulSoup(response.content, 'html.parser')
+            html = self.fetch_page(target_date)
+        except Exception as e:
+            print(f"  ❌ Fetch error: {e}")
+            return []
+        if html is None:
+            return []
+        results = self.parse_batch_results(html, target_date)
+        if not results and self.page_cache is not None:
+            self.page_cache.reject(self.MIEN, target_date)
+        return results
+
+    def is_holiday_page(self, html: bytes) -> bool:
+        """
+        Trang không có bảng kết quả nhưng có thông báo nghỉ quay (Tết / lễ).
+        Phân biệt ngày nghỉ thật với trang lỗi / bị chặn / đổi giao diện — cũng parse ra [].
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+        if soup.find('table', class_='bkqmiennam'):
+            return False
+        page_text = soup.get_text().lower()
+        return any(kw in page_text for kw in self.HOLIDAY_KEYWORDS)
+
+    def parse_batch_results(self, html: bytes, target_date: date) -> list:
+        """
+        Parse kết quả của TẤT CẢ đài từ HTML trang XSMN (không cần network).
+        Tách riêng khỏi fetch để có thể chạy trong process pool / replay từ cache.
+        """
+        if self.parser == 'lxml':
+            return self._parse_batch_results_lxml(html, target_date)
+        return self._parse_batch_results_bs4(html, target_date)
+
+    def _parse_batch_results_bs4(self, html: bytes, target_date: date) -> list:
+        """Parser gốc: BeautifulSoup (html.parser) trên toàn trang."""
+        try:
+            soup = BeautifulSoup(html, 'html.parser')
             table = soup.find('table', class_='bkqmiennam')
             
             if not table:
@@ -0,0 +1,393 @@
+"""
+Query instrumentation
+Bọc client Supabase (hoặc SQLite backend) của LotteryDB / LotteryStorage để ghi lại MỌI request:
+  - bảng / bucket, thao tác (select / insert / upsert / update / delete / upload / download)
+  - filter (eq, gt, in_, or_, ...), số rows trả về
+  - payload bytes gửi lên (insert/upsert/update, upload) và nhận về (JSON response, download)
+  - latency
+
+Gom theo (bảng, thao tác, dạng filter) cho cả lần chạy script → JSON summary khi process kết thúc.
+Dạng filter (vd "eq:draw_date,eq:pair") không chứa giá trị, nên vòng lặp gọi 1 request/row
+(select + insert/update từng pair như verify_v3) hiện ra thành 1 dòng có `calls` rất lớn.
+
+Bật bằng env:
+  QUERY_STATS=1                 in JSON summary ra stdout khi kết thúc
+  QUERY_STATS=<path>.json       ghi JSON summary vào file (+ in tóm tắt)
+  QUERY_SLOW_MS=1000            ngưỡng slow query (ms)
+  QUERY_SLOW_LOG=<path>.jsonl   ghi từng slow query (kèm giá trị filter) vào file
+  QUERY_EGRESS_LEDGER=<path>    cộng dồn egress theo tháng qua các lần chạy
+  SUPABASE_EGRESS_BUDGET_GB=5   quota egress / tháng của gói free
+
+Egress ước tính theo kích thước JSON của response (PostgREST trả JSON gọn, chưa tính
+header / nén) + bytes download từ Storage.
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_SLOW_MS = 1000
+FREE_TIER_EGRESS_GB = 5
+
+WRITE_OPS = ("insert", "upsert", "update", "delete")
+QUERY_OPS = ("select",) + WRITE_OPS
+FILTER_METHODS = (
+    "eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "in_", "is_",
+    "contains", "contained_by", "match", "filter", "or_",
+)
+MODIFIER_METHODS = ("order", "limit", "range", "single", "maybe_single")
+
+
+def _json_size(value: Any) -> int:
+    if value is None:
+        return 0
+    return len(json.dumps(value, separators=(",", ":"), default=str, ensure_ascii=False).encode())
+
+
+def _short(value: Any, limit: int = 80) -> str:
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class QueryStats:
+    """Bộ đếm request cho cả process (thread-safe)."""
+
+    def __init__(
+        self,
+        slow_ms: float = DEFAULT_SLOW_MS,
+        slow_log_path: Optional[str] = None,
+        egress_budget_bytes: int = FREE_TIER_EGRESS_GB * 1024 ** 3,
+    ):
+        self.slow_ms = slow_ms
+        self.slow_log_path = slow_log_path
+        self.egress_budget_bytes = egress_budget_bytes
+        self.started_at = time.time()
+        self.slow_queries: List[Dict] = []
+        self._groups: Dict[Tuple[str, str, str, str], Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        kind: str,
+        target: str,
+        op: str,
+        filters: List[str],
+        rows: int,
+        request_bytes: int,
+        response_bytes: int,
+        latency_s: float,
+        error: Optional[str] = None,
+    ):
+        """
+        Ghi 1 request.
+
+        Args:
+            kind: "db" hoặc "storage"
+            target: tên bảng / bucket
+            filters: ["eq(draw_date='2026-01-01')", ...] (giá trị chỉ giữ trong slow log)
+        """
+        shape = ",".join(f.split("(", 1)[0] for f in filters)
+        key = (kind, target, op, shape)
+        latency_ms = latency_s * 1000
+        with self._lock:
+            g = self._groups.get(key)
+            if g is None:
+                g = self._groups[key] = {
+                    "kind": kind, "target": target, "op": op, "filters": shape,
+                    "calls": 0, "errors": 0, "rows": 0,
+                    "request_bytes": 0, "response_bytes": 0,
+                    "latencies_ms": [],
+                }
+            g["calls"] += 1
+            g["errors"] += error is not None
+            g["rows"] += rows
+            g["request_bytes"] += request_bytes
+            g["response_bytes"] += response_bytes
+            g["latencies_ms"].append(latency_ms)
+
+            if latency_ms >= self.slow_ms:
+                entry = {
+                    "at": datetime.now().isoformat(timespec="seconds"),
+                    "kind": kind, "target": target, "op": op, "filters": filters,
+                    "rows": rows, "request_bytes": request_bytes, "response_bytes": response_bytes,
+                    "latency_ms": round(latency_ms, 1), "error": error,
+                }
+                self.slow_queries.append(entry)
+                if self.slow_log_path:
+                    with open(self.slow_log_path, "a") as f:
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    # ==================== COUNTERS ====================
+
+    def egress(self) -> Dict:
+        """Bytes nhận về (DB response + Storage download) và gửi lên trong lần chạy này, so với quota free tier."""
+        with self._lock:
+            groups = list(self._groups.values())
+        egress_bytes = sum(g["response_bytes"] for g in groups)
+        ingress_bytes = sum(g["request_bytes"] for g in groups)
+        budget = self.egress_budget_bytes
+        return {
+            "egress_bytes": egress_bytes,
+            "ingress_bytes": ingress_bytes,
+            "db_egress_bytes": sum(g["response_bytes"] for g in groups if g["kind"] == "db"),
+            "storage_egress_bytes": sum(g["response_bytes"] for g in groups if g["kind"] == "storage"),
+            "budget_bytes": budget,
+            "budget_used_pct": round(egress_bytes / budget * 100, 4) if budget else None,
+            "runs_per_budget": int(budget // egress_bytes) if budget and egress_bytes else None,
+        }
+
+    def summary(self) -> Dict:
+        """JSON summary của lần chạy: tổng + từng nhóm (bảng, thao tác, dạng filter) sắp theo tổng latency."""
+        with self._lock:
+            groups = [dict(g, latencies_ms=sorted(g["latencies_ms"])) for g in self._groups.values()]
+            slow = list(self.slow_queries)
+
+        rows = []
+        for g in groups:
+            lat = g.pop("latencies_ms")
+            g["total_ms"] = round(sum(lat), 1)
+            g["avg_ms"] = round(sum(lat) / len(lat), 1)
+            g["p95_ms"] = round(lat[int(0.95 * (len(lat) - 1))], 1)
+            g["max_ms"] = round(lat[-1], 1)
+            rows.append(g)
+        rows.sort(key=lambda g: -g["total_ms"])
+
+        return {
+            "script": os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python",
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "wall_s": round(time.time() - self.started_at, 2),
+            "requests": sum(g["calls"] for g in rows),
+            "errors": sum(g["errors"] for g in rows),
+            "rows": sum(g["rows"] for g in rows),
+            "query_ms": round(sum(g["total_ms"] for g in rows), 1),
+            "egress": self.egress(),
+            "slow_ms": self.slow_ms,
+            "slow_queries": len(slow),
+            "groups": rows,
+        }
+
+    def print_summary(self, top: int = 10):
+        s = self.summary()
+        if not s["requests"]:
+            return
+        e = s["egress"]
+        print(f"\n🛰️  Queries: {s['requests']} requests | {s['errors']} lỗi | {s['rows']} rows | "
+              f"{s['query_ms'] / 1000:.1f}s chờ DB | egress {e['egress_bytes'] / 1024 / 1024:.2f} MB "
+              f"({e['budget_used_pct']}% quota tháng) | {s['slow_queries']} slow (≥{s['slow_ms']:.0f}ms)")
+        for g in s["groups"][:top]:
+            print(f"   {g['calls']:>6}× {g['op']:<8} {g['target']:<20} [{g['filters']}] "
+                  f"rows {g['rows']} | {g['total_ms'] / 1000:.2f}s (avg {g['avg_ms']}ms, p95 {g['p95_ms']}ms)")
+
+    def update_ledger(self, path: str) -> Dict:
+        """Cộng egress lần chạy này vào ledger theo tháng (file JSON) → số liệu đã dùng trong tháng."""
+        month = datetime.now().strftime("%Y-%m")
+        try:
+            with open(path) as f:
+                ledger = json.load(f)
+        except (OSError, ValueError):
+            ledger = {}
+        e = self.egress()
+        entry = ledger.setdefault(month, {"egress_bytes": 0, "ingress_bytes": 0, "runs": 0})
+        entry["egress_bytes"] += e["egress_bytes"]
+        entry["ingress_bytes"] += e["ingress_bytes"]
+        entry["runs"] += 1
+        entry["budget_used_pct"] = round(entry["egress_bytes"] / self.egress_budget_bytes * 100, 4)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(ledger, f, indent=2)
+        os.replace(tmp_path, path)
+        return {"month": month, **entry}
+
+    def emit(self, target: str = "1", ledger_path: Optional[str] = None):
+        """In / ghi JSON summary (gọi tự động lúc process kết thúc)."""
+        summary = self.summary()
+        if not summary["requests"]:
+            return
+        if ledger_path:
+            summary["egress_month"] = self.update_ledger(ledger_path)
+        if target in ("1", "true", "stdout"):
+            print(json.dumps(summary, indent=2, ensure_ascii=False))
+            return
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        with open(target, "w") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        self.print_summary()
+        print(f"   📄 Query stats: {target}")
+
+
+# ==================== PROXIES ====================
+
+class InstrumentedQuery:
+    """Bọc query builder: ghi nhận thao tác / filter qua từng lời gọi, đo khi execute()."""
+
+    def __init__(self, query, stats: QueryStats, table: str):
+        self._query = query
+        self._stats = stats
+        self._table = table
+        self._op = "select"
+        self._filters: List[str] = []
+        self._request_bytes = 0
+        self._negate = False
+
+    def _note(self, name: str, args: tuple, kwargs: dict):
+        if name in QUERY_OPS:
+            self._op = name
+            if name in ("insert", "upsert", "update"):
+                payload = args[0] if args else kwargs.get("json")
+                self._request_bytes += _json_size(payload)
+        elif name in FILTER_METHODS or name in MODIFIER_METHODS:
+            params = ", ".join([_short(a) for a in args] + [f"{k}={_short(v)}" for k, v in kwargs.items()])
+            self._filters.append(f"{'not.' if self._negate else ''}{name}({params})")
+            self._negate = False
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._query, name)
+        if name == "not_":
+            # postgrest: property trả về builder, áp dụng cho filter kế tiếp
+            self._query = attr
+            self._negate = True
+            return self
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._note(name, args, kwargs)
+            result = attr(*args, **kwargs)
+            if result is None or isinstance(result, (str, bytes, int, float, dict, list)):
+                return result
+            self._query = result
+            return self
+
+        return call
+
+    def execute(self):
+        t0 = time.perf_counter()
+        try:
+            response = self._query.execute()
+        except Exception as e:
+            self._stats.record("db", self._table, self._op, self._filters, 0,
+                               self._request_bytes, 0, time.perf_counter() - t0, error=f"{type(e).__name__}: {e}")
+            raise
+        latency = time.perf_counter() - t0
+        data = getattr(response, "data", None)
+        rows = len(data) if isinstance(data, list) else int(data is not None)
+        self._stats.record("db", self._table, self._op, self._filters, rows,
+                           self._request_bytes, _json_size(data), latency)
+        return response
+
+
+class InstrumentedBucket:
+    def __init__(self, bucket, stats: QueryStats, name: str):
+        self._bucket = bucket
+        self._stats = stats
+        self._name = name
+
+    def __getattr__(self, name: str):
+        return getattr(self._bucket, name)
+
+    @staticmethod
+    def _file_size(file) -> int:
+        if isinstance(file, (bytes, bytearray)):
+            return len(file)
+        try:
+            return os.fstat(file.fileno()).st_size if hasattr(file, "fileno") else os.path.getsize(file)
+        except (OSError, TypeError, ValueError):
+            return 0
+
+    def upload(self, path: str, file, **kwargs):
+        size = self._file_size(file)
+        t0 = time.perf_counter()
+        try:
+            result = self._bucket.upload(file=file, path=path, **kwargs)
+        except Exception as e:
+            self._stats.record("storage", self._name, "upload", [f"path({path!r})"], 0, size, 0,
+                               time.perf_counter() - t0, error=f"{type(e).__name__}: {e}")
+            raise
+        self._stats.record("storage", self._name, "upload", [f"path({path!r})"], 1, size, 0, time.perf_counter() - t0)
+        return result
+
+    def download(self, path: str, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            data = self._bucket.download(path, *args, **kwargs)
+        except Exception as e:
+            self._stats.record("storage", self._name, "download", [f"path({path!r})"], 0, 0, 0,
+                               time.perf_counter() - t0, error=f"{type(e).__name__}: {e}")
+            raise
+        self._stats.record("storage", self._name, "download", [f"path({path!r})"], 1, 0, len(data or b""),
+                           time.perf_counter() - t0)
+        return data
+
+
+class InstrumentedStorage:
+    def __init__(self, storage, stats: QueryStats):
+        self._storage = storage
+        self._stats = stats
+
+    def __getattr__(self, name: str):
+        return getattr(self._storage, name)
+
+    def from_(self, bucket: str) -> InstrumentedBucket:
+        return InstrumentedBucket(self._storage.from_(bucket), self._stats, bucket)
+
+
+class InstrumentedClient:
+    """Thay cho supabase Client / SQLiteClient: .table() và .storage được đo, còn lại chuyển thẳng."""
+
+    def __init__(self, client, stats: QueryStats):
+        self._client = client
+        self._stats = stats
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
+    def table(self, name: str) -> InstrumentedQuery:
+        return InstrumentedQuery(self._client.table(name), self._stats, name)
+
+    from_ = table
+
+    @property
+    def storage(self) -> InstrumentedStorage:
+        return InstrumentedStorage(self._client.storage, self._stats)
+
+
+# ==================== PROCESS-WIDE ====================
+
+_stats: Optional[QueryStats] = None
+_stats_lock = threading.Lock()
+
+
+def query_stats_enabled() -> bool:
+    return os.getenv("QUERY_STATS", "").strip().lower() not in ("", "0", "false", "no")
+
+
+def get_query_stats() -> Optional[QueryStats]:
+    """QueryStats dùng chung cho cả process (None nếu chưa bật QUERY_STATS); tạo lần đầu sẽ đăng ký emit lúc exit."""
+    global _stats
+    if not query_stats_enabled():
+        return None
+    with _stats_lock:
+        if _stats is None:
+            budget_gb = float(os.getenv("SUPABASE_EGRESS_BUDGET_GB", FREE_TIER_EGRESS_GB))
+            _stats = QueryStats(
+                slow_ms=float(os.getenv("QUERY_SLOW_MS", DEFAULT_SLOW_MS)),
+                slow_log_path=os.getenv("QUERY_SLOW_LOG") or None,
+                egress_budget_bytes=int(budget_gb * 1024 ** 3),
+            )
+            atexit.register(_stats.emit, os.getenv("QUERY_STATS").strip(), os.getenv("QUERY_EGRESS_LEDGER") or None)
+        return _stats
+
+
+def instrument_client(client):
+    """Bọc client nếu QUERY_STATS bật, ngược lại trả nguyên client (không tốn gì thêm)."""
+    stats = get_query_stats()
+    if stats is None or isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client, stats)
@@ -0,0 +1,682 @@
+"""
+SQLite Backend
+Backend offline (file SQLite) cho LotteryDB / LotteryStorage.
+
+Các script đều đi qua `db.supabase.table(...)` theo kiểu query builder của supabase-py.
+SQLiteClient mô phỏng đúng phần API mà các script đang dùng, trên 1 file SQLite:
+  - table(t).select(cols, count="exact") / insert / upsert(on_conflict) / update / delete
+  - filter: eq, neq, gt, gte, lt, lte, in_, is_, not_, or_ (cú pháp PostgREST, kể cả and(...))
+  - order(col, desc), limit, range → execute() trả về object có .data / .count
+  - storage.from_(bucket).upload / download: file trong thư mục local
+
+Bật bằng biến môi trường:
+  LOTTERY_DB_BACKEND=sqlite
+  LOTTERY_SQLITE_PATH=data/lottery.sqlite      (mặc định)
+  LOTTERY_STORAGE_DIR=data/storage             (mặc định, thay cho Supabase Storage)
+
+Schema theo database/schema_final.sql (+ migrations: profit_tracking, model_registry.weekday,
+sync_checkpoints + view pending_tail_draws, pair_features_compact, draw_tails + view pending_draw_tails, no_draw_dates + cột province).
+Kiểu Postgres được quy đổi: DATE/TIMESTAMP → TEXT ISO, BOOLEAN → 0/1 (đọc ra bool),
+mảng TEXT[] / SMALLINT[] → JSON (đọc ra list). NULL trong UNIQUE vẫn là khác nhau như Postgres.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+DB_BACKEND_ENV = "LOTTERY_DB_BACKEND"
+DEFAULT_SQLITE_PATH = os.path.join("data", "lottery.sqlite")
+DEFAULT_STORAGE_DIR = os.path.join("data", "storage")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lottery_draws (
+  id             INTEGER PRIMARY KEY AUTOINCREMENT,
+  draw_date      TEXT NOT NULL,
+  region         TEXT NOT NULL,
+  province       TEXT,
+  special_prize  TEXT,
+  first_prize    TEXT,
+  second_prize   JSON,
+  third_prize    JSON,
+  fourth_prize   JSON,
+  fifth_prize    JSON,
+  sixth_prize    JSON,
+  seventh_prize  JSON,
+  eighth_prize   TEXT,
+  created_at     TEXT DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE (draw_date, region, province)
+);
+CREATE INDEX IF NOT EXISTS idx_lottery_draws_date ON lottery_draws(draw_date);
+CREATE INDEX IF NOT EXISTS idx_lottery_draws_region ON lottery_draws(region, province);
+
+CREATE TABLE IF NOT EXISTS crawler_logs (
+  id                INTEGER PRIMARY KEY AUTOINCREMENT,
+  crawl_date        TEXT,
+  region            TEXT,
+  status            TEXT,
+  error_message     TEXT,
+  records_inserted  INTEGER,
+  created_at        TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS tails_2d (
+  id          INTEGER PRIMARY KEY AUTOINCREMENT,
+  draw_id     INTEGER NOT NULL REFERENCES lottery_draws(id) ON DELETE CASCADE,
+  draw_date   TEXT NOT NULL,
+  region      TEXT NOT NULL,
+  province    TEXT,
+  prize_code  TEXT NOT NULL,
+  tail_2d     INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tails_draw_id ON tails_2d(draw_id);
+CREATE INDEX IF NOT EXISTS idx_tails_date    ON tails_2d(draw_date);
+CREATE INDEX IF NOT EXISTS idx_tails_region  ON tails_2d(region, province);
+
+CREATE TABLE IF NOT EXISTS draw_tails (
+  draw_id      INTEGER PRIMARY KEY REFERENCES lottery_draws(id) ON DELETE CASCADE,
+  draw_date    TEXT NOT NULL,
+  region       TEXT NOT NULL,
+  province     TEXT,
+  tail_mask    TEXT NOT NULL,
+  tail_counts  TEXT NOT NULL,
+  n_tails      INTEGER NOT NULL,
+  created_at   TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_draw_tails_station ON draw_tails(region, province, draw_date);
+
+CREATE TABLE IF NOT EXISTS pair_features (
+  id              INTEGER PRIMARY KEY AUTOINCREMENT,
+  feature_date    TEXT NOT NULL,
+  region          TEXT NOT NULL,
+  province        TEXT,
+  pair            INTEGER NOT NULL,
+  freq_30         REAL,
+  freq_60         REAL,
+  freq_100        REAL,
+  gap_since_last  INTEGER,
+  avg_gap_100     REAL,
+  std_gap_100     REAL,
+  gap_zscore      REAL,
+  is_even         BOOLEAN,
+  is_high         BOOLEAN,
+  sum_digits      INTEGER,
+  day_of_week     INTEGER,
+  hit             BOOLEAN,
+  UNIQUE (feature_date, region, province, pair)
+);
+CREATE INDEX IF NOT EXISTS idx_pf_date   ON pair_features(feature_date);
+CREATE INDEX IF NOT EXISTS idx_pf_region ON pair_features(region, province);
+
+CREATE TABLE IF NOT EXISTS model_registry (
+  id                INTEGER PRIMARY KEY AUTOINCREMENT,
+  region            TEXT NOT NULL,
+  province          TEXT,
+  weekday           INTEGER CHECK (weekday >= 0 AND weekday <= 6),
+  version           TEXT NOT NULL,
+  status            TEXT NOT NULL DEFAULT 'active',
+  file_path         TEXT NOT NULL,
+  train_start_date  TEXT,
+  train_end_date    TEXT,
+  train_draws       INTEGER,
+  metric_auc        REAL,
+  metric_hit_rate   REAL,
+  trained_at        TEXT DEFAULT CURRENT_TIMESTAMP,
+  created_at        TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_registry_region ON model_registry(region, province);
+
+CREATE TABLE IF NOT EXISTS prediction_results (
+  id               INTEGER PRIMARY KEY AUTOINCREMENT,
+  prediction_date  TEXT NOT NULL,
+  region           TEXT NOT NULL,
+  province         TEXT,
+  pair_1           INTEGER NOT NULL,
+  pair_2           INTEGER NOT NULL,
+  pair_3           INTEGER NOT NULL,
+  prob_1           REAL,
+  prob_2           REAL,
+  prob_3           REAL,
+  model_version    TEXT,
+  hit              BOOLEAN,
+  matched_pairs    JSON,
+  tail_set         JSON,
+  verified_at      TEXT,
+  created_at       TEXT DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE (prediction_date, region, province)
+);
+CREATE INDEX IF NOT EXISTS idx_pr_date ON prediction_results(prediction_date);
+
+CREATE TABLE IF NOT EXISTS training_queue (
+  id               INTEGER PRIMARY KEY AUTOINCREMENT,
+  region           TEXT NOT NULL,
+  province         TEXT,
+  trigger_reason   TEXT NOT NULL,
+  new_draws        INTEGER,
+  train_draws      INTEGER,
+  hit_rate_train   REAL,
+  hit_rate_recent  REAL,
+  status           TEXT NOT NULL DEFAULT 'pending',
+  gh_run_id        TEXT,
+  notified_at      TEXT,
+  completed_at     TEXT,
+  created_at       TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_tq_status ON training_queue(status);
+
+CREATE TABLE IF NOT EXISTS profit_tracking (
+  id               TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+  prediction_date  TEXT NOT NULL,
+  region           TEXT NOT NULL CHECK (region IN ('xsmn', 'xsmb')),
+  province         TEXT,
+  pair             INTEGER NOT NULL,
+  hit_count        INTEGER NOT NULL DEFAULT 0,
+  cost             INTEGER NOT NULL,
+  revenue          INTEGER NOT NULL,
+  profit           INTEGER NOT NULL,
+  created_at       TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE (prediction_date, region, province, pair)
+);
+
+-- Mảng 100 phần tử → JSON. SQLite không có NULLS NOT DISTINCT: XSMB (province NULL) upsert lại sẽ thêm row
+CREATE TABLE IF NOT EXISTS pair_features_compact (
+  id              INTEGER PRIMARY KEY AUTOINCREMENT,
+  feature_date    TEXT NOT NULL,
+  region          TEXT NOT NULL,
+  province        TEXT,
+  day_of_week     INTEGER,
+  freq_30         JSON NOT NULL,
+  freq_60         JSON NOT NULL,
+  freq_100        JSON NOT NULL,
+  gap_since_last  JSON NOT NULL,
+  avg_gap_100     JSON NOT NULL,
+  std_gap_100     JSON NOT NULL,
+  gap_zscore      JSON NOT NULL,
+  hit             JSON,
+  UNIQUE (feature_date, region, province)
+);
+CREATE INDEX IF NOT EXISTS idx_pfc_region_date ON pair_features_compact(region, province, feature_date);
+
+CREATE TABLE IF NOT EXISTS no_draw_dates (
+  draw_date     TEXT NOT NULL,
+  region        TEXT NOT NULL,
+  province      TEXT NOT NULL DEFAULT '',
+  reason        TEXT,
+  confirmed_at  TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (draw_date, region, province)
+);
+
+CREATE TABLE IF NOT EXISTS sync_checkpoints (
+  name            TEXT PRIMARY KEY,
+  last_id         INTEGER,
+  last_date       TEXT,
+  rows_processed  INTEGER NOT NULL DEFAULT 0,
+  updated_at      TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE VIEW IF NOT EXISTS pending_tail_draws AS
+SELECT d.* FROM lottery_draws d
+WHERE NOT EXISTS (SELECT 1 FROM tails_2d t WHERE t.draw_id = d.id);
+
+CREATE VIEW IF NOT EXISTS pending_draw_tails AS
+SELECT d.* FROM lottery_draws d
+WHERE NOT EXISTS (SELECT 1 FROM draw_tails t WHERE t.draw_id = d.id);
+"""
+
+_OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=",
+              "like": "LIKE", "ilike": "LIKE"}
+_IS_VALUES = {"null": "NULL", "true": "1", "false": "0"}
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def use_sqlite_backend() -> bool:
+    """True nếu LOTTERY_DB_BACKEND=sqlite."""
+    return os.getenv(DB_BACKEND_ENV, "supabase").strip().lower() == "sqlite"
+
+
+def _ident(name: str) -> str:
+    name = name.strip()
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Tên cột/bảng không hợp lệ: {name!r}")
+    return f'"{name}"'
+
+
+def _to_db(value: Any) -> Any:
+    """Giá trị Python → giá trị lưu SQLite (date → ISO, list/dict → JSON)."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(list(value) if isinstance(value, tuple) else value)
+    return value
+
+
+class SQLiteResponse:
+    """Giống APIResponse của postgrest: .data (list dict), .count."""
+
+    def __init__(self, data: List[Dict], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Tách 'a,b,and(c,d)' theo dấu phẩy ngoài ngoặc / ngoài chuỗi "..."."""
+    parts, depth, quoted, buf, i = [], 0, False, [], 0
+    while i < len(text):
+        ch = text[i]
+        if quoted:
+            buf.append(ch)
+            if ch == "\\" and i + 1 < len(text):
+                buf.append(text[i + 1])
+                i += 1
+            elif ch == '"':
+                quoted = False
+        elif ch == '"':
+            quoted = True
+            buf.append(ch)
+        elif ch == "(":
+            depth += 1
+            buf.append(ch)
+        elif ch == ")":
+            depth -= 1
+            buf.append(ch)
+        elif ch == "," and depth == 0:
+            parts.append("".join(buf))
+            buf = []
+        else:
+            buf.append(ch)
+        i += 1
+    if buf:
+        parts.append("".join(buf))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+
+class SQLiteQuery:
+    """Query builder cho 1 bảng, API giống supabase-py (phần các script dùng)."""
+
+    def __init__(self, client: "SQLiteClient", table: str):
+        self.client = client
+        self.table = table
+        self._action = "select"
+        self._columns = "*"
+        self._count = None
+        self._payload: Union[Dict, List[Dict], None] = None
+        self._on_conflict: Optional[str] = None
+        self._returning = "representation"
+        self._where: List[str] = []
+        self._params: List[Any] = []
+        self._order: List[str] = []
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+        self._negate_next = False
+
+    # ==================== ACTIONS ====================
+
+    def select(self, *columns: str, count: Optional[str] = None) -> "SQLiteQuery":
+        self._action = "select"
+        cols = ",".join(columns) if columns else "*"
+        self._columns = "*" if cols.strip() == "*" else ",".join(_ident(c) for c in cols.split(",") if c.strip())
+        self._count = count
+        return self
+
+    def insert(self, rows: Union[Dict, List[Dict]], returning: str = "representation", **_) -> "SQLiteQuery":
+        self._action, self._payload, self._returning = "insert", rows, returning
+        return self
+
+    def upsert(
+        self,
+        rows: Union[Dict, List[Dict]],
+        on_conflict: str = "",
+        returning: str = "representation",
+        ignore_duplicates: bool = False,
+        **_,
+    ) -> "SQLiteQuery":
+        self._action, self._payload, self._returning = "upsert", rows, returning
+        self._on_conflict = on_conflict or "id"
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values: Dict, returning: str = "representation", **_) -> "SQLiteQuery":
+        self._action, self._payload, self._returning = "update", values, returning
+        return self
+
+    def delete(self, returning: str = "representation", **_) -> "SQLiteQuery":
+        self._action, self._returning = "delete", returning
+        return self
+
+    # ==================== FILTERS ====================
+
+    @property
+    def not_(self) -> "SQLiteQuery":
+        self._negate_next = True
+        return self
+
+    def _add(self, clause: str, params: Sequence[Any] = ()):
+        if self._negate_next:
+            clause = f"NOT ({clause})"
+            self._negate_next = False
+        self._where.append(clause)
+        self._params.extend(params)
+        return self
+
+    def _compare(self, column: str, op: str, value: Any) -> "SQLiteQuery":
+        return self._add(f"{_ident(column)} {_OPERATORS[op]} ?", [_to_db(value)])
+
+    def eq(self, column: str, value: Any):
+        return self._compare(column, "eq", value)
+
+    def neq(self, column: str, value: Any):
+        return self._compare(column, "neq", value)
+
+    def gt(self, column: str, value: Any):
+        return self._compare(column, "gt", value)
+
+    def gte(self, column: str, value: Any):
+        return self._compare(column, "gte", value)
+
+    def lt(self, column: str, value: Any):
+        return self._compare(column, "lt", value)
+
+    def lte(self, column: str, value: Any):
+        return self._compare(column, "lte", value)
+
+    def like(self, column: str, pattern: str):
+        return self._add(f"{_ident(column)} LIKE ?", [pattern.replace("*", "%")])
+
+    def ilike(self, column: str, pattern: str):
+        return self._add(f"LOWER({_ident(column)}) LIKE LOWER(?)", [pattern.replace("*", "%")])
+
+    def in_(self, column: str, values: Sequence[Any]):
+        values = list(values)
+        if not values:
+            return self._add("0")
+        return self._add(f"{_ident(column)} IN ({','.join('?' * len(values))})", [_to_db(v) for v in values])
+
+    def is_(self, column: str, value: Any):
+        keyword = _IS_VALUES[str(value).lower() if value is not None else "null"]
+        return self._add(f"{_ident(column)} IS {keyword}")
+
+    def or_(self, filters: str, reference_table: Optional[str] = None):
+        """Filter OR theo cú pháp PostgREST: 'a.eq.1,b.is.null,and(c.eq."x",d.gt.2)'."""
+        clause, params = self._parse_logic("or", filters)
+        return self._add(f"({clause})", params)
+
+    def _parse_logic(self, op: str, body: str):
+        clauses, params = [], []
+        for term in _split_top_level(body):
+            negate = term.startswith("not.")
+            if negate:
+                term = term[4:]
+            m = re.match(r"^(and|or)\((.*)\)$", term, re.S)
+            if m:
+                clause, sub = self._parse_logic(m.group(1), m.group(2))
+            else:
+                clause, sub = self._parse_condition(term)
+            clauses.append(f"NOT ({clause})" if negate else f"({clause})")
+            params.extend(sub)
+        return f" {op.upper()} ".join(clauses), params
+
+    def _parse_condition(self, term: str):
+        column, op, value = term.split(".", 2)
+        negate = op == "not"
+        if negate:
+            op, value = value.split(".", 1)
+        col = _ident(column)
+        if op == "is":
+            clause, params = f"{col} IS {_IS_VALUES[value.lower()]}", []
+        elif op == "in":
+            items = [_unquote(v) for v in _split_top_level(value.strip()[1:-1])]
+            clause = f"{col} IN ({','.join('?' * len(items))})" if items else "0"
+            params = [self.client.coerce(self.table, column, v) for v in items]
+        elif op in _OPERATORS:
+            raw = _unquote(value)
+            if op in ("like", "ilike"):
+                raw = raw.replace("*", "%")
+            clause = f"{col} {_OPERATORS[op]} ?" if op != "ilike" else f"LOWER({col}) LIKE LOWER(?)"
+            params = [self.client.coerce(self.table, column, raw)]
+        else:
+            raise ValueError(f"Toán tử filter chưa hỗ trợ: {op}")
+        return (f"NOT ({clause})" if negate else clause), params
+
+    # ==================== MODIFIERS ====================
+
+    def order(self, column: str, desc: bool = False, nullsfirst: Optional[bool] = None, **_):
+        # Postgres: ASC → NULLS LAST, DESC → NULLS FIRST
+        nulls_first = desc if nullsfirst is None else nullsfirst
+        self._order.append(f"{_ident(column)} {'DESC' if desc else 'ASC'} NULLS {'FIRST' if nulls_first else 'LAST'}")
+        return self
+
+    def limit(self, size: int, **_):
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int, **_):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    # ==================== EXECUTE ====================
+
+    def _where_sql(self) -> str:
+        return f" WHERE {' AND '.join(self._where)}" if self._where else ""
+
+    def execute(self) -> SQLiteResponse:
+        return getattr(self, f"_execute_{self._action}")()
+
+    def _execute_select(self) -> SQLiteResponse:
+        sql = f"SELECT {self._columns} FROM {_ident(self.table)}{self._where_sql()}"
+        if self._order:
+            sql += " ORDER BY " + ", ".join(self._order)
+        if self._limit is not None or self._offset is not None:
+            sql += f" LIMIT {int(self._limit if self._limit is not None else -1)} OFFSET {int(self._offset or 0)}"
+        rows = self.client.query(self.table, sql, self._params)
+        count = None
+        if self._count:
+            count_sql = f"SELECT COUNT(*) AS n FROM {_ident(self.table)}{self._where_sql()}"
+            count = self.client.query(None, count_sql, self._params)[0]["n"]
+        return SQLiteResponse(rows, count)
+
+    def _rows(self) -> List[Dict]:
+        return [self._payload] if isinstance(self._payload, dict) else list(self._payload or [])
+
+    def _execute_insert(self) -> SQLiteResponse:
+        return self._write_rows(conflict_sql="")
+
+    def _execute_upsert(self) -> SQLiteResponse:
+        keys = [k.strip() for k in self._on_conflict.split(",")]
+        target = ",".join(_ident(k) for k in keys)
+        if self._ignore_duplicates:
+            return self._write_rows(conflict_sql=f" ON CONFLICT ({target}) DO NOTHING")
+        return self._write_rows(conflict_sql=f" ON CONFLICT ({target}) DO UPDATE SET {{updates}}", keys=keys)
+
+    def _write_rows(self, conflict_sql: str, keys: Sequence[str] = ()) -> SQLiteResponse:
+        rows = self._rows()
+        # Gom theo tập cột để mỗi nhóm là 1 câu INSERT (executemany)
+        groups: Dict[tuple, List[Dict]] = {}
+        for row in rows:
+            groups.setdefault(tuple(row.keys()), []).append(row)
+
+        returned: List[Dict] = []
+        statements = []
+        for cols, group in groups.items():
+            sql = (f"INSERT INTO {_ident(self.table)} ({','.join(_ident(c) for c in cols)}) "
+                   f"VALUES ({','.join('?' * len(cols))})")
+            if conflict_sql:
+                updates = ",".join(f"{_ident(c)}=excluded.{_ident(c)}" for c in cols if c not in keys)
+                sql += conflict_sql.format(updates=updates) if updates else \
+                    conflict_sql.split(" DO ")[0] + " DO NOTHING"
+            params = [[_to_db(row[c]) for c in cols] for row in group]
+            statements.append((sql, params))
+        returned = self.client.write(self.table, statements, self._returning == "representation")
+        return SQLiteResponse(returned)
+
+    def _execute_update(self) -> SQLiteResponse:
+        values = self._payload or {}
+        sets = ",".join(f"{_ident(c)}=?" for c in values)
+        sql = f"UPDATE {_ident(self.table)} SET {sets}{self._where_sql()}"
+        params = [_to_db(v) for v in values.values()] + self._params
+        return SQLiteResponse(self.client.write(self.table, [(sql, [params])], self._returning == "representation"))
+
+    def _execute_delete(self) -> SQLiteResponse:
+        sql = f"DELETE FROM {_ident(self.table)}{self._where_sql()}"
+        return SQLiteResponse(self.client.write(self.table, [(sql, [self._params])], self._returning == "representation"))
+
+
+class LocalBucket:
+    """Bucket Storage trên đĩa: upload(file, path) / download(path) → bytes."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, path: str) -> str:
+        full = os.path.normpath(os.path.join(self.root, path))
+        if not full.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Đường dẫn không hợp lệ: {path}")
+        return full
+
+    def upload(self, file, path: str, file_options: Optional[Dict] = None):
+        full = self._path(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        data = file.read() if hasattr(file, "read") else open(file, "rb").read()
+        tmp_path = f"{full}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, full)
+        return {"Key": path}
+
+    def download(self, path: str) -> bytes:
+        with open(self._path(path), "rb") as f:
+            return f.read()
+
+
+class LocalStorage:
+    def __init__(self, root: str):
+        self.root = root
+
+    def from_(self, bucket: str) -> LocalBucket:
+        return LocalBucket(os.path.join(self.root, bucket))
+
+
+class LocalStorageClient:
+    """Chỉ có .storage (LotteryStorage ở chế độ offline không cần mở DB)."""
+
+    def __init__(self, storage_dir: Optional[str] = None):
+        self.storage = LocalStorage(storage_dir or os.getenv("LOTTERY_STORAGE_DIR", DEFAULT_STORAGE_DIR))
+
+
+class SQLiteClient:
+    """Thay cho supabase Client: .table(name) và .storage trên SQLite + thư mục local."""
+
+    def __init__(self, path: Optional[str] = None, storage_dir: Optional[str] = None):
+        self.path = path or os.getenv("LOTTERY_SQLITE_PATH", DEFAULT_SQLITE_PATH)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.storage = LocalStorage(storage_dir or os.getenv("LOTTERY_STORAGE_DIR", DEFAULT_STORAGE_DIR))
+        # Dùng chung 1 connection giữa các thread (scheduler train, backfill), khóa khi truy cập
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+            self._upgrade_schema()
+        self._types: Dict[str, Dict[str, str]] = {}
+
+    def _upgrade_schema(self):
+        """File SQLite tạo trước migration 07: no_draw_dates chưa có province (đổi PK → dựng lại bảng)."""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(no_draw_dates)")}
+        if "province" in columns:
+            return
+        self._conn.executescript("""
+            ALTER TABLE no_draw_dates RENAME TO no_draw_dates_old;
+            CREATE TABLE no_draw_dates (
+              draw_date     TEXT NOT NULL,
+              region        TEXT NOT NULL,
+              province      TEXT NOT NULL DEFAULT '',
+              reason        TEXT,
+              confirmed_at  TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+              PRIMARY KEY (draw_date, region, province)
+            );
+            INSERT INTO no_draw_dates (draw_date, region, reason, confirmed_at)
+              SELECT draw_date, region, reason, confirmed_at FROM no_draw_dates_old;
+            DROP TABLE no_draw_dates_old;
+        """)
+
+    def table(self, name: str) -> SQLiteQuery:
+        return SQLiteQuery(self, name)
+
+    def from_(self, name: str) -> SQLiteQuery:
+        return self.table(name)
+
+    def column_types(self, table: str) -> Dict[str, str]:
+        types = self._types.get(table)
+        if types is None:
+            with self._lock:
+                info = self._conn.execute(f"PRAGMA table_info({_ident(table)})").fetchall()
+            if not info:
+                raise ValueError(f"Bảng không tồn tại: {table}")
+            types = self._types[table] = {row["name"]: row["type"].upper() for row in info}
+        return types
+
+    def coerce(self, table: str, column: str, value: str) -> Any:
+        """Giá trị dạng chuỗi (từ filter or_) → kiểu của cột."""
+        kind = self.column_types(table).get(column, "")
+        if value.lower() == "null":
+            return None
+        if kind == "BOOLEAN":
+            return {"true": 1, "false": 0}.get(value.lower(), value)
+        try:
+            if kind == "INTEGER":
+                return int(value)
+            if kind == "REAL":
+                return float(value)
+        except ValueError:
+            pass
+        return value
+
+    def _decode(self, table: Optional[str], rows: List[sqlite3.Row]) -> List[Dict]:
+        if not rows:
+            return []
+        result = [dict(row) for row in rows]
+        if table is None:
+            return result
+        types = self.column_types(table)
+        bools = [c for c in result[0] if types.get(c) == "BOOLEAN"]
+        arrays = [c for c in result[0] if types.get(c) == "JSON"]
+        for row in result:
+            for c in bools:
+                if row[c] is not None:
+                    row[c] = bool(row[c])
+            for c in arrays:
+                if row[c] is not None:
+                    row[c] = json.loads(row[c])
+        return result
+
+    def query(self, table: Optional[str], sql: str, params: Sequence[Any]) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(sql, list(params)).fetchall()
+        return self._decode(table, rows)
+
+    def write(self, table: str, statements: List[tuple], returning: bool) -> List[Dict]:
+        """Chạy các câu ghi trong 1 transaction; returning=True → trả về rows đã ghi (RETURNING *)."""
+        rows: List[sqlite3.Row] = []
+        with self._lock:
+            try:
+                for sql, param_rows in statements:
+                    if returning:
+                        for params in param_rows:
+                            rows.extend(self._conn.execute(sql + " RETURNING *", params).fetchall())
+                    else:
+                        self._conn.executemany(sql, param_rows)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return self._decode(table, rows)
@@ -4,18 +4,49 @@ Quản lý tất cả operations với Supabase database
 """
 
 import os
+import sqlite3
+import time
 from supabase import create_client, Client
 from datetime import datetime, date
-from typing import List, Dict, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
 from dotenv import load_dotenv
 
+from .instrumentation import instrument_client
+from .sqlite_backend import SQLiteClient, use_sqlite_backend
+
+# SQLSTATE class 21 (cardinality_violation, vd 1 chunk upsert trùng khóa on_conflict),
+# 22 (data_exception), 23 (integrity_constraint_violation): lỗi do dữ liệu của row
+ROW_ERROR_SQLSTATES = ("21", "22", "23")
+
+
+def is_row_error(error: Exception) -> bool:
+    """
+    Lỗi do chính các row gửi lên (chia đôi chunk sẽ cô lập được), khác với lỗi mạng / server
+    (timeout, connection reset, 5xx) — gửi lại nguyên chunk là đủ.
+    """
+    code = getattr(error, "code", None)  # postgrest APIError: SQLSTATE của Postgres
+    if isinstance(code, str) and code:
+        return code.startswith(ROW_ERROR_SQLSTATES)
+    # Backend SQLite / lỗi serialize phía client
+    return isinstance(error, (sqlite3.IntegrityError, sqlite3.DataError, TypeError, ValueError))
+
 
 class LotteryDB:
     """Client để tương tác với Supabase database"""
     
     def __init__(self):
-        """Initialize Supabase client với credentials từ environment variables"""
+        """
+        Initialize Supabase client với credentials từ environment variables.
+        LOTTERY_DB_BACKEND=sqlite → dùng file SQLite local (src/database/sqlite_backend.py), không cần Supabase.
+        QUERY_STATS=1 / <path> → đo mọi request (src/database/instrumentation.py).
+        """
         load_dotenv()
+        if use_sqlite_backend():
+            client = SQLiteClient()
+            print(f"🗃️  LotteryDB: SQLite backend ({client.path})")
+            self.supabase = instrument_client(client)
+            return
+
         supabase_url = os.getenv("SUPABASE_URL")
         supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
         
@@ -25,7 +56,7 @@ class LotteryDB:
                 "Set SUPABASE_URL and SUPABASE_SERVICE_KEY environment variables."
             )
         
-        self.supabase: Client = create_client(supabase_url, supabase_key)
+        self.supabase: Client = instrument_client(create_client(supabase_url, supabase_key))
     
     # ==================== LOTTERY DRAWS ====================
     
@@ -83,6 +114,19 @@ class LotteryDB:
             print(f"❌ Error upserting draw: {e}")
             raise
     
+    def upsert_draws(self, draws: List[Dict], chunk_size: int = 500) -> List[Dict]:
+        """
+        Upsert nhiều kết quả quay số theo chunk (xem upsert_many).
+
+        Returns:
+            List outcome theo thứ tự input: {'ok': bool, 'error': str | None}
+        """
+        return self.upsert_many(
+            "lottery_draws", draws,
+            on_conflict="draw_date,region,province",
+            chunk_size=chunk_size,
+        )
+
     def get_historical_data(
         self, 
         region: str, 
@@ -147,6 +191,347 @@ class LotteryDB:
             print(f"❌ Error fetching draw by date: {e}")
             return None
     
+    # ==================== BULK WRITE ====================
+
+    def upsert_many(
+        self,
+        table: str,
+        rows: List[Dict],
+        on_conflict: Optional[str] = None,
+        chunk_size: int = 500,
+        returning: str = "minimal",
+        retries: int = 3,
+        backoff: float = 1.0,
+    ) -> List[Dict]:
+        """
+        Ghi nhiều rows theo chunk (1 HTTP request / chunk).
+
+        - date/datetime được chuyển sang ISO string 1 lần cho mọi cột (không sửa dict gốc)
+        - on_conflict=None → INSERT thường (vd tails_2d không có unique key), ngược lại UPSERT;
+          rows trùng khóa on_conflict chỉ gửi row cuối (Postgres báo 21000 nếu 1 lệnh upsert
+          chạm 1 row 2 lần), các row trùng trước đó nhận outcome của row được gửi
+        - Chunk lỗi do dữ liệu (is_row_error) được chia đôi và thử lại đến khi cô lập được từng row lỗi
+        - Lỗi mạng / server: gửi lại nguyên chunk (backoff lũy thừa), sau `retries` lần thì cả chunk lỗi
+
+        Args:
+            table: tên bảng
+            rows: list dict cần ghi
+            on_conflict: cột unique cho upsert, vd 'draw_date,region,province'
+            chunk_size: số rows mỗi request (vài trăm đến vài nghìn)
+            returning: 'minimal' (không trả data về, tiết kiệm egress) hoặc 'representation'
+            retries: số lần gửi lại 1 chunk khi lỗi mạng / server
+            backoff: thời gian chờ (giây) trước lần gửi lại đầu tiên, gấp đôi mỗi lần sau
+
+        Returns:
+            List outcome theo đúng thứ tự `rows`: {'ok': bool, 'error': str | None}
+        """
+        normalized = [
+            {k: v.isoformat() if isinstance(v, (date, datetime)) else v for k, v in row.items()}
+            for row in rows
+        ]
+        # winner[i] = vị trí row thực sự được gửi thay cho rows[i] (row cuối cùng cùng khóa on_conflict).
+        # Khóa có NULL không trùng nhau trong unique của Postgres → giữ nguyên.
+        winner = list(range(len(normalized)))
+        if on_conflict:
+            key_cols = [c.strip() for c in on_conflict.split(",")]
+            last: Dict[tuple, int] = {}
+            for i, row in enumerate(normalized):
+                key = tuple(row.get(c) for c in key_cols)
+                if None not in key:
+                    last[key] = i
+            for i, row in enumerate(normalized):
+                key = tuple(row.get(c) for c in key_cols)
+                if None not in key:
+                    winner[i] = last[key]
+        sent = [i for i in range(len(normalized)) if winner[i] == i]
+        if len(sent) < len(normalized):
+            print(f"  ℹ️  {table}: bỏ {len(normalized) - len(sent)} row trùng khóa {on_conflict} (giữ row cuối)")
+        normalized = [normalized[i] for i in sent]
+        outcomes: List[Dict] = [{"ok": False, "error": None} for _ in normalized]
+
+        def send(chunk: List[Dict]):
+            if on_conflict:
+                self.supabase.table(table).upsert(
+                    chunk, on_conflict=on_conflict, returning=returning
+                ).execute()
+            else:
+                self.supabase.table(table).insert(chunk, returning=returning).execute()
+
+        def write(start: int, end: int):
+            for attempt in range(retries + 1):
+                try:
+                    send(normalized[start:end])
+                except Exception as e:
+                    if is_row_error(e):
+                        if end - start == 1:
+                            outcomes[start] = {"ok": False, "error": str(e)}
+                            return
+                        # Bisect: thử lại từng nửa để cô lập row lỗi
+                        mid = (start + end) // 2
+                        write(start, mid)
+                        write(mid, end)
+                        return
+                    if attempt == retries:
+                        for i in range(start, end):
+                            outcomes[i] = {"ok": False, "error": str(e)}
+                        return
+                    wait = backoff * 2 ** attempt
+                    print(f"  ⚠️  {table}: rows {start}–{end} lỗi ({e}), gửi lại sau {wait:.0f}s "
+                          f"({attempt + 1}/{retries})")
+                    time.sleep(wait)
+                    continue
+                for i in range(start, end):
+                    outcomes[i] = {"ok": True, "error": None}
+                return
+
+        for start in range(0, len(normalized), chunk_size):
+            write(start, min(start + chunk_size, len(normalized)))
+
+        position = {i: j for j, i in enumerate(sent)}
+        outcomes = [outcomes[position[winner[i]]] for i in range(len(rows))]
+        failed = [o for o in outcomes if not o["ok"]]
+        if failed:
+            print(f"❌ {table}: {len(failed)}/{len(rows)} rows lỗi (vd: {failed[0]['error']})")
+        return outcomes
+
+    # ==================== STREAMING ====================
+
+    def stream(
+        self,
+        table: str,
+        columns: Union[str, Sequence[str]] = "*",
+        filters: Optional[Dict[str, Any]] = None,
+        where: Optional[Callable] = None,
+        key: Sequence[str] = ("draw_date", "id"),
+        page_size: int = 1000,
+        output: str = "rows",
+    ) -> Iterator:
+        """
+        Đọc toàn bộ 1 bảng theo keyset pagination (không dùng offset).
+
+        Mỗi trang lấy các row có key > key của row cuối trang trước, nên không bị
+        chậm dần ở trang sâu và không skip/duplicate row khi bảng đang được ghi.
+
+        Args:
+            table: tên bảng
+            columns: cột cần lấy (chuỗi "a,b" hoặc list). Cột key luôn được thêm vào.
+            filters: {cột: giá trị} — None → IS NULL, list/tuple/set → IN, còn lại → EQ
+            where: hàm nhận query builder và trả về query đã thêm filter (vd `.not_.is_(...)`)
+            key: các cột tạo thành khóa sắp xếp duy nhất, vd ("draw_date", "id")
+            page_size: số row mỗi request
+            output: 'rows' (từng dict), 'pages' (list dict mỗi trang),
+                    'frame' (DataFrame mỗi trang), 'numpy' (dict cột → np.ndarray mỗi trang)
+
+        Yields:
+            Row hoặc chunk tùy theo `output`
+        """
+        if output not in ("rows", "pages", "frame", "numpy"):
+            raise ValueError(f"output không hợp lệ: {output}")
+
+        key = list(key)
+        if isinstance(columns, str):
+            columns = [c.strip() for c in columns.split(",") if c.strip()]
+        if "*" not in columns:
+            columns = list(columns) + [k for k in key if k not in columns]
+        select_cols = ",".join(columns)
+
+        cursor = None
+        while True:
+            query = self.supabase.table(table).select(select_cols)
+            query = self._apply_filters(query, filters)
+            if where is not None:
+                query = where(query)
+            if cursor is not None:
+                if len(key) > 1:
+                    # gte trên cột đầu để Postgres dùng được index, or_ để loại các row đã đọc
+                    query = query.gte(key[0], cursor[0]).or_(self._keyset_condition(key, cursor))
+                else:
+                    query = query.gt(key[0], cursor[0])
+            for k in key:
+                query = query.order(k)
+
+            page = query.limit(page_size).execute().data
+            if not page:
+                break
+
+            if output == "rows":
+                yield from page
+            elif output == "pages":
+                yield page
+            else:
+                import pandas as pd
+                frame = pd.DataFrame(page)
+                if output == "frame":
+                    yield frame
+                else:
+                    yield {col: frame[col].to_numpy() for col in frame.columns}
+
+            if len(page) < page_size:
+                break
+            cursor = [page[-1][k] for k in key]
+
+    @staticmethod
+    def _apply_filters(query, filters: Optional[Dict[str, Any]]):
+        """Thêm các filter dạng {cột: giá trị} vào query (None → IS NULL, list → IN)."""
+        for col, value in (filters or {}).items():
+            if value is None:
+                query = query.is_(col, "null")
+            elif isinstance(value, (list, tuple, set)):
+                query = query.in_(col, list(value))
+            else:
+                query = query.eq(col, value.isoformat() if isinstance(value, date) else value)
+        return query
+
+    @staticmethod
+    def _keyset_condition(key: List[str], cursor: List[Any]) -> str:
+        """
+        PostgREST filter cho (k1, k2, ...) > (v1, v2, ...):
+        k1.gt.v1, and(k1.eq.v1, k2.gt.v2), and(k1.eq.v1, k2.eq.v2, k3.gt.v3), ...
+        """
+        def fmt(value):
+            if isinstance(value, (int, float)):
+                return str(value)
+            return '"' + str(value).replace('"', '\\"') + '"'
+
+        terms = []
+        for i, k in enumerate(key):
+            eqs = [f"{key[j]}.eq.{fmt(cursor[j])}" for j in range(i)]
+            cond = f"{k}.gt.{fmt(cursor[i])}"
+            terms.append(f"and({','.join(eqs + [cond])})" if eqs else cond)
+        return ",".join(terms)
+
+    def stream_pair_features(
+        self,
+        columns: Sequence[str],
+        filters: Optional[Dict[str, Any]] = None,
+        labelled: bool = False,
+        after: Optional[Union[str, date]] = None,
+        page_size: int = 1000,
+        layout: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Đọc pair_features theo layout đang dùng (rows | compact), luôn yield dict cột → np.ndarray
+        mỗi trang, thứ tự (feature_date, pair) — người đọc không cần biết layout.
+
+        Args:
+            columns: cột của schema pair_features (pair / is_even / ... được suy ra ở layout compact)
+            filters: {cột: giá trị} như stream(), chỉ trên feature_date / region / province / day_of_week
+            labelled: chỉ lấy ngày đã có label (hit IS NOT NULL)
+            after: chỉ lấy feature_date > after (watermark)
+            page_size: số cặp (≈ rows layout rows) mỗi request
+            layout: None → env PAIR_FEATURES_LAYOUT
+        """
+        from src.features.feature_builder import (
+            COMPACT_ARRAY_COLS, COMPACT_TABLE, decode_compact_columns, pair_features_layout,
+        )
+
+        def where(q):
+            if labelled:
+                q = q.not_.is_("hit", "null")
+            if after:
+                q = q.gt("feature_date", after.isoformat() if isinstance(after, date) else after)
+            return q
+
+        columns = list(columns)
+        if pair_features_layout(layout) == "rows":
+            for chunk in self.stream("pair_features", columns=columns, filters=filters, where=where,
+                                     key=("feature_date", "id"), page_size=page_size, output="numpy"):
+                yield {col: chunk[col] for col in columns}
+            return
+
+        # 1 row compact = 100 cặp; chỉ kéo mảng của các cột được yêu cầu
+        stored = ["feature_date", "region", "province", "day_of_week"]
+        stored += [col for col in columns if col in COMPACT_ARRAY_COLS or col == "hit"]
+        for page in self.stream(COMPACT_TABLE, columns=stored, filters=filters, where=where,
+                                key=("feature_date", "id"), page_size=max(1, page_size // 100),
+                                output="pages"):
+            yield decode_compact_columns(page, columns)
+
+    def recent_draw_dates(
+        self,
+        region: str,
+        province: Optional[str],
+        before: Optional[date] = None,
+        limit: int = 120,
+        layout: Optional[str] = None,
+    ) -> List[str]:
+        """
+        draw_date (ISO) của `limit` kỳ gần nhất TRƯỚC `before` của 1 station, mới nhất trước.
+        1 request ≤ limit rows (1 row / kỳ): draw_tails ở layout bitmap, lottery_draws ở layout rows
+        (XSMB lọc theo region — province trong lottery_draws chỉ là tỉnh quay ngày đó).
+        """
+        from src.features.tail_extractor import DRAW_TAILS_TABLE, tails_layout
+
+        if tails_layout(layout) == "bitmap":
+            table, filters = DRAW_TAILS_TABLE, {"region": region, "province": province}
+        else:
+            table, filters = "lottery_draws", {"region": region} if region == "XSMB" else {"region": region, "province": province}
+        query = self._apply_filters(self.supabase.table(table).select("draw_date"), filters)
+        if before:
+            query = query.lt("draw_date", before.isoformat())
+        rows = query.order("draw_date", desc=True).limit(limit).execute().data
+        return list(dict.fromkeys(str(r["draw_date"])[:10] for r in rows))
+
+    def tail_history(
+        self,
+        region: str,
+        province: Optional[str],
+        before: Optional[date] = None,
+        after: Optional[Union[str, date]] = None,
+        on: Optional[date] = None,
+        since: Optional[Union[str, date]] = None,
+        limit: Optional[int] = None,
+        layout: Optional[str] = None,
+    ):
+        """
+        TAIL_SET theo kỳ của 1 station, đọc tails_2d (layout rows) hoặc draw_tails (layout bitmap).
+
+        Args:
+            before / after / on / since: draw_date < before, > after, = on, >= since
+            limit: chỉ lấy `limit` kỳ gần nhất (None → mọi kỳ). Layout rows (~27 tails / kỳ): tìm ngày
+                   kỳ thứ `limit` (recent_draw_dates) rồi stream từ ngày đó — không bị giới hạn
+                   1000 rows/request cắt cụt; layout bitmap: 1 request `limit` rows (1 row / kỳ)
+            layout: None → env TAILS_LAYOUT
+
+        Returns:
+            DataFrame (draw_date, tail_set) tăng dần theo ngày như _extract_history
+        """
+        from src.features.feature_builder import _extract_history, _extract_history_packed
+        from src.features.tail_extractor import DRAW_TAILS_TABLE, tails_layout
+
+        bitmap = tails_layout(layout) == "bitmap"
+        if bitmap:
+            table, columns, key = DRAW_TAILS_TABLE, "draw_date,tail_mask,tail_counts", ("draw_date", "draw_id")
+            extract = _extract_history_packed
+        else:
+            table, columns, key = "tails_2d", "draw_date,tail_2d", ("draw_date", "id")
+            extract = _extract_history
+
+        def where(q):
+            if before:
+                q = q.lt("draw_date", before.isoformat())
+            if after:
+                q = q.gt("draw_date", after.isoformat() if isinstance(after, date) else after)
+            if since:
+                q = q.gte("draw_date", since.isoformat() if isinstance(since, date) else since)
+            return q.eq("draw_date", on.isoformat()) if on else q
+
+        filters = {"region": region, "province": province}
+        if limit is not None and bitmap:
+            # 1 row / kỳ → limit đúng bằng số kỳ
+            query = self._apply_filters(self.supabase.table(table).select(columns), filters)
+            rows = where(query).order("draw_date", desc=True).limit(limit).execute().data
+            return extract(rows, max_rows=limit)
+        if limit is not None and not on:
+            dates = self.recent_draw_dates(region, province, before=before, limit=limit, layout=layout)
+            if not dates:
+                return extract([], max_rows=0)
+            if not since or dates[-1] > str(since)[:10]:
+                since = dates[-1]
+
+        rows = list(self.stream(table, columns=columns, filters=filters, where=where, key=key))
+        return extract(rows, max_rows=limit or len(rows))
+
     # ==================== PREDICTION RESULTS ====================
     # V3 uses 'prediction_results' table accessed directly via self.supabase.table(...)
     # in scripts/predict_v3.py and scripts/verify_v3.py
@@ -203,6 +588,76 @@ class LotteryDB:
             print(f"❌ Error fetching crawler logs: {e}")
             return []
 
+    # ==================== SYNC CHECKPOINTS ====================
+    # Bảng sync_checkpoints (database/migrations/03_create_sync_checkpoints.sql)
+
+    def get_sync_checkpoint(self, name: str) -> Optional[Dict]:
+        """Checkpoint của bước sync `name` (vd 'tails_2d'), None nếu chưa có."""
+        rows = self.supabase.table("sync_checkpoints")\
+            .select("*")\
+            .eq("name", name)\
+            .execute().data
+        return rows[0] if rows else None
+
+    def save_sync_checkpoint(
+        self,
+        name: str,
+        last_id: Optional[int],
+        last_date: Optional[Union[str, date]] = None,
+        rows_processed: int = 0,
+    ):
+        """Ghi (upsert) watermark của bước sync `name`."""
+        self.supabase.table("sync_checkpoints").upsert({
+            "name":           name,
+            "last_id":        last_id,
+            "last_date":      last_date.isoformat() if isinstance(last_date, date) else last_date,
+            "rows_processed": rows_processed,
+            "updated_at":     datetime.utcnow().isoformat(),
+        }, on_conflict="name").execute()
+
+
+    # ==================== NO-DRAW DATES ====================
+    # Bảng no_draw_dates (database/migrations/06_create_no_draw_dates.sql + 07: cột province)
+    # province = '' → cả region không quay; slug → riêng đài đó không quay
+
+    def get_no_draw_dates(
+        self,
+        region: Optional[str] = None,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+    ) -> List[Dict]:
+        """Các ngày đã xác nhận không quay (draw_date, region, province, reason), lọc theo region / khoảng ngày."""
+        def where(q):
+            if since:
+                q = q.gte("draw_date", since.isoformat())
+            return q.lte("draw_date", until.isoformat()) if until else q
+
+        return list(self.stream(
+            "no_draw_dates",
+            columns="draw_date,region,province,reason",
+            filters={"region": region} if region else None,
+            where=where,
+            key=("draw_date", "region", "province"),
+        ))
+
+    def mark_no_draw_dates(
+        self,
+        region: str,
+        dates: Sequence[date],
+        reason: str = "holiday_page",
+        province: Optional[str] = None,
+    ) -> int:
+        """Ghi (upsert) các ngày region (hoặc riêng 1 đài nếu có province) không quay. Trả về số ngày đã ghi."""
+        rows = [{
+            "draw_date":    d.isoformat() if isinstance(d, date) else d,
+            "region":       region,
+            "province":     province or "",
+            "reason":       reason,
+            "confirmed_at": datetime.utcnow().isoformat(),
+        } for d in dates]
+        outcomes = self.upsert_many("no_draw_dates", rows, on_conflict="draw_date,region,province")
+        return sum(1 for o in outcomes if o["ok"])
+
 
 # ==================== HELPER FUNCTION ====================
 
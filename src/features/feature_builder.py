@@ -10,41 +10,245 @@ Features:
   - is_even, is_high, sum_digits: đặc trưng của cặp số
   - day_of_week: thứ trong tuần
   - hit: label (1 = pair xuất hiện trong TAIL_SET ngày đó)
+
+Layout lưu trữ (PAIR_FEATURES_LAYOUT):
+  - rows:    bảng pair_features, 1 row / (ngày, đài, cặp) — mặc định
+  - compact: bảng pair_features_compact, 1 row / (ngày, đài), mỗi feature là mảng 100 phần tử
+             theo pair 0..99 (encode_compact / decode_compact_columns)
 """
 
+import os
+
 import numpy as np
 import pandas as pd
 from datetime import date
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional, Sequence, Union
+
+from src.features.tail_set import TailSet
 
 
 def _extract_history(tails_data: List[Dict], max_rows: int = 100) -> pd.DataFrame:
     """
     Chuyển list bản ghi tails_2d thành DataFrame theo kỳ.
-    Mỗi kỳ là 1 set các cặp xuất hiện.
+    Mỗi kỳ là 1 TailSet (bitmask + số lần xuất hiện), dựng hàng loạt bằng 1 lần bincount.
 
     Returns:
-        DataFrame indexed by draw_date (sorted ascending), column = 'tail_set' (frozenset)
+        DataFrame indexed by draw_date (sorted ascending), column = 'tail_set' (TailSet)
     """
     if not tails_data:
         return pd.DataFrame(columns=["draw_date", "tail_set"])
 
     df = pd.DataFrame(tails_data)
-    # Group by draw_date → set of tail_2d values
-    grouped = df.groupby("draw_date")["tail_2d"].apply(frozenset).reset_index()
-    grouped.columns = ["draw_date", "tail_set"]
-    grouped["draw_date"] = pd.to_datetime(grouped["draw_date"])
-    grouped = grouped.sort_values("draw_date").tail(max_rows)
-    return grouped
+    # draw_date dạng ISO → sort chuỗi = sort ngày; chỉ dựng TailSet cho max_rows kỳ cuối
+    codes, draw_dates = pd.factorize(df["draw_date"], sort=True)
+    first = max(0, len(draw_dates) - max_rows)
+    keep = codes >= first
+    tail_sets = TailSet.batch(codes[keep] - first, df["tail_2d"].to_numpy()[keep], len(draw_dates) - first)
+    return pd.DataFrame(
+        {"draw_date": pd.to_datetime(draw_dates[first:]), "tail_set": tail_sets},
+        index=pd.RangeIndex(first, len(draw_dates)),
+    )
+
+
+def _extract_history_packed(draw_tails: List[Dict], max_rows: int = 100) -> pd.DataFrame:
+    """
+    Như _extract_history nhưng từ bản ghi draw_tails (1 row / kỳ, TailSet đóng gói).
+    Nhiều kỳ cùng ngày được cộng dồn counts như khi gom tails_2d theo draw_date.
+    """
+    if not draw_tails:
+        return pd.DataFrame(columns=["draw_date", "tail_set"])
+
+    df = pd.DataFrame(draw_tails)
+    codes, draw_dates = pd.factorize(df["draw_date"], sort=True)
+    first = max(0, len(draw_dates) - max_rows)
+    counts = np.zeros((len(draw_dates) - first, 100), dtype=np.int32)
+    for code, mask, packed in zip(codes, df["tail_mask"], df["tail_counts"]):
+        if code >= first:
+            counts[code - first] += TailSet.from_packed(mask, packed).counts
+    return pd.DataFrame(
+        {"draw_date": pd.to_datetime(draw_dates[first:]), "tail_set": [TailSet(row) for row in np.minimum(counts, 255)]},
+        index=pd.RangeIndex(first, len(draw_dates)),
+    )
+
+
+def history_to_bitmap(history: pd.DataFrame) -> np.ndarray:
+    """
+    Chuyển history (từ _extract_history) thành ma trận bool (n_draws × 100).
+    bitmap[i, p] = True nếu cặp p xuất hiện ở kỳ thứ i (sắp xếp tăng dần theo ngày).
+    """
+    return TailSet.stack(history["tail_set"].tolist()) > 0
+
+
+FREQ_WINDOWS = (30, 60, 100)
+
+# TAIL_SET của target_date: TailSet, hoặc set / list tail_2d
+TailSetLike = Union[TailSet, Iterable[int]]
+
+
+def compute_pair_stats(bitmap: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Tính freq/gap features cho cả 100 cặp cùng lúc từ bitmap (n_draws × 100).
+    Cho kết quả giống hệt bản loop (_build_features_for_day_loop), đã làm tròn.
+
+    Returns:
+        Dict column → array 100 phần tử (index = pair)
+    """
+    n = bitmap.shape[0]
+    counts = bitmap.sum(axis=0)
+
+    # Số lần xuất hiện trong N kỳ gần nhất
+    window_hits = {w: bitmap[-w:].sum(axis=0) for w in FREQ_WINDOWS}
+
+    # Vị trí xuất hiện đầu / cuối của mỗi cặp
+    seen = counts > 0
+    if n > 0:
+        first_pos = np.argmax(bitmap, axis=0)
+        gap_since_last = np.where(seen, np.argmax(bitmap[::-1], axis=0), n)  # = n - 1 - pos_last
+    else:
+        first_pos = np.zeros(100, dtype=np.int64)
+        gap_since_last = np.zeros(100, dtype=np.int64)
+    last_pos = n - 1 - gap_since_last
+
+    # Gap analysis: tổng gap = last - first (telescoping), tổng bình phương qua np.diff
+    pairs, positions = np.nonzero(bitmap.T)  # sorted theo pair rồi theo vị trí
+    same_pair = pairs[1:] == pairs[:-1]
+    gaps = np.diff(positions)[same_pair]
+    gap_sq_sum = np.bincount(pairs[1:][same_pair], weights=gaps.astype(np.float64) ** 2, minlength=100)
+
+    gap_sum = np.where(counts >= 2, last_pos - first_pos, 0)
+    return pair_stats_from_sums(n, counts, window_hits, gap_since_last, gap_sum, gap_sq_sum.astype(np.int64))
+
+
+def pair_stats_from_sums(
+    n: int,
+    counts: np.ndarray,
+    window_hits: Dict[int, np.ndarray],
+    gap_since_last: np.ndarray,
+    gap_sum: np.ndarray,
+    gap_sq_sum: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """
+    Tính feature columns từ các tổng tích lũy (dùng chung cho bitmap engine
+    và PairRollingState để 2 đường cho kết quả giống hệt nhau).
+
+    Args:
+        n: số kỳ trong history
+        counts: số kỳ mỗi cặp xuất hiện
+        window_hits: {30/60/100: số kỳ xuất hiện trong N kỳ gần nhất}
+        gap_since_last: số kỳ từ lần xuất hiện cuối (n nếu chưa xuất hiện)
+        gap_sum, gap_sq_sum: Σgap và Σgap² giữa các lần xuất hiện liên tiếp (int)
+    """
+    # Frequency trong N kỳ gần nhất
+    freqs = {}
+    for window in FREQ_WINDOWS:
+        if n > 0:
+            freqs[window] = np.round(window_hits[window] / min(n, window), 4)
+        else:
+            freqs[window] = np.zeros(100)
+
+    seen = counts > 0
+    multi = counts >= 2
+    n_gaps = np.maximum(counts - 1, 1).astype(np.int64)
+    gap_sum = np.asarray(gap_sum, dtype=np.int64)
+
+    avg_gap = np.where(seen, gap_since_last, n if n > 0 else 100).astype(np.float64)
+    avg_gap[multi] = gap_sum[multi] / n_gaps[multi]
+
+    # var = (m·Σg² − (Σg)²) / m² — tính tử số bằng số nguyên để không mất chính xác
+    var_num = n_gaps * np.asarray(gap_sq_sum, dtype=np.int64) - gap_sum ** 2
+    std_gap = np.zeros(100)
+    std_gap[multi] = np.sqrt(var_num[multi] / (n_gaps[multi] * n_gaps[multi]))
+
+    gap_zscore = (gap_since_last - avg_gap) / (std_gap + 1e-6)
+
+    return {
+        "freq_30":        freqs[30],
+        "freq_60":        freqs[60],
+        "freq_100":       freqs[100],
+        "gap_since_last": np.asarray(gap_since_last, dtype=np.int64),
+        # round() của Python (làm tròn chính xác) như bản gốc, không dùng np.round
+        "avg_gap_100":    np.array([round(v, 2) for v in avg_gap.tolist()]),
+        "std_gap_100":    np.array([round(v, 2) for v in std_gap.tolist()]),
+        "gap_zscore":     np.array([round(v, 4) for v in gap_zscore.tolist()]),
+    }
+
+
+def feature_rows_from_stats(
+    target_date: date,
+    pair_stats: Dict[str, np.ndarray],
+    target_tail_set: Optional[TailSetLike] = None,
+) -> List[Dict]:
+    """Ghép feature columns (từ compute_pair_stats) thành 100 dict như schema pair_features."""
+    dow = target_date.weekday()  # 0=Mon..6=Sun
+    feature_date = target_date.isoformat()
+    stats = {col: values.tolist() for col, values in pair_stats.items()}
+    # Label
+    hits = TailSet.coerce(target_tail_set).bitmap.tolist() if target_tail_set is not None else [None] * 100
+
+    rows = []
+    for pair in range(100):
+        hit = hits[pair]
+
+        rows.append({
+            "feature_date":  feature_date,
+            "pair":          pair,
+            "freq_30":       stats["freq_30"][pair],
+            "freq_60":       stats["freq_60"][pair],
+            "freq_100":      stats["freq_100"][pair],
+            "gap_since_last":stats["gap_since_last"][pair],
+            "avg_gap_100":   stats["avg_gap_100"][pair],
+            "std_gap_100":   stats["std_gap_100"][pair],
+            "gap_zscore":    stats["gap_zscore"][pair],
+            "is_even":       pair % 2 == 0,
+            "is_high":       pair >= 50,
+            "sum_digits":    (pair // 10) + (pair % 10),
+            "day_of_week":   dow,
+            "hit":           hit,
+        })
+
+    return rows
+
+
+def build_features_from_bitmap(
+    target_date: date,
+    bitmap: np.ndarray,      # (n_draws × 100), KHÔNG bao gồm target_date
+    target_tail_set: Optional[TailSetLike] = None,
+) -> List[Dict]:
+    """
+    Tính 100 feature rows từ bitmap lịch sử. Dùng chung cho build_features_for_day
+    và các đường backfill đã có sẵn bitmap.
+    """
+    return feature_rows_from_stats(target_date, compute_pair_stats(bitmap), target_tail_set)
 
 
 def build_features_for_day(
     target_date: date,
     history: pd.DataFrame,   # from _extract_history, does NOT include target_date
-    target_tail_set: Optional[frozenset] = None,  # TAIL_SET của target_date (nếu biết)
+    target_tail_set: Optional[TailSetLike] = None,  # TAIL_SET của target_date (nếu biết)
 ) -> List[Dict]:
     """
     Tính feature vector cho 100 cặp (00–99) tại target_date.
+    Dùng bitmap engine (vectorized) — output giống hệt bản loop cũ.
+
+    Args:
+        target_date: ngày cần tính feature
+        history: DataFrame lịch sử (không bao gồm target_date)
+        target_tail_set: TAIL_SET của target_date (để tính label hit). None nếu đang predict tương lai.
+
+    Returns:
+        List of 100 dicts (1 dict per pair 0–99)
+    """
+    return build_features_from_bitmap(target_date, history_to_bitmap(history), target_tail_set)
+
+
+def _build_features_for_day_loop(
+    target_date: date,
+    history: pd.DataFrame,   # from _extract_history, does NOT include target_date
+    target_tail_set: Optional[TailSetLike] = None,  # TAIL_SET của target_date (nếu biết)
+) -> List[Dict]:
+    """
+    Bản cài đặt gốc (loop 100 cặp × pandas apply). Giữ lại làm reference
+    để kiểm tra parity với bitmap engine — KHÔNG dùng trong pipeline.
 
     Args:
         target_date: ngày cần tính feature
@@ -146,3 +350,99 @@ def build_feature_matrix(feature_rows: List[Dict]) -> pd.DataFrame:
         y = None
 
     return X, y
+
+
+# ==================== COMPACT LAYOUT ====================
+
+COMPACT_TABLE = "pair_features_compact"
+PAIR_FEATURES_LAYOUTS = ("rows", "compact")
+DEFAULT_PAIR_FEATURES_LAYOUT = "rows"  # khi chưa đặt env PAIR_FEATURES_LAYOUT
+
+# Cột lưu dạng mảng 100 phần tử (index = pair); is_even / is_high / sum_digits suy ra từ pair
+COMPACT_ARRAY_COLS = (
+    "freq_30", "freq_60", "freq_100",
+    "gap_since_last", "avg_gap_100", "std_gap_100", "gap_zscore",
+)
+_PAIRS = np.arange(100)
+_DERIVED_COLS = {
+    "pair":       _PAIRS,
+    "is_even":    _PAIRS % 2 == 0,
+    "is_high":    _PAIRS >= 50,
+    "sum_digits": _PAIRS // 10 + _PAIRS % 10,
+}
+
+
+def pair_features_layout(layout: Optional[str] = None) -> str:
+    """
+    Layout đang dùng ('rows' | 'compact'), mặc định theo env PAIR_FEATURES_LAYOUT.
+    Đọc env mỗi lần gọi (không lúc import) để giá trị trong .env — nạp bởi LotteryDB() — vẫn có hiệu lực.
+    """
+    layout = (layout or os.getenv("PAIR_FEATURES_LAYOUT") or DEFAULT_PAIR_FEATURES_LAYOUT).strip().lower()
+    if layout not in PAIR_FEATURES_LAYOUTS:
+        raise ValueError(f"PAIR_FEATURES_LAYOUT không hợp lệ: {layout} (chọn {PAIR_FEATURES_LAYOUTS})")
+    return layout
+
+
+def encode_compact(feature_rows: List[Dict], region: str, province: Optional[str]) -> Dict:
+    """
+    100 feature rows của 1 ngày (build_features_for_day) → 1 row pair_features_compact.
+    hit = NULL nếu chưa biết label của ngày đó.
+    """
+    by_pair = sorted(feature_rows, key=lambda r: r["pair"])
+    if [r["pair"] for r in by_pair] != list(range(100)):
+        raise ValueError(f"Cần đủ 100 cặp 00–99, nhận {len(feature_rows)} rows")
+    first = by_pair[0]
+    hits = [r["hit"] for r in by_pair]
+    row = {
+        "feature_date": first["feature_date"],
+        "region":       region,
+        "province":     province,
+        "day_of_week":  first["day_of_week"],
+    }
+    for col in COMPACT_ARRAY_COLS:
+        row[col] = [r[col] for r in by_pair]
+    row["hit"] = None if any(h is None for h in hits) else [bool(h) for h in hits]
+    return row
+
+
+def decode_compact_columns(rows: List[Dict], columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    """
+    Rows pair_features_compact → dict cột numpy (len(rows) × 100 phần tử), cùng cột / thứ tự
+    như đọc bảng pair_features theo (feature_date, pair).
+
+    Args:
+        columns: cột cần trả về (mặc định mọi cột của pair_features trừ id)
+    """
+    n = len(rows)
+    if columns is None:
+        columns = ["feature_date", "region", "province", *_DERIVED_COLS, *COMPACT_ARRAY_COLS, "day_of_week", "hit"]
+
+    out = {}
+    for col in columns:
+        if col in COMPACT_ARRAY_COLS:
+            dtype = np.int64 if col == "gap_since_last" else np.float64
+            values = np.asarray([r[col] for r in rows], dtype=dtype) if n else np.array([], dtype=dtype)
+            out[col] = values.reshape(-1)
+        elif col in _DERIVED_COLS:
+            out[col] = np.tile(_DERIVED_COLS[col], n)
+        elif col == "hit":
+            if all(r["hit"] is not None for r in rows):
+                out[col] = np.asarray([r["hit"] for r in rows], dtype=bool).reshape(-1)
+            else:
+                # ngày chưa có label → None cho cả 100 cặp (như hit NULL của layout rows)
+                out[col] = np.concatenate([
+                    np.asarray(r["hit"] if r["hit"] is not None else [None] * 100, dtype=object)
+                    for r in rows
+                ])
+        else:
+            # feature_date / region / province / day_of_week: 1 giá trị mỗi ngày → lặp cho 100 cặp
+            dtype = np.int64 if col == "day_of_week" else object
+            out[col] = np.repeat(np.asarray([r[col] for r in rows], dtype=dtype), 100)
+    return out
+
+
+def decode_compact(row: Dict) -> List[Dict]:
+    """1 row pair_features_compact → 100 dict như schema pair_features (kèm region / province)."""
+    cols = decode_compact_columns([row])
+    lists = {col: values.tolist() for col, values in cols.items()}
+    return [{col: values[pair] for col, values in lists.items()} for pair in range(100)]
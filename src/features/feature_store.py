@@ -0,0 +1,249 @@
+"""
+Feature Store
+Snapshot Parquet cục bộ của pair_features (chỉ rows đã có label hit), theo (region, province).
+
+Layout:
+  <root>/pair_features/<region>/<province|all>/
+      _meta.json                  {"watermark": "YYYY-MM-DD", "rows", "parts": [...], "synced_at"}
+      part-<from>_<to>.parquet    mỗi lần sync ghi thêm 1 part
+
+- sync(): chỉ kéo rows có feature_date > watermark - resync_days (keyset qua LotteryDB.stream),
+  nên retrain hàng tuần chỉ tải vài tuần gần nhất thay vì cả bảng. Khoảng resync_days ngày
+  trước watermark được tải lại và thay thế trong snapshot → ngày bị lỡ được backfill.py bù,
+  label điền muộn, hay build_features --backfill ghi lại các ngày gần đây đều được cập nhật.
+- Part chỉ được đọc sau khi đã ghi vào _meta.json (ghi atomic) → sync dở dang không làm hỏng snapshot.
+- Quá `max_parts` part thì gộp lại thành 1 (compaction).
+- load(): đọc Parquet bằng memory map → TrainingFrame.
+
+pair_features bị build lại cho ngày cũ hơn khoảng đó (đổi công thức feature, backfill cả lịch sử)
+thì phải sync(rebuild=True).
+Cần pyarrow; không có pyarrow thì train_xgb đọc thẳng từ Supabase như cũ.
+"""
+
+import json
+import os
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+from src.models.training_data import TrainingFrame
+from src.models.xgb_model import FEATURE_COLS
+
+DEFAULT_FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", os.path.join("data", "feature_store"))
+DEFAULT_RESYNC_DAYS = int(os.getenv("FEATURE_STORE_RESYNC_DAYS", "30"))
+
+STORE_COLUMNS = FEATURE_COLS + ["pair", "day_of_week", "feature_date", "hit"]
+
+
+def _arrow_table(columns: Dict[str, np.ndarray]) -> "pa.Table":
+    """Cột numpy (từ LotteryDB.stream output='numpy') → bảng Arrow kiểu gọn."""
+    frame = TrainingFrame.from_columns(columns)   # ép kiểu float32 / int8 / date
+    arrays = {col: frame.X[:, i] for i, col in enumerate(FEATURE_COLS)}
+    arrays.update(pair=frame.pair, day_of_week=frame.day_of_week, feature_date=frame.feature_date, hit=frame.y)
+    return pa.table(arrays)
+
+
+def _part_range(name: str) -> tuple:
+    """'part-<from>_<to>.parquet' → (from, to) dạng ISO."""
+    return tuple(name[len("part-"):-len(".parquet")].split("_"))
+
+
+def open_feature_store(root: Optional[str] = DEFAULT_FEATURE_STORE_DIR) -> Optional["FeatureStore"]:
+    """FeatureStore tại root, hoặc None nếu tắt (root rỗng) / chưa cài pyarrow."""
+    if not root:
+        return None
+    if not PYARROW_AVAILABLE:
+        print("⚠️ pyarrow chưa được cài, đọc pair_features trực tiếp từ Supabase")
+        return None
+    return FeatureStore(root)
+
+
+class FeatureStore:
+    """Snapshot Parquet của pair_features, sync tăng dần theo watermark feature_date."""
+
+    def __init__(self, root: str = DEFAULT_FEATURE_STORE_DIR, max_parts: int = 16,
+                 resync_days: int = DEFAULT_RESYNC_DAYS):
+        """
+        Args:
+            root: thư mục snapshot
+            max_parts: quá số part này thì compaction
+            resync_days: mỗi lần sync tải lại và thay thế các ngày trong khoảng này trước watermark
+        """
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow chưa được cài (pip install pyarrow)")
+        self.root = root
+        self.max_parts = max_parts
+        self.resync_days = resync_days
+
+    # ==================== PATHS / META ====================
+
+    def _station_dir(self, region: str, province: Optional[str]) -> str:
+        return os.path.join(self.root, "pair_features", region, province or "all")
+
+    def _meta_path(self, region: str, province: Optional[str]) -> str:
+        return os.path.join(self._station_dir(region, province), "_meta.json")
+
+    def read_meta(self, region: str, province: Optional[str]) -> Dict:
+        try:
+            with open(self._meta_path(region, province)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"watermark": None, "rows": 0, "parts": []}
+
+    def _write_meta(self, region: str, province: Optional[str], meta: Dict):
+        path = self._meta_path(region, province)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _write_part(self, station_dir: str, name: str, table: "pa.Table"):
+        tmp_path = os.path.join(station_dir, f".{name}.{os.getpid()}.tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, os.path.join(station_dir, name))
+
+    # ==================== SYNC ====================
+
+    def sync(self, db, region: str, province: Optional[str], rebuild: bool = False) -> Dict:
+        """
+        Kéo rows pair_features từ (watermark - resync_days) về snapshot, thay thế rows cũ
+        của các ngày đó (rows được label / build lại sau lần sync trước).
+
+        Returns:
+            {"new_rows", "rows", "watermark"}  (new_rows = số rows tải về, gồm cả khoảng resync)
+        """
+        station_dir = self._station_dir(region, province)
+        os.makedirs(station_dir, exist_ok=True)
+        old_meta = self.read_meta(region, province)
+        meta = {"watermark": None, "rows": 0, "parts": []} if rebuild else old_meta
+        watermark = meta["watermark"]
+        resync_from = None
+        if watermark is not None:
+            resync_from = (date.fromisoformat(watermark) - timedelta(days=self.resync_days)).isoformat()
+
+        columns = {col: [] for col in STORE_COLUMNS}
+        for chunk in db.stream_pair_features(
+            STORE_COLUMNS,
+            filters={"region": region, "province": province},
+            labelled=True,
+            after=resync_from,
+        ):
+            for col, values in columns.items():
+                values.append(chunk[col])
+
+        label = f"{region}/{province or 'all'}"
+        new_rows = sum(len(part) for part in columns["hit"])
+        # Part cũ chỉ giữ rows <= resync_from; phần sau được thay bằng dữ liệu vừa tải
+        parts, kept_rows = self._trim_parts(station_dir, meta["parts"], resync_from)
+        last = max((_part_range(p)[1] for p in parts), default=None)
+        if new_rows:
+            table = _arrow_table({col: np.concatenate(values) for col, values in columns.items()})
+            dates = table.column("feature_date").to_numpy()
+            first, last = str(dates.min()), str(dates.max())
+            name = f"part-{first}_{last}.parquet"
+            self._write_part(station_dir, name, table)
+            parts = [p for p in parts if p != name] + [name]
+        meta = {
+            "watermark": last,
+            "rows":      kept_rows + new_rows,
+            "parts":     sorted(parts),
+            "synced_at": time.time(),
+        }
+        self._write_meta(region, province, meta)
+        if len(meta["parts"]) > self.max_parts:
+            meta = self.compact(region, province)
+
+        self._remove_parts(station_dir, [p for p in old_meta["parts"] if p not in meta["parts"]])
+        print(f"🗄️  Feature store {label}: {new_rows} rows từ {resync_from or 'đầu'} | "
+              f"tổng {meta['rows']} | watermark {meta['watermark']}")
+        return {"new_rows": new_rows, "rows": meta["rows"], "watermark": meta["watermark"]}
+
+    def _trim_parts(self, station_dir: str, parts: List[str], resync_from: Optional[str]) -> tuple:
+        """
+        Bỏ rows feature_date > resync_from khỏi các part (ghi part mới, part cũ chưa bị xóa).
+
+        Returns:
+            (danh sách part sau khi cắt, tổng số rows còn lại)
+        """
+        if resync_from is None:
+            return [], 0
+        kept, rows = [], 0
+        cutoff = np.datetime64(resync_from)
+        for name in parts:
+            path = os.path.join(station_dir, name)
+            if _part_range(name)[1] <= resync_from:
+                kept.append(name)
+                rows += pq.read_metadata(path).num_rows
+                continue
+            table = pq.read_table(path, memory_map=False)
+            dates = table.column("feature_date").to_numpy().astype("datetime64[D]")
+            mask = dates <= cutoff
+            if not mask.any():
+                continue
+            table = table.filter(pa.array(mask))
+            trimmed = f"part-{dates[mask].min()}_{dates[mask].max()}.parquet"
+            self._write_part(station_dir, trimmed, table)
+            kept.append(trimmed)
+            rows += table.num_rows
+        return kept, rows
+
+    def compact(self, region: str, province: Optional[str]) -> Dict:
+        """Gộp mọi part của station thành 1 file."""
+        station_dir = self._station_dir(region, province)
+        meta = self.read_meta(region, province)
+        if len(meta["parts"]) <= 1:
+            return meta
+        table = self._read_table(station_dir, meta["parts"], memory_map=False)
+        first = str(table.column("feature_date").to_numpy().min())
+        name = f"part-{first}_{meta['watermark']}.parquet"
+        self._write_part(station_dir, name, table)
+        old_parts = meta["parts"]
+        meta = {**meta, "parts": [name]}
+        self._write_meta(region, province, meta)
+        self._remove_parts(station_dir, [p for p in old_parts if p != name])
+        return meta
+
+    @staticmethod
+    def _remove_parts(station_dir: str, parts: List[str]):
+        for name in parts:
+            try:
+                os.remove(os.path.join(station_dir, name))
+            except FileNotFoundError:
+                pass
+
+    # ==================== READ ====================
+
+    @staticmethod
+    def _read_table(station_dir: str, parts: List[str], memory_map: bool = True) -> "pa.Table":
+        tables = [pq.read_table(os.path.join(station_dir, name), memory_map=memory_map) for name in parts]
+        return pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+
+    def load(self, region: str, province: Optional[str]) -> TrainingFrame:
+        """Đọc snapshot của station (memory map) → TrainingFrame (mọi weekday)."""
+        meta = self.read_meta(region, province)
+        label = f"{region}/{province or 'all'}"
+        if not meta["parts"]:
+            return TrainingFrame.from_columns({col: np.array([], dtype=object) for col in STORE_COLUMNS}, label=label)
+        table = self._read_table(self._station_dir(region, province), meta["parts"])
+        columns = {col: table.column(col).to_numpy() for col in STORE_COLUMNS}
+        frame = TrainingFrame.from_columns(columns, label=label)
+        print(f"  ✅ Feature store {label}: {len(frame)} rows ({frame.n_draws} kỳ) | {frame.nbytes / 1e6:.1f} MB")
+        return frame
+
+    def load_synced(self, db, region: str, province: Optional[str]) -> TrainingFrame:
+        """sync() rồi load() — dùng cho train / backtest."""
+        self.sync(db, region, province)
+        return self.load(region, province)
+
+    def watermark(self, region: str, province: Optional[str]) -> Optional[date]:
+        value = self.read_meta(region, province)["watermark"]
+        return date.fromisoformat(value) if value else None
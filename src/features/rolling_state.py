@@ -0,0 +1,231 @@
+"""
+rolling_state.py
+Trạng thái feature tích lũy (incremental) cho 1 đài.
+
+Thay vì mỗi đêm dựng lại features từ 120 kỳ gần nhất, state giữ sẵn:
+  - vị trí các lần xuất hiện của mỗi cặp trong cửa sổ (last-seen = phần tử cuối)
+  - Σgap và Σgap² giữa các lần xuất hiện liên tiếp trong cửa sổ
+  - số lần xuất hiện trong 30/60/100 kỳ gần nhất
+Áp dụng 1 kỳ mới chỉ tốn O(100), và features() cho kết quả giống hệt
+build_features_for_day trên cùng cửa sổ lịch sử.
+
+State được lưu dạng JSON (mặc định trong data/feature_state/) để dùng lại giữa các lần chạy.
+"""
+
+import json
+import os
+from collections import deque
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.features.feature_builder import (
+    FREQ_WINDOWS,
+    compute_pair_stats,
+    feature_rows_from_stats,
+    history_to_bitmap,
+    pair_stats_from_sums,
+)
+from src.features.tail_set import TailSet
+
+STATE_VERSION = 1
+DEFAULT_STATE_DIR = os.path.join("data", "feature_state")
+
+
+class PairRollingState:
+    """Feature state của 1 station trên cửa sổ `window` kỳ gần nhất."""
+
+    def __init__(self, region: str, province: Optional[str], window: int = 120):
+        self.region = region
+        self.province = province
+        self.window = window
+
+        self.n_applied = 0           # tổng số kỳ đã áp dụng (index tuyệt đối của kỳ tiếp theo)
+        self.last_date: Optional[str] = None
+        self.draws: deque = deque()  # (draw_date, tuple(pairs)) của các kỳ trong cửa sổ
+        self.positions: List[deque] = [deque() for _ in range(100)]  # index tuyệt đối các lần xuất hiện
+        self.gap_sum = np.zeros(100, dtype=np.int64)
+        self.gap_sq_sum = np.zeros(100, dtype=np.int64)
+        self.window_hits = {w: np.zeros(100, dtype=np.int64) for w in FREQ_WINDOWS}
+
+    @property
+    def label(self) -> str:
+        return f"{self.region}/{self.province or 'all'}"
+
+    def __len__(self) -> int:
+        return len(self.draws)
+
+    # ==================== UPDATE ====================
+
+    def apply_draw(self, draw_date, tail_set: Iterable[int]):
+        """Thêm 1 kỳ mới (phải mới hơn last_date). Chi phí O(100)."""
+        draw_date = draw_date.isoformat() if isinstance(draw_date, date) else str(draw_date)[:10]
+        if self.last_date is not None and draw_date <= self.last_date:
+            raise ValueError(f"{self.label}: kỳ {draw_date} không mới hơn last_date={self.last_date}")
+
+        pairs = tuple(TailSet.coerce(tail_set).pairs())
+        t = self.n_applied
+        n = len(self.draws)
+
+        # 1. Cửa sổ freq 30/60/100: kỳ rời cửa sổ là draws[-w]
+        for w, hits in self.window_hits.items():
+            if n >= w:
+                for p in self.draws[-w][1]:
+                    hits[p] -= 1
+            for p in pairs:
+                hits[p] += 1
+
+        # 2. Cửa sổ gap: loại kỳ cũ nhất nếu đã đầy
+        if n >= self.window:
+            evicted = t - self.window
+            _, old_pairs = self.draws.popleft()
+            for p in old_pairs:
+                pos = self.positions[p]
+                pos.popleft()
+                if pos:
+                    g = pos[0] - evicted
+                    self.gap_sum[p] -= g
+                    self.gap_sq_sum[p] -= g * g
+
+        # 3. Thêm kỳ mới
+        for p in pairs:
+            pos = self.positions[p]
+            if pos:
+                g = t - pos[-1]
+                self.gap_sum[p] += g
+                self.gap_sq_sum[p] += g * g
+            pos.append(t)
+
+        self.draws.append((draw_date, pairs))
+        self.n_applied = t + 1
+        self.last_date = draw_date
+
+    @classmethod
+    def from_history(
+        cls, region: str, province: Optional[str], history: pd.DataFrame, window: int = 120
+    ) -> "PairRollingState":
+        """Dựng state từ DataFrame của _extract_history (sắp xếp tăng dần)."""
+        state = cls(region, province, window)
+        for draw_date, tail_set in zip(history["draw_date"], history["tail_set"]):
+            state.apply_draw(pd.Timestamp(draw_date).date(), tail_set)
+        return state
+
+    # ==================== FEATURES ====================
+
+    def pair_stats(self) -> Dict[str, np.ndarray]:
+        """Feature columns cho kỳ tiếp theo (giống compute_pair_stats trên cửa sổ hiện tại)."""
+        n = len(self.draws)
+        counts = np.array([len(pos) for pos in self.positions], dtype=np.int64)
+        last_seen = np.array([pos[-1] if pos else -1 for pos in self.positions], dtype=np.int64)
+        gap_since_last = np.where(counts > 0, self.n_applied - 1 - last_seen, n)
+        return pair_stats_from_sums(
+            n, counts, self.window_hits, gap_since_last, self.gap_sum, self.gap_sq_sum
+        )
+
+    def features(self, target_date: date, target_tail_set: Optional[TailSet] = None) -> List[Dict]:
+        """100 feature rows cho target_date từ state (không đọc lại lịch sử)."""
+        return feature_rows_from_stats(target_date, self.pair_stats(), target_tail_set)
+
+    # ==================== VERIFY ====================
+
+    def to_bitmap(self) -> np.ndarray:
+        """Bitmap (n × 100) của cửa sổ hiện tại."""
+        bitmap = np.zeros((len(self.draws), 100), dtype=bool)
+        for i, (_, pairs) in enumerate(self.draws):
+            bitmap[i, list(pairs)] = True
+        return bitmap
+
+    def verify(self, history: Optional[pd.DataFrame] = None) -> List[str]:
+        """
+        So sánh state với full recompute (compute_pair_stats).
+        Nếu truyền history (từ _extract_history, cùng mốc last_date) thì so với lịch sử
+        thật trong DB; nếu không thì so với các kỳ state đang giữ.
+
+        Returns:
+            List mô tả các điểm lệch (rỗng = không có drift)
+        """
+        drift = []
+        if history is not None:
+            history = history.tail(self.window)
+            expected_dates = [pd.Timestamp(d).date().isoformat() for d in history["draw_date"]]
+            actual_dates = [d for d, _ in self.draws]
+            if expected_dates != actual_dates:
+                drift.append(
+                    f"draw dates lệch: state={actual_dates[-1:] or '∅'} ({len(actual_dates)} kỳ) "
+                    f"vs DB={expected_dates[-1:] or '∅'} ({len(expected_dates)} kỳ)"
+                )
+                return drift
+            bitmap = history_to_bitmap(history)
+        else:
+            bitmap = self.to_bitmap()
+
+        expected = compute_pair_stats(bitmap)
+        actual = self.pair_stats()
+        for col, exp_values in expected.items():
+            diff = np.flatnonzero(exp_values != actual[col])
+            if len(diff):
+                p = int(diff[0])
+                drift.append(f"{col}: {len(diff)} cặp lệch (vd pair={p:02d}: {actual[col][p]} != {exp_values[p]})")
+        return drift
+
+    # ==================== PERSISTENCE ====================
+
+    def to_dict(self) -> Dict:
+        return {
+            "version":     STATE_VERSION,
+            "region":      self.region,
+            "province":    self.province,
+            "window":      self.window,
+            "n_applied":   self.n_applied,
+            "last_date":   self.last_date,
+            "draws":       [[d, list(pairs)] for d, pairs in self.draws],
+            "positions":   [list(pos) for pos in self.positions],
+            "gap_sum":     self.gap_sum.tolist(),
+            "gap_sq_sum":  self.gap_sq_sum.tolist(),
+            "window_hits": {str(w): hits.tolist() for w, hits in self.window_hits.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "PairRollingState":
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"State version không khớp: {data.get('version')} (cần {STATE_VERSION})")
+        state = cls(data["region"], data["province"], data["window"])
+        state.n_applied = data["n_applied"]
+        state.last_date = data["last_date"]
+        state.draws = deque((d, tuple(pairs)) for d, pairs in data["draws"])
+        state.positions = [deque(pos) for pos in data["positions"]]
+        state.gap_sum = np.array(data["gap_sum"], dtype=np.int64)
+        state.gap_sq_sum = np.array(data["gap_sq_sum"], dtype=np.int64)
+        state.window_hits = {int(w): np.array(h, dtype=np.int64) for w, h in data["window_hits"].items()}
+        return state
+
+    @staticmethod
+    def path_for(region: str, province: Optional[str], state_dir: str = DEFAULT_STATE_DIR) -> str:
+        return os.path.join(state_dir, f"{region}_{province or 'all'}.json")
+
+    def save(self, state_dir: str = DEFAULT_STATE_DIR) -> str:
+        """Ghi state ra file JSON (ghi file tạm rồi rename để không hỏng state khi bị ngắt)."""
+        path = self.path_for(self.region, self.province, state_dir)
+        os.makedirs(state_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(
+        cls, region: str, province: Optional[str], state_dir: str = DEFAULT_STATE_DIR
+    ) -> Optional["PairRollingState"]:
+        """Đọc state từ file. Trả về None nếu chưa có hoặc file hỏng."""
+        path = cls.path_for(region, province, state_dir)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Không đọc được state {path}: {e}")
+            return None
@@ -1,8 +1,23 @@
 """
 tail_extractor.py
-Trích xuất 2 số cuối của mọi giải từ một bản ghi lottery_draws.
+Trích xuất 2 số cuối của mọi giải từ bản ghi lottery_draws.
+
+- extract_tails_from_draw: 1 kỳ → list dict (nightly, vài kỳ)
+- extract_tails_batch: hàng nghìn kỳ → các cột numpy; lọc chữ số + cắt 2 số cuối
+  làm vector hóa trên mảng code point (không lặp từng ký tự trong Python)
+- draw_tail_rows: output batch → rows draw_tails (1 row / kỳ, TailSet đóng gói)
+
+Layout lưu tails (TAILS_LAYOUT):
+  - rows:   bảng tails_2d, 1 row / giải — mặc định
+  - bitmap: bảng draw_tails, 1 row / kỳ (tail_mask + tail_counts, xem TailSet.to_packed)
 """
-from typing import Dict, List, Optional
+import os
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.features.tail_set import TailSet
 
 
 # Map prize field → prize_code
@@ -73,9 +88,151 @@ def extract_tails_from_draw(draw: Dict) -> List[Dict]:
     return results
 
 
-def build_tail_set(tails: List[Dict]) -> set:
+def build_tail_set(tails: List[Dict]) -> TailSet:
     """
-    Từ list tails_2d (có field tail_2d), trả về set các cặp xuất hiện.
+    Từ list tails_2d (có field tail_2d), trả về TailSet (bitmask + số lần xuất hiện).
     Dùng để verify: nếu predicted_pair ∈ tail_set → trúng.
     """
-    return {t["tail_2d"] for t in tails}
+    return TailSet.from_rows(tails)
+
+
+# ==================== LAYOUT ====================
+
+DRAW_TAILS_TABLE = "draw_tails"
+TAILS_LAYOUTS = ("rows", "bitmap")
+DEFAULT_TAILS_LAYOUT = "rows"  # khi chưa đặt env TAILS_LAYOUT
+
+
+def tails_layout(layout: Optional[str] = None) -> str:
+    """
+    Layout đang dùng ('rows' | 'bitmap'), mặc định theo env TAILS_LAYOUT.
+    Đọc env mỗi lần gọi (không lúc import) để giá trị trong .env — nạp bởi LotteryDB() — vẫn có hiệu lực.
+    """
+    layout = (layout or os.getenv("TAILS_LAYOUT") or DEFAULT_TAILS_LAYOUT).strip().lower()
+    if layout not in TAILS_LAYOUTS:
+        raise ValueError(f"TAILS_LAYOUT không hợp lệ: {layout} (chọn {TAILS_LAYOUTS})")
+    return layout
+
+
+# ==================== BATCH ====================
+
+TAIL_COLUMNS = ("draw_id", "draw_date", "region", "province", "prize_code", "tail_2d")
+
+
+def _tails_from_strings(values: Sequence[str]):
+    """
+    2 số cuối của từng chuỗi (bỏ ký tự không phải chữ số), vector hóa.
+
+    Returns:
+        (tails int16, valid bool) — valid = chuỗi có ít nhất 2 chữ số
+    """
+    if not len(values):
+        return np.zeros(0, dtype=np.int16), np.zeros(0, dtype=bool)
+    arr = np.asarray(values, dtype=np.str_)
+    width = arr.dtype.itemsize // 4
+    codes = arr.view(np.uint32).reshape(len(arr), width)   # code point từng ký tự (0 = padding)
+    is_digit = (codes >= 48) & (codes <= 57)
+    # Đếm chữ số từ phải sang: chữ số cuối có rank 1, áp chót rank 2
+    rank = np.cumsum(is_digit[:, ::-1], axis=1)[:, ::-1]
+    digits = np.where(is_digit, codes - 48, 0).astype(np.int16)
+    last = (digits * (is_digit & (rank == 1))).sum(axis=1)
+    second = (digits * (is_digit & (rank == 2))).sum(axis=1)
+    return (second * 10 + last).astype(np.int16), rank[:, 0] >= 2
+
+
+def extract_tails_batch(draws: Sequence[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Như extract_tails_from_draw cho nhiều kỳ cùng lúc, trả về dạng cột.
+
+    Args:
+        draws: list bản ghi lottery_draws (id, draw_date, region, province, các giải)
+
+    Returns:
+        {"draw_id", "draw_date", "region", "province", "prize_code", "tail_2d"} — mảng numpy
+        cùng độ dài, thứ tự row giống gọi extract_tails_from_draw lần lượt từng kỳ
+    """
+    if not draws:
+        return {col: np.zeros(0, dtype=np.int16 if col == "tail_2d" else object) for col in TAIL_COLUMNS}
+
+    # Mỗi giải là 1 cột; giải nhiều số (TEXT[]) được explode, index = vị trí kỳ
+    df = pd.DataFrame.from_records(draws)
+    draw_idx, prize_idx, values = [], [], []
+    for j, (field, _) in enumerate(PRIZE_FIELDS):
+        if field not in df:
+            continue
+        col = df[field].explode().dropna()
+        draw_idx.append(col.index.to_numpy(dtype=np.int64))
+        prize_idx.append(np.full(len(col), j, dtype=np.int64))
+        values.append(col.astype(str).to_numpy())
+    if not values:
+        return extract_tails_batch([])
+
+    draw_idx, prize_idx, values = (np.concatenate(a) for a in (draw_idx, prize_idx, values))
+    # Về đúng thứ tự (kỳ, giải, số trong giải) như extract_tails_from_draw
+    order = np.argsort(draw_idx * len(PRIZE_FIELDS) + prize_idx, kind="stable")
+    draw_idx, prize_idx, values = draw_idx[order], prize_idx[order], values[order]
+
+    tails, valid = _tails_from_strings(values)
+    rows = draw_idx[valid]
+    prize_codes = np.array([code for _, code in PRIZE_FIELDS], dtype=object)
+
+    region = np.array([d["region"] for d in draws], dtype=object)
+    province = np.array([None if d["region"] == "XSMB" else d.get("province") for d in draws], dtype=object)
+    return {
+        "draw_id":    np.array([d["id"] for d in draws], dtype=np.int64)[rows],
+        "draw_date":  np.array([d["draw_date"] for d in draws], dtype=object)[rows],
+        "region":     region[rows],
+        "province":   province[rows],
+        "prize_code": prize_codes[prize_idx[valid]],
+        "tail_2d":    tails[valid],
+    }
+
+
+def tail_rows(columns: Dict[str, np.ndarray], chunk_size: int = 1000) -> Iterator[List[Dict]]:
+    """
+    Cắt output của extract_tails_batch thành các chunk list dict (kiểu Python) để bulk insert.
+    Chỉ cắt ở ranh giới kỳ (tails của 1 kỳ liền nhau): mỗi chunk ≤ chunk_size rows gồm trọn các kỳ,
+    1 kỳ lớn hơn chunk_size thành 1 chunk riêng.
+    """
+    n = len(columns["tail_2d"])
+    draw_ids = np.asarray(columns["draw_id"])
+    draw_ends = (np.flatnonzero(draw_ids[1:] != draw_ids[:-1]) + 1).tolist() + [n] if n else []
+
+    def rows(start: int, end: int) -> List[Dict]:
+        cols = [columns[c][start:end].tolist() for c in TAIL_COLUMNS]
+        return [dict(zip(TAIL_COLUMNS, values)) for values in zip(*cols)]
+
+    start = end = 0
+    for draw_end in draw_ends:
+        if draw_end - start > chunk_size and end > start:
+            yield rows(start, end)
+            start = end
+        end = draw_end
+    if end > start:
+        yield rows(start, end)
+
+
+def draw_tail_rows(columns: Dict[str, np.ndarray]) -> List[Dict]:
+    """
+    Gom output của extract_tails_batch theo draw_id → 1 row draw_tails / kỳ
+    (draw_id, draw_date, region, province, tail_mask, tail_counts, n_tails).
+    """
+    if not len(columns["tail_2d"]):
+        return []
+    codes, draw_ids = pd.factorize(columns["draw_id"])
+    first = np.unique(codes, return_index=True)[1]   # row đầu tiên của mỗi kỳ
+    matrix = TailSet.count_matrix(codes, columns["tail_2d"], len(draw_ids))
+    n_tails = np.bincount(codes, minlength=len(draw_ids))
+
+    rows = []
+    for i, draw_id in enumerate(draw_ids.tolist()):
+        row = {
+            "draw_id":   draw_id,
+            "draw_date": columns["draw_date"][first[i]],
+            "region":    columns["region"][first[i]],
+            "province":  columns["province"][first[i]],
+            "n_tails":   int(n_tails[i]),
+        }
+        row.update(TailSet(matrix[i]).to_packed())
+        rows.append(row)
+    return rows
@@ -0,0 +1,187 @@
+"""
+tail_set.py
+TAIL_SET gọn cho 1 kỳ: bitmask 100 bit (int) + vector đếm uint8[100].
+
+  - mask:   bit p = 1 nếu cặp p xuất hiện → `p in ts`, giao nhau, popcount (len) đều là phép bit
+  - counts: số lần cặp p xuất hiện trong mọi giải (dùng cho profit: mỗi lần xuất hiện trả tiền)
+
+Dựng hàng loạt từ mảng numpy (mã kỳ + tail_2d) bằng 1 lần np.bincount, không qua set Python.
+prediction_results.tail_set (SMALLINT[]) giữ nguyên nghĩa cũ: các cặp phân biệt đã sort (to_db);
+from_db() khôi phục mask, counts = 1 (số lần xuất hiện không lưu ở cột này).
+
+Bảng draw_tails (1 row / kỳ thay cho ~18–27 row tails_2d) lưu dạng đóng gói (to_packed):
+tail_mask = 100 bit dạng hex, tail_counts = 1 byte / cặp có mặt (theo pair tăng dần) dạng hex.
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+N_PAIRS = 100
+
+
+def _pack(bits: np.ndarray) -> int:
+    """bool[100] → int (bit p = bits[p])."""
+    return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+
+
+def _pack_rows(bits: np.ndarray) -> List[int]:
+    """bool (n × 100) → list n mask."""
+    packed = np.packbits(bits, axis=1, bitorder="little")
+    return [int.from_bytes(row.tobytes(), "little") for row in packed]
+
+
+def _unpack(mask: int) -> np.ndarray:
+    """int → các vị trí bit = 1 (tăng dần)."""
+    bits = np.unpackbits(np.frombuffer(mask.to_bytes(13, "little"), dtype=np.uint8), bitorder="little")
+    return np.flatnonzero(bits[:N_PAIRS])
+
+
+def _as_tails(tails) -> np.ndarray:
+    arr = np.asarray(tails if isinstance(tails, np.ndarray) else list(tails), dtype=np.int64)
+    if arr.size and (arr.min() < 0 or arr.max() >= N_PAIRS):
+        raise ValueError(f"tail_2d phải trong 0..{N_PAIRS - 1}")
+    return arr
+
+
+class TailSet:
+    """TAIL_SET của 1 kỳ (bất biến): `p in ts`, len(ts) = số cặp phân biệt, ts.count(p) = số lần xuất hiện."""
+
+    __slots__ = ("counts", "mask")
+
+    def __init__(self, counts: Optional[np.ndarray] = None, mask: Optional[int] = None):
+        if counts is None:
+            counts = np.zeros(N_PAIRS, dtype=np.uint8)
+        counts = np.asarray(counts, dtype=np.uint8)
+        if counts.shape != (N_PAIRS,):
+            raise ValueError(f"counts phải có shape ({N_PAIRS},), nhận {counts.shape}")
+        self.counts = counts
+        self.mask = _pack(counts > 0) if mask is None else mask
+
+    # ==================== BUILD ====================
+
+    @classmethod
+    def from_tails(cls, tails: Iterable[int]) -> "TailSet":
+        """Từ các giá trị tail_2d (có thể lặp lại — mỗi lần là 1 giải)."""
+        counts = np.bincount(_as_tails(tails), minlength=N_PAIRS)
+        return cls(np.minimum(counts, 255))
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict], field: str = "tail_2d") -> "TailSet":
+        """Từ list bản ghi tails_2d."""
+        return cls.from_tails([r[field] for r in rows])
+
+    @classmethod
+    def coerce(cls, value) -> "TailSet":
+        """TailSet giữ nguyên; set / list / mảng tail_2d → TailSet."""
+        return value if isinstance(value, TailSet) else cls.from_tails(value)
+
+    @staticmethod
+    def count_matrix(codes: np.ndarray, tails: np.ndarray, n_draws: int) -> np.ndarray:
+        """
+        Ma trận đếm uint8 (n_draws × 100) từ mảng mã kỳ (0..n_draws-1) + tail_2d tương ứng,
+        bằng 1 lần np.bincount.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        tails = _as_tails(tails)
+        flat = np.bincount(codes * N_PAIRS + tails, minlength=n_draws * N_PAIRS)
+        return np.minimum(flat, 255).astype(np.uint8).reshape(n_draws, N_PAIRS)
+
+    @classmethod
+    def batch(cls, codes: np.ndarray, tails: np.ndarray, n_draws: int) -> List["TailSet"]:
+        """List TailSet cho n_draws kỳ từ mảng (mã kỳ, tail_2d); counts là view của 1 ma trận chung."""
+        matrix = cls.count_matrix(codes, tails, n_draws)
+        return [cls(row, mask) for row, mask in zip(matrix, _pack_rows(matrix > 0))]
+
+    @staticmethod
+    def stack(tail_sets: Sequence) -> np.ndarray:
+        """Ma trận đếm uint8 (số kỳ × 100) từ list TailSet (hoặc iterable tail_2d)."""
+        if not len(tail_sets):
+            return np.zeros((0, N_PAIRS), dtype=np.uint8)
+        return np.stack([TailSet.coerce(ts).counts for ts in tail_sets])
+
+    # ==================== QUERY ====================
+
+    def __contains__(self, pair) -> bool:
+        try:
+            p = int(pair)
+        except (TypeError, ValueError):
+            return False
+        return 0 <= p < N_PAIRS and (self.mask >> p) & 1 == 1
+
+    def __len__(self) -> int:
+        return self.mask.bit_count()
+
+    def __iter__(self):
+        return iter(self.pairs())
+
+    def __bool__(self) -> bool:
+        return self.mask != 0
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TailSet) and np.array_equal(self.counts, other.counts)
+
+    def __hash__(self) -> int:
+        return hash(self.counts.tobytes())
+
+    def __and__(self, other) -> "TailSet":
+        """Giao 2 TAIL_SET (counts = min)."""
+        other = TailSet.coerce(other)
+        return TailSet(np.minimum(self.counts, other.counts), self.mask & other.mask)
+
+    def __repr__(self) -> str:
+        return f"TailSet({self.pairs()})"
+
+    def count(self, pair) -> int:
+        """Số lần cặp xuất hiện trong kỳ (0 nếu không có)."""
+        return int(self.counts[int(pair)]) if pair in self else 0
+
+    def overlap(self, other) -> int:
+        """Số cặp chung với TAIL_SET khác (popcount của mask giao)."""
+        return (self.mask & TailSet.coerce(other).mask).bit_count()
+
+    def intersection(self, pairs: Iterable) -> List[int]:
+        """Các cặp trong `pairs` có trong TAIL_SET, giữ thứ tự (vd matched_pairs của pair_1..3)."""
+        return [int(p) for p in pairs if p is not None and p in self]
+
+    def pairs(self) -> List[int]:
+        """Các cặp phân biệt, tăng dần."""
+        return np.flatnonzero(self.counts).tolist()
+
+    @property
+    def bitmap(self) -> np.ndarray:
+        """bool[100]: bitmap[p] = cặp p xuất hiện."""
+        return self.counts > 0
+
+    @property
+    def total(self) -> int:
+        """Tổng số giải (số tail_2d) của kỳ."""
+        return int(self.counts.sum())
+
+    # ==================== SERIALIZE ====================
+
+    def to_db(self) -> List[int]:
+        """prediction_results.tail_set: các cặp phân biệt đã sort."""
+        return self.pairs()
+
+    @classmethod
+    def from_db(cls, values: Optional[Sequence[int]]) -> "TailSet":
+        return cls.from_tails(values or [])
+
+    def to_packed(self) -> Dict[str, str]:
+        """draw_tails: {"tail_mask": 25 ký tự hex (100 bit), "tail_counts": hex 1 byte / cặp có mặt}."""
+        return {
+            "tail_mask":   format(self.mask, "025x"),
+            "tail_counts": self.counts[self.counts > 0].tobytes().hex(),
+        }
+
+    @classmethod
+    def from_packed(cls, tail_mask: str, tail_counts: str) -> "TailSet":
+        mask = int(tail_mask, 16)
+        pairs = _unpack(mask)
+        present = np.frombuffer(bytes.fromhex(tail_counts), dtype=np.uint8)
+        if mask >> N_PAIRS or len(present) != len(pairs):
+            raise ValueError(f"draw_tails không hợp lệ: mask={tail_mask!r}, counts={tail_counts!r}")
+        counts = np.zeros(N_PAIRS, dtype=np.uint8)
+        counts[pairs] = present
+        return cls(counts, mask)
@@ -0,0 +1,146 @@
+"""
+evaluation.py
+Đánh giá top-k vector hóa cho model dự đoán 2 số cuối.
+
+Prediction được xếp thành ma trận (số kỳ × 100): mỗi hàng là 1 kỳ (feature_date),
+mỗi cột là 1 cặp. Top-k lấy bằng np.argpartition (O(100) mỗi hàng thay vì sort
+toàn bộ), rồi chỉ sort k phần tử được chọn. Một lần gọi tính hit@k cho nhiều k,
+vector hit theo từng kỳ và lãi/lỗ theo bảng điểm tier của verify_v3.
+
+Nhóm theo feature_date nếu có (tập val không cần là bội số của 100 hay đúng thứ tự);
+ngược lại mỗi `group_size` rows liên tiếp là 1 kỳ như trước.
+"""
+
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# Bảng điểm tier: điểm đặt cho pair_1, pair_2, pair_3 + giá mỗi điểm
+TIER_SCHEMES = {
+    "XSMN": {"tier_points": [3, 2, 2], "cost_per_point": 14000, "revenue_per_hit_point": 70000},
+    "XSMB": {"tier_points": [2, 1, 1], "cost_per_point": 23000, "revenue_per_hit_point": 80000},
+}
+
+DEFAULT_KS = (1, 3, 5, 10)
+
+
+def top_k_indices(probs: np.ndarray, k: int) -> np.ndarray:
+    """
+    Chỉ số top-k theo xác suất giảm dần, trên trục cuối.
+    probs 1 chiều → (k,); 2 chiều (kỳ × 100) → (kỳ, k).
+    """
+    probs = np.asarray(probs)
+    k = min(k, probs.shape[-1])
+    part = np.argpartition(probs, -k, axis=-1)[..., -k:]
+    order = np.argsort(-np.take_along_axis(probs, part, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def to_draw_matrix(
+    values: np.ndarray,
+    groups: Optional[Iterable] = None,
+    group_size: int = 100,
+    fill: float = 0.0,
+):
+    """
+    Xếp vector theo rows thành ma trận (số kỳ × group_size).
+
+    Args:
+        values: giá trị mỗi row (xác suất hoặc label)
+        groups: key kỳ của mỗi row (vd feature_date). None = mỗi group_size rows liên tiếp là 1 kỳ
+        fill: giá trị cho ô trống (kỳ thiếu cặp)
+
+    Returns:
+        (matrix, keys): keys = key của từng hàng (sorted), hoặc số thứ tự kỳ nếu không có groups
+    """
+    values = np.asarray(values)
+    if groups is None:
+        n_draws = len(values) // group_size
+        return values[:n_draws * group_size].reshape(n_draws, group_size), np.arange(n_draws)
+
+    codes, keys = pd.factorize(pd.Series(np.asarray(groups)), sort=True)
+    # Vị trí cột = thứ tự row trong kỳ (hit@k không phụ thuộc cột nào là cặp nào)
+    cols = pd.Series(codes).groupby(codes).cumcount().to_numpy()
+    if len(cols) and cols.max() >= group_size:
+        raise ValueError(f"Có kỳ nhiều hơn {group_size} rows")
+    matrix = np.full((len(keys), group_size), fill, dtype=np.result_type(values.dtype, type(fill)))
+    matrix[codes, cols] = values
+    return matrix, np.asarray(keys)
+
+
+def evaluate_top_k(
+    probs: np.ndarray,
+    y: np.ndarray,
+    groups: Optional[Iterable] = None,
+    ks: Iterable[int] = DEFAULT_KS,
+    region: Optional[str] = None,
+    group_size: int = 100,
+) -> Dict:
+    """
+    hit@k cho nhiều k trong 1 lần, + lãi/lỗ theo tier nếu có region.
+
+    Args:
+        probs: xác suất dự đoán mỗi row
+        y: label mỗi row (bool = có xuất hiện, hoặc số lần xuất hiện trong TAIL_SET)
+        groups: feature_date mỗi row (None = 100 rows liên tiếp / kỳ)
+        ks: các giá trị k
+        region: 'XSMB' / 'XSMN' để tính profit theo TIER_SCHEMES (top-3 = pair_1..3)
+
+    Returns:
+        {
+          "draws": số kỳ,
+          "keys": key từng kỳ,
+          "hits": {k: mảng bool theo kỳ},
+          "hit_rate": {k: tỉ lệ kỳ trúng},
+          "profit": (nếu có region) {"per_draw", "total", "mean", "cost", "revenue"}
+        }
+    """
+    ks = sorted(set(ks))
+    # Ô trống = -inf → không bao giờ lọt top-k trừ khi kỳ thiếu quá nhiều cặp (label 0)
+    p_mat, keys = to_draw_matrix(np.asarray(probs, dtype=np.float64), groups, group_size, fill=-np.inf)
+    y_mat, _ = to_draw_matrix(np.asarray(y, dtype=np.float64), groups, group_size, fill=0.0)
+
+    result = {"draws": len(keys), "keys": keys, "hits": {}, "hit_rate": {}}
+    if len(keys) == 0:
+        for k in ks:
+            result["hits"][k] = np.zeros(0, dtype=bool)
+            result["hit_rate"][k] = 0.0
+        return result
+
+    top = top_k_indices(p_mat, max(ks))
+    top_y = np.take_along_axis(y_mat, top, axis=1)     # label theo thứ hạng (kỳ × max_k)
+    hit_any = np.cumsum(top_y > 0, axis=1) > 0          # hit_any[:, j] = trúng trong top-(j+1)
+    for k in ks:
+        hits = hit_any[:, min(k, top.shape[1]) - 1]
+        result["hits"][k] = hits
+        result["hit_rate"][k] = round(float(hits.mean()), 4)
+
+    if region is not None:
+        result["profit"] = tier_profit(top_y, region)
+    return result
+
+
+def tier_profit(ranked_hits: np.ndarray, region: str) -> Dict:
+    """
+    Lãi/lỗ theo kỳ như verify_v3.calculate_station_profit:
+    pair thứ i đặt tier_points[i] điểm; mỗi lần xuất hiện trả revenue_per_hit_point / điểm.
+
+    Args:
+        ranked_hits: (kỳ × ≥3) số lần xuất hiện của các cặp theo thứ hạng dự đoán
+    """
+    scheme = TIER_SCHEMES[region.upper()]
+    points = np.asarray(scheme["tier_points"], dtype=np.float64)
+    n = min(len(points), ranked_hits.shape[1])
+    occurrences = ranked_hits[:, :n]
+
+    cost = float(points[:n].sum() * scheme["cost_per_point"])
+    revenue = (occurrences * points[:n]).sum(axis=1) * scheme["revenue_per_hit_point"]
+    per_draw = revenue - cost
+    return {
+        "per_draw": per_draw,
+        "total": float(per_draw.sum()),
+        "mean": round(float(per_draw.mean()), 2) if len(per_draw) else 0.0,
+        "cost": cost * len(per_draw),
+        "revenue": float(revenue.sum()),
+    }
@@ -0,0 +1,147 @@
+"""
+train_scheduler.py
+Scheduler train nhiều model (station × weekday) song song trong cùng 1 process.
+
+- Data của mỗi station (region, province) chỉ load 1 lần (pool I/O riêng) thành
+  TrainingFrame, rồi lấy view theo weekday cho từng job → không page lại pair_features
+  cho mỗi model, không copy data.
+- Job train chạy trên thread pool `workers` luồng; XGBoost nhả GIL khi train
+  nên các job thực sự chạy song song. Mỗi job pin n_jobs = threads_per_job
+  để workers × threads_per_job ≈ số core (không oversubscribe).
+- Báo wall time từng job (load / train) và tổng.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.models.training_data import TrainingFrame
+
+# (region, province, weekday) — province None = 'all', weekday None = không phân biệt
+TrainJob = Tuple[str, Optional[str], Optional[int]]
+
+
+def default_workers(threads_per_job: int = 1) -> int:
+    return max(1, (os.cpu_count() or 1) // max(1, threads_per_job))
+
+
+class TrainingScheduler:
+    """Chạy list TrainJob song song, load data 1 lần mỗi station."""
+
+    def __init__(
+        self,
+        load_fn: Callable[[str, Optional[str]], TrainingFrame],
+        train_fn: Callable[[TrainingFrame, TrainJob, int], Dict],
+        workers: Optional[int] = None,
+        threads_per_job: int = 1,
+        io_workers: int = 4,
+    ):
+        """
+        Args:
+            load_fn(region, province): TrainingFrame của station (mọi weekday)
+            train_fn(data, job, n_jobs): train 1 job trên view weekday của station, trả dict có "ok"/"error"
+            workers: số job train đồng thời (None = số core // threads_per_job)
+            threads_per_job: n_jobs XGBoost của mỗi job
+            io_workers: số station load data đồng thời
+        """
+        self.load_fn = load_fn
+        self.train_fn = train_fn
+        self.threads_per_job = max(1, threads_per_job)
+        self.workers = workers or default_workers(self.threads_per_job)
+        self.io_workers = io_workers
+        self.wall_s = 0.0
+        self._print_lock = threading.Lock()
+
+    def _log(self, msg: str):
+        with self._print_lock:
+            print(msg, flush=True)
+
+    @staticmethod
+    def _job_label(job: TrainJob) -> str:
+        region, province, weekday = job
+        return f"{region}/{province or 'all'}" + (f" wd{weekday}" if weekday is not None else "")
+
+    def _load(self, station: Tuple[str, Optional[str]]) -> Tuple[TrainingFrame, float]:
+        t0 = time.perf_counter()
+        data = self.load_fn(*station)
+        return data, time.perf_counter() - t0
+
+    def _train(self, data: TrainingFrame, job: TrainJob) -> Tuple[Dict, float]:
+        t0 = time.perf_counter()
+        try:
+            result = self.train_fn(data, job, self.threads_per_job)
+        except Exception as e:
+            result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return result, time.perf_counter() - t0
+
+    def run(self, jobs: List[TrainJob]) -> List[Dict]:
+        """
+        Train tất cả jobs. Thứ tự kết quả giống thứ tự jobs.
+
+        Returns:
+            [{"job", "label", "ok", "error", "load_s", "train_s", "result"}, ...]
+        """
+        started = time.perf_counter()
+        by_station: Dict[Tuple[str, Optional[str]], List[int]] = {}
+        for i, (region, province, _) in enumerate(jobs):
+            by_station.setdefault((region, province), []).append(i)
+
+        reports: List[Optional[Dict]] = [None] * len(jobs)
+        self._log(f"🧵 Scheduler: {len(jobs)} job / {len(by_station)} station | "
+                  f"{self.workers} worker × {self.threads_per_job} thread XGBoost")
+
+        with ThreadPoolExecutor(self.io_workers, thread_name_prefix="load") as io_pool, \
+                ThreadPoolExecutor(self.workers, thread_name_prefix="train") as train_pool:
+            loads = {io_pool.submit(self._load, station): station for station in by_station}
+            trains = {}
+            pending = set(loads)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    if fut in loads:
+                        station = loads[fut]
+                        try:
+                            data, load_s = fut.result()
+                        except Exception as e:
+                            for i in by_station[station]:
+                                reports[i] = self._report(jobs[i], {"ok": False, "error": f"load lỗi: {e}"}, 0.0, 0.0)
+                            self._log(f"  ❌ load {station[0]}/{station[1] or 'all'}: {e}")
+                            continue
+                        self._log(f"  📥 {station[0]}/{station[1] or 'all'}: {len(data)} rows ({load_s:.1f}s)")
+                        for i in by_station[station]:
+                            tf = train_pool.submit(self._train, data.weekday(jobs[i][2]), jobs[i])
+                            trains[tf] = (i, load_s)
+                            pending.add(tf)
+                    else:
+                        i, load_s = trains[fut]
+                        result, train_s = fut.result()
+                        reports[i] = self._report(jobs[i], result, load_s, train_s)
+                        status = "✅" if reports[i]["ok"] else f"❌ {reports[i]['error']}"
+                        self._log(f"  ⏱️  {reports[i]['label']}: train {train_s:.1f}s {status}")
+
+        self.wall_s = time.perf_counter() - started
+        return reports
+
+    def _report(self, job: TrainJob, result: Dict, load_s: float, train_s: float) -> Dict:
+        return {
+            "job":     job,
+            "label":   self._job_label(job),
+            "ok":      bool(result.get("ok")),
+            "error":   result.get("error"),
+            "load_s":  round(load_s, 2),
+            "train_s": round(train_s, 2),
+            "result":  result,
+        }
+
+    def print_summary(self, reports: List[Dict]):
+        """Bảng wall time từng job + tổng (so với tổng thời gian nếu chạy tuần tự)."""
+        print("\n⏱️  Wall time theo job:")
+        print(f"  {'job':<28} | {'load':>7} | {'train':>7} | status")
+        for r in sorted(reports, key=lambda r: -r["train_s"]):
+            status = "ok" if r["ok"] else f"FAILED: {r['error']}"
+            print(f"  {r['label']:<28} | {r['load_s']:>6.1f}s | {r['train_s']:>6.1f}s | {status}")
+        serial = sum(r["train_s"] for r in reports) + sum({r["job"][:2]: r["load_s"] for r in reports}.values())
+        print(f"  Tổng wall time: {self.wall_s:.1f}s (tuần tự ước tính: {serial:.1f}s, "
+              f"nhanh hơn {serial / self.wall_s if self.wall_s else 0:.1f}x)")
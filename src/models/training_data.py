@@ -0,0 +1,210 @@
+"""
+training_data.py
+Dữ liệu train dạng cột gọn cho 1 station (region + province).
+
+pair_features của station được page qua network đúng 1 lần (mọi weekday, chỉ row có label),
+rồi giữ dưới dạng mảng numpy:
+  - X: float32 (rows × feature), y: int8, pair / day_of_week: int8, feature_date: datetime64[D]
+  - sắp theo (day_of_week, feature_date, pair) → mỗi weekday là 1 đoạn liên tiếp,
+    trong 1 weekday các kỳ theo thứ tự thời gian
+
+Nhờ vậy weekday(), date_range(), time_split(), folds() trả về view (slice numpy, không copy).
+Riêng date_range() trên frame nhiều weekday (train không phân biệt thứ) phải lọc bằng mask → copy.
+"""
+
+from datetime import date
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.models.xgb_model import FEATURE_COLS
+
+
+class TrainingFrame:
+    """Feature + label của 1 station, sắp theo (weekday, ngày, pair); các phép cắt trả về view."""
+
+    def __init__(
+        self,
+        X: np.ndarray,
+        y: np.ndarray,
+        pair: np.ndarray,
+        day_of_week: np.ndarray,
+        feature_date: np.ndarray,
+        feature_cols: Sequence[str] = FEATURE_COLS,
+        label: str = "",
+        presorted: bool = False,
+    ):
+        if not presorted:
+            order = np.lexsort((pair, feature_date, day_of_week))
+            X, y, pair = X[order], y[order], pair[order]
+            day_of_week, feature_date = day_of_week[order], feature_date[order]
+        self.X = np.ascontiguousarray(X, dtype=np.float32)
+        self.y = np.asarray(y, dtype=np.int8)
+        self.pair = np.asarray(pair, dtype=np.int8)
+        self.day_of_week = np.asarray(day_of_week, dtype=np.int8)
+        self.feature_date = np.asarray(feature_date, dtype="datetime64[D]")
+        self.feature_cols = list(feature_cols)
+        self.label = label
+
+    # ==================== LOAD ====================
+
+    @classmethod
+    def load(
+        cls,
+        db,
+        region: str,
+        province: Optional[str],
+        feature_cols: Sequence[str] = FEATURE_COLS,
+    ) -> "TrainingFrame":
+        """Page pair_features (row có label) của 1 station đúng 1 lần, mọi weekday."""
+        label = f"{region}/{province or 'all'}"
+        print(f"📥 Loading training data: {label}...")
+        columns = {col: [] for col in list(feature_cols) + ["pair", "day_of_week", "feature_date", "hit"]}
+        for chunk in db.stream_pair_features(
+            list(columns),
+            filters={"region": region, "province": province},
+            labelled=True,
+        ):
+            for col, values in columns.items():
+                values.append(chunk[col])
+
+        frame = cls.from_columns(
+            {col: np.concatenate(parts) if parts else np.array([], dtype=object) for col, parts in columns.items()},
+            feature_cols=feature_cols,
+            label=label,
+        )
+        print(f"  ✅ Loaded {len(frame)} rows ({frame.n_draws} kỳ) | {frame.nbytes / 1e6:.1f} MB")
+        return frame
+
+    @classmethod
+    def from_columns(
+        cls,
+        columns: Dict[str, np.ndarray],
+        feature_cols: Sequence[str] = FEATURE_COLS,
+        label: str = "",
+    ) -> "TrainingFrame":
+        """Từ dict cột → mảng (feature_cols + pair, day_of_week, feature_date, hit), vd từ stream / Parquet."""
+        def numeric(values, dtype):
+            # feature NULL → NaN (XGBoost coi là missing)
+            if values.dtype == object:
+                return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=dtype)
+            return values.astype(dtype, copy=False)
+
+        X = np.empty((len(columns["hit"]), len(feature_cols)), dtype=np.float32)
+        for i, col in enumerate(feature_cols):
+            X[:, i] = numeric(columns[col], np.float32)
+        return cls(
+            X,
+            columns["hit"].astype(np.int8),
+            columns["pair"].astype(np.int8),
+            columns["day_of_week"].astype(np.int8),
+            columns["feature_date"].astype("datetime64[D]"),
+            feature_cols=feature_cols,
+            label=label,
+        )
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, feature_cols: Sequence[str] = FEATURE_COLS, label: str = "") -> "TrainingFrame":
+        """Từ DataFrame pair_features (có cột pair, day_of_week, feature_date, hit)."""
+        return cls(
+            df[list(feature_cols)].to_numpy(dtype=np.float32),
+            df["hit"].to_numpy(dtype=np.int8),
+            df["pair"].to_numpy(dtype=np.int8),
+            df["day_of_week"].to_numpy(dtype=np.int8),
+            df["feature_date"].to_numpy(dtype="datetime64[D]"),
+            feature_cols=feature_cols,
+            label=label,
+        )
+
+    # ==================== INFO ====================
+
+    def __len__(self) -> int:
+        return len(self.y)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.X, self.y, self.pair, self.day_of_week, self.feature_date))
+
+    @property
+    def dates(self) -> np.ndarray:
+        """Các feature_date (kỳ) có trong frame, tăng dần."""
+        return np.unique(self.feature_date)
+
+    @property
+    def n_draws(self) -> int:
+        return len(self.dates)
+
+    def _single_weekday(self) -> bool:
+        return len(self) == 0 or self.day_of_week[0] == self.day_of_week[-1]
+
+    # ==================== VIEWS ====================
+
+    def _slice(self, start: int, stop: int, label: str) -> "TrainingFrame":
+        s = slice(start, stop)
+        return TrainingFrame(
+            self.X[s], self.y[s], self.pair[s], self.day_of_week[s], self.feature_date[s],
+            feature_cols=self.feature_cols, label=label, presorted=True,
+        )
+
+    def _mask(self, mask: np.ndarray, label: str) -> "TrainingFrame":
+        return TrainingFrame(
+            self.X[mask], self.y[mask], self.pair[mask], self.day_of_week[mask], self.feature_date[mask],
+            feature_cols=self.feature_cols, label=label, presorted=True,
+        )
+
+    def weekday(self, weekday: Optional[int]) -> "TrainingFrame":
+        """View các kỳ của 1 thứ trong tuần (0=T2..6=CN); None = cả frame."""
+        if weekday is None:
+            return self
+        start, stop = np.searchsorted(self.day_of_week, [weekday, weekday + 1])
+        return self._slice(int(start), int(stop), f"{self.label} wd{weekday}")
+
+    def date_range(self, start: Optional[date] = None, end: Optional[date] = None) -> "TrainingFrame":
+        """Các kỳ start <= feature_date < end. View nếu frame chỉ có 1 weekday, ngược lại copy."""
+        lo = np.datetime64(start, "D") if start is not None else None
+        hi = np.datetime64(end, "D") if end is not None else None
+        if self._single_weekday():
+            i = int(np.searchsorted(self.feature_date, lo)) if lo is not None else 0
+            j = int(np.searchsorted(self.feature_date, hi)) if hi is not None else len(self)
+            return self._slice(i, j, self.label)
+        mask = np.ones(len(self), dtype=bool)
+        if lo is not None:
+            mask &= self.feature_date >= lo
+        if hi is not None:
+            mask &= self.feature_date < hi
+        return self._mask(mask, self.label)
+
+    def time_split(self, val_ratio: float = 0.2) -> Tuple["TrainingFrame", "TrainingFrame"]:
+        """Split theo thời gian (không shuffle): (1 - val_ratio) số kỳ đầu để train, phần sau để val."""
+        dates = self.dates
+        split_idx = int(len(dates) * (1 - val_ratio))
+        if split_idx >= len(dates):
+            return self, self._slice(len(self), len(self), self.label)
+        split_date = dates[split_idx]
+        return self.date_range(end=split_date), self.date_range(start=split_date)
+
+    def folds(self, n_folds: int = 5, min_train_ratio: float = 0.5) -> Iterator[Tuple["TrainingFrame", "TrainingFrame"]]:
+        """
+        Walk-forward folds: train = mọi kỳ trước mốc, val = khối kỳ kế tiếp.
+        min_train_ratio: tỉ lệ kỳ tối thiểu dành cho train ở fold đầu.
+        """
+        dates = self.dates
+        first = int(len(dates) * min_train_ratio)
+        bounds = np.linspace(first, len(dates), n_folds + 1).astype(int)
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            if lo >= hi:
+                continue
+            end = dates[hi] if hi < len(dates) else None
+            yield self.date_range(end=dates[lo]), self.date_range(start=dates[lo], end=end)
+
+    # ==================== OUTPUT ====================
+
+    @property
+    def features(self) -> pd.DataFrame:
+        """X dạng DataFrame (cột = feature_cols), dùng chung bộ nhớ với mảng X."""
+        return pd.DataFrame(self.X, columns=self.feature_cols, copy=False)
+
+    @property
+    def labels(self) -> pd.Series:
+        return pd.Series(self.y, copy=False)
@@ -5,13 +5,21 @@ XGBoost wrapper cho bài toán dự đoán 2 số cuối xổ số.
 Mỗi instance là 1 model cho 1 đài (region + province).
 Input: 100 feature vectors (1 per pair 00–99)
 Output: top-k pairs có xác suất xuất hiện cao nhất
+
+Định dạng file model:
+  - .ubj / .json: booster native của XGBoost (UBJSON / JSON) + sidecar <file>.meta.json
+    chứa feature_cols. Load chỉ cần xgb.Booster, không cần sklearn / unpickle.
+  - .pkl: joblib pickle XGBClassifier (định dạng cũ, vẫn load được).
 """
 
+import json
 import os
 import joblib
 import numpy as np
 import pandas as pd
-from typing import List, Tuple, Optional
+from typing import Iterable, List, Tuple, Optional
+
+from src.models.evaluation import DEFAULT_KS, evaluate_top_k, top_k_indices
 
 try:
     import xgboost as xgb
@@ -28,6 +36,13 @@ FEATURE_COLS = [
     "day_of_week",
 ]
 
+NATIVE_FORMATS = (".ubj", ".json")
+
+
+def sidecar_path(filepath: str) -> str:
+    """File meta đi kèm model native: <file>.meta.json"""
+    return f"{filepath}.meta.json"
+
 
 class LotteryXGB:
     """XGBoost model wrapper cho dự đoán 2 số cuối."""
@@ -40,7 +55,9 @@ class LotteryXGB:
         subsample: float = 0.8,
         colsample_bytree: float = 0.8,
         random_state: int = 42,
+        n_jobs: Optional[int] = None,
     ):
+        """n_jobs: số thread XGBoost (None = mặc định); train song song nhiều model thì pin = 1–2."""
         self.params = dict(
             n_estimators=n_estimators,
             max_depth=max_depth,
@@ -51,6 +68,8 @@ class LotteryXGB:
             eval_metric="auc",
             use_label_encoder=False,
         )
+        if n_jobs is not None:
+            self.params["n_jobs"] = n_jobs
         self.model = None
         self.feature_cols = FEATURE_COLS
 
@@ -60,10 +79,16 @@ class LotteryXGB:
         y_train: pd.Series,
         X_val: Optional[pd.DataFrame] = None,
         y_val: Optional[pd.Series] = None,
+        val_groups: Optional[pd.Series] = None,
+        region: Optional[str] = None,
     ) -> dict:
         """
         Train XGBoost classifier.
-        Returns dict metrics: auc_val, hit_rate_top3_val.
+        Returns dict metrics: auc, hit_rate_top{k} (k = 1, 3, 5, 10), profit_mean_top3 (nếu có region).
+
+        Args:
+            val_groups: feature_date của từng row val (nhóm kỳ theo ngày thay vì mỗi 100 rows)
+            region: 'XSMB' / 'XSMN' để tính lãi/lỗ theo bảng điểm tier
         """
         if not XGB_AVAILABLE:
             raise ImportError("XGBoost not installed")
@@ -86,43 +111,52 @@ class LotteryXGB:
             except Exception:
                 metrics["auc"] = 0.5
 
-            # Hit-rate@3: mỗi kỳ trong val, top-3 có trúng không?
-            metrics["hit_rate_top3"] = self._backtest_hit_rate(X_val, y_val, k=3)
+            # Hit-rate@k: mỗi kỳ trong val, top-k có trúng không?
+            evaluation = evaluate_top_k(probs, y_val, groups=val_groups, region=region)
+            for k, rate in evaluation["hit_rate"].items():
+                metrics[f"hit_rate_top{k}"] = rate
+            if "profit" in evaluation:
+                metrics["profit_mean_top3"] = evaluation["profit"]["mean"]
 
         return metrics
 
     def _backtest_hit_rate(
-        self, X: pd.DataFrame, y: pd.Series, k: int = 3
+        self,
+        X: pd.DataFrame,
+        y: pd.Series,
+        k: int = 3,
+        groups: Optional[pd.Series] = None,
     ) -> float:
         """
         Tính hit-rate khi chọn top-k pairs.
-        Lưu ý: mỗi 100 rows liên tiếp là 1 kỳ (pair 0..99).
+        groups = feature_date mỗi row; None thì mỗi 100 rows liên tiếp là 1 kỳ (pair 0..99).
         """
-        if len(X) < 100:
+        if groups is None and len(X) < 100:
             return 0.0
+        return evaluate_top_k(self.predict_proba_all(X), y, groups=groups, ks=(k,))["hit_rate"][k]
 
-        probs = self.model.predict_proba(X)[:, 1]
-        hits = 0
-        total_draws = len(X) // 100
-
-        for i in range(total_draws):
-            start = i * 100
-            p_slice = probs[start:start + 100]
-            y_slice = y.iloc[start:start + 100]
-
-            top_k_indices = np.argsort(p_slice)[-k:]
-            if y_slice.iloc[top_k_indices].any():
-                hits += 1
-
-        return round(hits / total_draws, 4) if total_draws > 0 else 0.0
+    def evaluate(
+        self,
+        X: pd.DataFrame,
+        y: pd.Series,
+        groups: Optional[pd.Series] = None,
+        ks: Iterable[int] = DEFAULT_KS,
+        region: Optional[str] = None,
+    ) -> dict:
+        """Backtest vector hóa: hit@k cho nhiều k, hit theo kỳ, lãi/lỗ tier (xem evaluation.evaluate_top_k)."""
+        return evaluate_top_k(self.predict_proba_all(X), y, groups=groups, ks=ks, region=region)
 
     def predict_proba_all(self, X: pd.DataFrame) -> np.ndarray:
         """
         Predict xác suất cho 100 cặp (00–99).
-        X phải có đúng 100 rows, index = pair (0..99).
+        X thường có đúng 100 rows, index = pair (0..99); top_k_batch truyền nhiều khối 100 rows.
         """
         if self.model is None:
             raise ValueError("Model chưa được train hoặc load!")
+        if isinstance(self.model, xgb.Booster):
+            # Model native: predict thẳng trên booster (binary:logistic → xác suất lớp 1)
+            values = np.ascontiguousarray(X[self.feature_cols].to_numpy(dtype=np.float32))
+            return self.model.inplace_predict(values)
         probs = self.model.predict_proba(X[self.feature_cols])[:, 1]
         return probs
 
@@ -134,22 +168,72 @@ class LotteryXGB:
             List of (pair, probability) sorted by prob desc
         """
         probs = self.predict_proba_all(X)
-        top_indices = np.argsort(probs)[-k:][::-1]
+        top_indices = top_k_indices(probs, k)
         return [(int(idx), round(float(probs[idx]), 4)) for idx in top_indices]
 
+    def top_k_batch(self, X: pd.DataFrame, k: int = 3, group_size: int = 100) -> List[List[Tuple[int, float]]]:
+        """
+        top_k cho nhiều đài trong 1 lần predict.
+        X là các khối `group_size` rows (pair 0..99) xếp liên tiếp, mỗi khối 1 đài.
+
+        Returns:
+            List (theo thứ tự khối) các list (pair, probability) sorted by prob desc
+        """
+        probs = self.predict_proba_all(X).reshape(-1, group_size)
+        top_indices = top_k_indices(probs, k)
+        return [
+            [(int(idx), round(float(row[idx]), 4)) for idx in indices]
+            for row, indices in zip(probs, top_indices)
+        ]
+
     def save(self, filepath: str):
-        """Lưu model ra file .pkl"""
+        """
+        Lưu model. Định dạng theo đuôi file:
+        .ubj / .json → booster native + sidecar meta; .pkl → joblib (định dạng cũ).
+        """
         if self.model is None:
             raise ValueError("Không có model để lưu!")
         os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
-        joblib.dump({"model": self.model, "feature_cols": self.feature_cols}, filepath)
-        print(f"✅ Model saved: {filepath}")
+
+        if os.path.splitext(filepath)[1] not in NATIVE_FORMATS:
+            joblib.dump({"model": self.model, "feature_cols": self.feature_cols}, filepath)
+            print(f"✅ Model saved: {filepath}")
+            return
+
+        booster = self.model if isinstance(self.model, xgb.Booster) else self.model.get_booster()
+        # Ghi kèm feature_cols trong booster → file model vẫn tự đủ nếu thiếu sidecar
+        booster.set_attr(feature_cols=json.dumps(self.feature_cols))
+        booster.save_model(filepath)
+        with open(sidecar_path(filepath), "w") as f:
+            json.dump({
+                "format":          os.path.splitext(filepath)[1][1:],
+                "feature_cols":    self.feature_cols,
+                "params":          self.params,
+                "xgboost_version": xgb.__version__,
+            }, f, indent=2)
+        print(f"✅ Model saved: {filepath} (+ {os.path.basename(sidecar_path(filepath))})")
 
     def load(self, filepath: str):
-        """Load model từ file .pkl"""
+        """Load model: .ubj / .json qua xgb.Booster (không cần sklearn), .pkl qua joblib."""
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"Không tìm thấy model: {filepath}")
-        data = joblib.load(filepath)
-        self.model = data["model"]
-        self.feature_cols = data.get("feature_cols", FEATURE_COLS)
+
+        if os.path.splitext(filepath)[1] not in NATIVE_FORMATS:
+            data = joblib.load(filepath)
+            self.model = data["model"]
+            self.feature_cols = data.get("feature_cols", FEATURE_COLS)
+            print(f"✅ Model loaded: {filepath}")
+            return
+
+        if not XGB_AVAILABLE:
+            raise ImportError("XGBoost not installed")
+        booster = xgb.Booster()
+        booster.load_model(filepath)
+        meta = {}
+        if os.path.exists(sidecar_path(filepath)):
+            with open(sidecar_path(filepath)) as f:
+                meta = json.load(f)
+        embedded = booster.attr("feature_cols")
+        self.feature_cols = meta.get("feature_cols") or (json.loads(embedded) if embedded else FEATURE_COLS)
+        self.model = booster
         print(f"✅ Model loaded: {filepath}")
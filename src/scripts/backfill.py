@@ -18,10 +18,29 @@ Usage:
     # Backfill từ ngày cụ thể
     python src/scripts/backfill.py --from-date 2025-01-01
 
+    # Async: crawl song song (4 request đồng thời, tối đa 2 req/s, burst 4),
+    # tiến độ lưu ở data/backfill_checkpoint.json — chạy lại sẽ tiếp tục từ chỗ dừng
+    python src/scripts/backfill.py --concurrency 4 --rps 2 --burst 4
+
+    # Trang HTML được cache ở data/html_cache; parse lại toàn bộ từ cache, không gọi network
+    python src/scripts/backfill.py --from-date 2020-01-01 --replay --concurrency 8
+
+    # Request cả những ngày đã có trong lottery_draws / no_draw_dates
+    python src/scripts/backfill.py --days 30 --force
+
+Planner: chỉ request các ngày có lịch quay (DrawCalendar: lịch tuần + Tết / NO_DRAW_DATES),
+còn thiếu ít nhất 1 đài theo lịch trong lottery_draws (1 lần đọc draw_date cho cả khoảng — ngày
+XSMN mới lưu được một phần đài sẽ được request lại) và chưa bị ghi vào no_draw_dates.
+no_draw_dates (migration 06 + 07) ghi cả region cho trang có thông báo nghỉ quay (nghỉ Tết / nghỉ lễ)
+và riêng từng đài có lịch tuần nhưng không có trên trang kết quả đã tải được (lịch tuần tĩnh khác
+lịch thật, đài nghỉ riêng). Trang rỗng khác (thiếu bảng, không parse được) tính là lỗi, lần sau request lại.
+Chạy lại trên khoảng đã đủ dữ liệu → 0 HTTP request tới trang kết quả.
+
 Requirements:
     - Set SUPABASE_URL and SUPABASE_SERVICE_KEY in .env or environment
 """
 import argparse
+import asyncio
 import sys
 import os
 import time
@@ -32,16 +51,150 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspa
 
 from src.crawler.xsmb_crawler import XSMBCrawler
 from src.crawler.xsmn_crawler import XSMNCrawler
+from src.crawler.async_backfill import AsyncBackfillEngine
+from src.crawler.page_cache import DEFAULT_CACHE_DIR, configure_page_cache
+from src.crawler.transport import configure_transport, get_transport
 from src.database.supabase_client import LotteryDB
+from src.utils.draw_calendar import DrawCalendar
+
+FLUSH_EVERY = 200  # Số draws gom lại trước mỗi lần bulk upsert
+
+
+def plan_dates(db: LotteryDB, region: str, start_date: date, end_date: date, force: bool = False) -> list:
+    """
+    Các ngày (mới nhất trước) cần request cho region:
+    có lịch quay, chưa có trong no_draw_dates và còn đài theo lịch chưa có kỳ trong lottery_draws
+    (XSMN: so tập đài đã lưu với scheduled_on, ngày mới lưu một phần đài vẫn được request lại).
+    force=True: chỉ bỏ ngày nghỉ theo lịch (Tết / NO_DRAW_DATES), request lại mọi ngày khác.
+    """
+    if force:
+        calendar = DrawCalendar(start=start_date, end=end_date)
+    else:
+        calendar = DrawCalendar.from_db(db, since=start_date, until=end_date, region=region, end=end_date)
+    delta = (end_date - start_date).days + 1
+    dates = [end_date - timedelta(days=i) for i in range(delta)]
+
+    planned, existing, off, partial = [], 0, 0, 0
+    for d in dates:
+        if not calendar.scheduled_on(d, region):
+            if calendar.has_observed(region, d):
+                existing += 1
+            else:
+                off += 1
+        elif not calendar.missing_on(d, region):
+            existing += 1
+        else:
+            planned.append(d)
+            partial += calendar.has_observed(region, d)
+    print(f"🗓️  {region}: {len(planned)}/{len(dates)} ngày cần request "
+          f"(đã có {existing} | nghỉ {off} | thiếu đài {partial})")
+    return planned
+
+
+def crawl_date(crawler, region: str, target_date: date):
+    """
+    Tải + parse trang kết quả 1 ngày.
+
+    Returns:
+        None nếu không tải được (lỗi mạng / HTTP / cache miss khi replay) hoặc trang không có kỳ nào
+        mà cũng không có thông báo nghỉ (thiếu bảng, parse lỗi → lần sau request lại),
+        [] nếu trang có thông báo nghỉ quay (crawler.is_holiday_page), ngược lại list draws
+    """
+    try:
+        html = crawler.fetch_page(target_date)
+    except Exception as e:
+        print(f"❌ Fetch error: {e}")
+        return None
+    if html is None:
+        return None
+    if region == 'XSMB':
+        result = crawler.parse_results(html, target_date)
+        draws = [result] if result else []
+    else:
+        draws = crawler.parse_batch_results(html, target_date)
+    if draws:
+        return draws
+    holiday = crawler.is_holiday_page(html)
+    if crawler.page_cache is not None:
+        # Trang lỗi bỏ khỏi cache bất kể tuổi; trang nghỉ chỉ bỏ nếu còn mới (có thể chưa cập nhật)
+        crawler.page_cache.reject(crawler.MIEN, target_date, any_age=not holiday)
+    if not holiday:
+        print(f"  ⚠️  {region} {target_date}: trang không có kết quả và không có thông báo nghỉ")
+        return None
+    return []
+
+
+def absent_provinces(region: str, target_date: date, draws: list) -> list:
+    """Đài có lịch tuần ngày target_date nhưng không có trên trang kết quả đã parse được (chỉ XSMN)."""
+    if region != 'XSMN' or not draws:
+        return []
+    parsed = {draw.get('province') for draw in draws}
+    scheduled = DrawCalendar(start=target_date, end=target_date).scheduled_on(target_date, region)
+    return [province for _, province in scheduled if province not in parsed]
+
+
+def record_no_draw(db: LotteryDB, region: str, dates: list, absent: dict = None) -> int:
+    """
+    Ghi no_draw_dates: cả region cho các ngày có thông báo nghỉ quay (dates), riêng từng đài
+    cho absent = {ngày: [province]} (đài có lịch nhưng không có trên trang kết quả).
+    Chỉ ngày đã qua (trang hôm nay có thể chưa có kết quả) và chưa có kỳ tương ứng
+    trong lottery_draws (1 lần đọc cho cả list).
+    """
+    today = date.today()
+    dates = sorted(d for d in dates if d < today)
+    absent = {d: provinces for d, provinces in (absent or {}).items() if d < today and provinces}
+    check = sorted(set(dates) | set(absent))
+    if not check:
+        return 0
+
+    observed = {}
+    for row in db.stream("lottery_draws", columns="draw_date,province",
+                         filters={"region": region, "draw_date": [d.isoformat() for d in check]}):
+        observed.setdefault(str(row["draw_date"])[:10], set()).add(row["province"])
+    dates = [d for d in dates if d.isoformat() not in observed]
+    by_province = {}
+    for d, provinces in absent.items():
+        for province in provinces:
+            if province not in observed.get(d.isoformat(), ()):
+                by_province.setdefault(province, []).append(d)
+
+    saved_days = saved_stations = 0
+    try:
+        if dates:
+            saved_days = db.mark_no_draw_dates(region, dates)
+        for province, province_dates in by_province.items():
+            saved_stations += db.mark_no_draw_dates(region, province_dates, reason="absent_from_page", province=province)
+    except Exception as e:
+        print(f"  ⚠️  Không ghi được no_draw_dates (chưa chạy migration 06 / 07?): {e}")
+        return saved_days + saved_stations
+    if saved_days or saved_stations:
+        print(f"  🎌 {region}: ghi {saved_days} ngày không quay + {saved_stations} (ngày, đài) "
+              f"không có trên trang vào no_draw_dates")
+    return saved_days + saved_stations
 
 
-def backfill_xsmb(db: LotteryDB, start_date: date, end_date: date, delay: float = 2.0):
+def save_draws(db: LotteryDB, draws: list) -> tuple:
+    """Bulk upsert các draws đã crawl. Trả về (saved, failed)."""
+    if not draws:
+        return 0, 0
+    outcomes = db.upsert_draws(draws)
+    saved = 0
+    for draw, outcome in zip(draws, outcomes):
+        if outcome["ok"]:
+            saved += 1
+        else:
+            label = draw.get('province') or draw['region']
+            print(f"  ❌ {draw['draw_date']} {label}: DB error: {outcome['error']}")
+    print(f"  💾 Bulk upsert: {saved}/{len(draws)} draws saved")
+    return saved, len(draws) - saved
+
+
+def backfill_xsmb(db: LotteryDB, start_date: date, end_date: date, delay: float = 2.0, force: bool = False):
     """Backfill XSMB data from start_date to end_date (inclusive)."""
     crawler = XSMBCrawler()
     
-    # Generate list of dates (newest first)
-    delta = (end_date - start_date).days + 1
-    dates = [end_date - timedelta(days=i) for i in range(delta)]
+    # Generate list of dates (newest first), bỏ ngày nghỉ / ngày đã có
+    dates = plan_dates(db, 'XSMB', start_date, end_date, force)
     
     print(f"\n{'='*60}")
     print(f"🚀 XSMB Backfill: {start_date} → {end_date} ({len(dates)} days)")
@@ -50,28 +203,31 @@ def backfill_xsmb(db: LotteryDB, start_date: date, end_date: date, delay: float
     success_count = 0
     skipped_count = 0
     failed_count = 0
+    pending = []
+    no_draw = []
     
     for i, target_date in enumerate(dates):
         print(f"\n[{i+1}/{len(dates)}] {target_date} ...", end=" ", flush=True)
         
         try:
-            results = crawler.fetch_results(target_date)
+            draws = crawl_date(crawler, 'XSMB', target_date)
             
-            if results:
-                try:
-                    db.upsert_draw(results)
-                    success_count += 1
-                    print(f"✅ ĐB={results.get('special_prize', '?')}")
-                except Exception as e:
-                    if 'duplicate' in str(e).lower():
-                        skipped_count += 1
-                        print(f"⏭️  Already exists")
-                    else:
-                        failed_count += 1
-                        print(f"❌ DB error: {e}")
+            if draws:
+                results = draws[0]
+                pending.append(results)
+                print(f"✅ ĐB={results.get('special_prize', '?')}")
+                if len(pending) >= FLUSH_EVERY:
+                    saved, failed = save_draws(db, pending)
+                    success_count += saved
+                    failed_count += failed
+                    pending = []
+            elif draws is None:
+                failed_count += 1
+                print(f"❌ Không tải / parse được trang")
             else:
                 skipped_count += 1
-                print(f"⚠️  No data (holiday/off)")
+                no_draw.append(target_date)
+                print(f"🎌 Nghỉ quay (holiday)")
                 
         except Exception as e:
             failed_count += 1
@@ -81,6 +237,11 @@ def backfill_xsmb(db: LotteryDB, start_date: date, end_date: date, delay: float
         if i < len(dates) - 1:
             time.sleep(delay)
     
+    saved, failed = save_draws(db, pending)
+    success_count += saved
+    failed_count += failed
+    record_no_draw(db, 'XSMB', no_draw)
+    
     print(f"\n{'='*60}")
     print(f"📊 XSMB Summary: ✅ {success_count} saved | ⏭️  {skipped_count} skipped | ❌ {failed_count} failed")
     print(f"{'='*60}")
@@ -96,12 +257,11 @@ def backfill_xsmb(db: LotteryDB, start_date: date, end_date: date, delay: float
     return success_count, skipped_count, failed_count
 
 
-def backfill_xsmn(db: LotteryDB, start_date: date, end_date: date, delay: float = 2.0):
+def backfill_xsmn(db: LotteryDB, start_date: date, end_date: date, delay: float = 2.0, force: bool = False):
     """Backfill XSMN data (all provinces) from start_date to end_date."""
     crawler = XSMNCrawler()
     
-    delta = (end_date - start_date).days + 1
-    dates = [end_date - timedelta(days=i) for i in range(delta)]
+    dates = plan_dates(db, 'XSMN', start_date, end_date, force)
     
     print(f"\n{'='*60}")
     print(f"🚀 XSMN Backfill: {start_date} → {end_date} ({len(dates)} days)")
@@ -110,29 +270,35 @@ def backfill_xsmn(db: LotteryDB, start_date: date, end_date: date, delay: float
     success_count = 0
     skipped_count = 0
     failed_count = 0
+    pending = []
+    no_draw = []
+    absent = {}
     
     for i, target_date in enumerate(dates):
         print(f"\n[{i+1}/{len(dates)}] {target_date} ...")
         
         try:
-            results_list = crawler.fetch_batch_results(target_date)
+            results_list = crawl_date(crawler, 'XSMN', target_date)
             
             if results_list:
                 for res in results_list:
-                    try:
-                        db.upsert_draw(res)
-                        success_count += 1
-                        print(f"  ✅ {res['province']}: ĐB={res.get('special_prize', '?')}")
-                    except Exception as e:
-                        if 'duplicate' in str(e).lower():
-                            skipped_count += 1
-                            print(f"  ⏭️  {res['province']}: Already exists")
-                        else:
-                            failed_count += 1
-                            print(f"  ❌ {res['province']}: DB error: {e}")
+                    pending.append(res)
+                    print(f"  ✅ {res['province']}: ĐB={res.get('special_prize', '?')}")
+                absent[target_date] = absent_provinces('XSMN', target_date, results_list)
+                if absent[target_date]:
+                    print(f"  ⚠️  Có lịch nhưng không có trên trang: {', '.join(absent[target_date])}")
+                if len(pending) >= FLUSH_EVERY:
+                    saved, failed = save_draws(db, pending)
+                    success_count += saved
+                    failed_count += failed
+                    pending = []
+            elif results_list is None:
+                failed_count += 1
+                print(f"  ❌ Không tải / parse được trang")
             else:
                 skipped_count += 1
-                print(f"  ⚠️  No data (holiday/off)")
+                no_draw.append(target_date)
+                print(f"  🎌 Nghỉ quay (holiday)")
                 
         except Exception as e:
             failed_count += 1
@@ -141,6 +307,11 @@ def backfill_xsmn(db: LotteryDB, start_date: date, end_date: date, delay: float
         if i < len(dates) - 1:
             time.sleep(delay)
     
+    saved, failed = save_draws(db, pending)
+    success_count += saved
+    failed_count += failed
+    record_no_draw(db, 'XSMN', no_draw, absent)
+    
     print(f"\n{'='*60}")
     print(f"📊 XSMN Summary: ✅ {success_count} saved | ⏭️  {skipped_count} skipped | ❌ {failed_count} failed")
     print(f"{'='*60}")
@@ -156,6 +327,56 @@ def backfill_xsmn(db: LotteryDB, start_date: date, end_date: date, delay: float
     return success_count, skipped_count, failed_count
 
 
+def backfill_async(db: LotteryDB, regions: list, start_date: date, end_date: date, args) -> int:
+    """Backfill song song bằng AsyncBackfillEngine (có checkpoint để resume)."""
+    force = args.force or args.replay  # replay: parse lại cả ngày đã có (không tốn request)
+    jobs = [(region, d) for region in regions for d in plan_dates(db, region, start_date, end_date, force)]
+
+    print(f"\n{'='*60}")
+    print(f"🚀 Async Backfill {'+'.join(regions)}: {start_date} → {end_date} ({len(jobs)} pages)")
+    print(f"   concurrency={args.concurrency} | {args.rps} req/s | burst={args.burst} | checkpoint={args.checkpoint}")
+    print(f"{'='*60}")
+
+    # Mỗi request đồng thời cần 1 kết nối keep-alive riêng trong pool
+    configure_transport(pool_maxsize=max(10, args.concurrency))
+    engine = AsyncBackfillEngine(
+        save_fn=lambda draws: save_draws(db, draws),
+        concurrency=args.concurrency,
+        rate=args.rps,
+        burst=args.burst,
+        checkpoint_path=args.checkpoint,
+        flush_every=FLUSH_EVERY,
+    )
+    t0 = time.time()
+    stats = asyncio.run(engine.run(jobs)) if jobs else {}
+    elapsed = time.time() - t0
+
+    # Trang có thông báo nghỉ quay (checkpoint 'holiday') + đài có lịch nhưng không có trên trang → no_draw_dates
+    for region in regions:
+        marks = engine.checkpoint.state.get(region, {})
+        parsed = engine.parsed.get(region, {})
+        absent = {d: absent_provinces(region, d, [{'province': p} for p in provinces])
+                  for d, provinces in parsed.items()}
+        record_no_draw(db, region, [d for r, d in jobs if r == region and marks.get(d.isoformat()) == "holiday"], absent)
+
+    total_saved = 0
+    for region, st in stats.items():
+        print(f"📊 {region} Summary: ✅ {st['saved']} saved | ⚠️  {st['empty']} no data | "
+              f"⏭️  {st['skipped']} checkpoint | ❌ {st['failed']} failed")
+        db.log_crawler_status({
+            'crawl_date': date.today(),
+            'region': region,
+            'status': 'success' if st['failed'] == 0 else 'partial',
+            'error_message': f"Async backfill {start_date}→{end_date}: {st['saved']} saved, "
+                             f"{st['empty'] + st['skipped']} skipped, {st['failed']} failed",
+            'records_inserted': st['saved']
+        })
+        total_saved += st['saved']
+    print(f"⏱️  {elapsed:.1f}s")
+    get_transport().print_summary()
+    return total_saved
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Backfill historical lottery data locally',
@@ -170,8 +391,26 @@ def main():
                         help='Start date in YYYY-MM-DD format (overrides --days)')
     parser.add_argument('--delay', type=float, default=2.0,
                         help='Delay between requests in seconds (default: 2.0)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Số request đồng thời; > 1 dùng async engine (default: 1 = tuần tự)')
+    parser.add_argument('--rps', type=float, default=2.0,
+                        help='Async: số request/giây tối đa (token bucket, default: 2.0)')
+    parser.add_argument('--burst', type=int, default=4,
+                        help='Async: số request dồn tối đa của token bucket (default: 4)')
+    parser.add_argument('--checkpoint', type=str, default='data/backfill_checkpoint.json',
+                        help='Async: file checkpoint để resume (default: data/backfill_checkpoint.json)')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR,
+                        help=f'Thư mục cache HTML (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Không đọc/ghi cache HTML')
+    parser.add_argument('--replay', action='store_true',
+                        help='Chỉ parse lại từ cache HTML, không gọi network')
+    parser.add_argument('--force', action='store_true',
+                        help='Request cả ngày đã có trong lottery_draws / no_draw_dates')
     
     args = parser.parse_args()
+    if args.replay and args.no_cache:
+        parser.error('--replay cần cache, không dùng chung với --no-cache')
     
     # Determine date range
     end_date = date.today() - timedelta(days=1)  # Yesterday
@@ -182,23 +421,43 @@ def main():
     
     print(f"\n🗓️  Backfill range: {start_date} → {end_date}")
     print(f"📍 Region: {args.region}")
-    print(f"⏱️  Delay: {args.delay}s between requests")
+    
+    page_cache = configure_page_cache(None if args.no_cache else args.cache_dir, replay=args.replay)
+    if args.replay:
+        args.delay = 0.0  # không có request thật → không cần rate limit
+        print(f"📦 Replay mode: chỉ đọc cache {args.cache_dir}")
+    else:
+        print(f"⏱️  Delay: {args.delay}s between requests")
     
     db = LotteryDB()
     
+    if args.concurrency > 1:
+        regions = ['XSMB', 'XSMN'] if args.region == 'BOTH' else [args.region]
+        total_saved = backfill_async(db, regions, start_date, end_date, args)
+        if page_cache:
+            page_cache.print_summary()
+        print(f"\n🎉 Backfill complete! Total records saved: {total_saved}")
+        return
+    
     total_saved = 0
+    force = args.force or args.replay
+    requested = 0
     
     if args.region in ('XSMB', 'BOTH'):
-        s, sk, f = backfill_xsmb(db, start_date, end_date, args.delay)
+        s, sk, f = backfill_xsmb(db, start_date, end_date, args.delay, force)
         total_saved += s
+        requested = s + sk + f
     
     if args.region in ('XSMN', 'BOTH'):
-        if args.region == 'BOTH':
+        if args.region == 'BOTH' and not args.replay and requested:
             print("\n⏳ Waiting 10s before XSMN...")
             time.sleep(10)
-        s, sk, f = backfill_xsmn(db, start_date, end_date, args.delay)
+        s, sk, f = backfill_xsmn(db, start_date, end_date, args.delay, force)
         total_saved += s
     
+    get_transport().print_summary()
+    if page_cache:
+        page_cache.print_summary()
     print(f"\n🎉 Backfill complete! Total records saved: {total_saved}")
 
 
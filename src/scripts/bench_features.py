@@ -0,0 +1,113 @@
+"""
+bench_features.py
+So sánh bitmap engine (build_features_for_day) với bản loop gốc:
+  1. Parity: output 100 feature rows phải giống hệt nhau
+  2. Benchmark: thời gian tính feature cho 1 đài ở nhiều độ dài lịch sử
+
+Dữ liệu lịch sử được sinh ngẫu nhiên (seed cố định) với 18 giải/kỳ (XSMN)
+hoặc 27 giải/kỳ (XSMB), nên không cần kết nối Supabase.
+
+Usage:
+  python src/scripts/bench_features.py
+  python src/scripts/bench_features.py --sizes 120 1000 10000 --repeat 5
+  python src/scripts/bench_features.py --parity-only --seeds 50
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from src.features.feature_builder import (
+    _build_features_for_day_loop,
+    build_features_for_day,
+)
+from src.features.tail_set import TailSet
+
+TARGET_DATE = date(2026, 2, 19)
+
+
+def make_history(n_draws: int, tails_per_draw: int, seed: int) -> pd.DataFrame:
+    """Sinh history giả lập cùng format với _extract_history."""
+    rng = np.random.default_rng(seed)
+    tails = rng.integers(0, 100, size=(n_draws, tails_per_draw))
+    codes = np.repeat(np.arange(n_draws), tails_per_draw)
+    return pd.DataFrame({
+        "draw_date": pd.to_datetime([TARGET_DATE - timedelta(days=n_draws - i) for i in range(n_draws)]),
+        "tail_set":  TailSet.batch(codes, tails.ravel(), n_draws),
+    })
+
+
+def check_parity(history: pd.DataFrame, target_tail_set: TailSet) -> list:
+    """Trả về list mô tả các giá trị lệch (rỗng = parity OK)."""
+    expected = _build_features_for_day_loop(TARGET_DATE, history, target_tail_set)
+    actual = build_features_for_day(TARGET_DATE, history, target_tail_set)
+
+    mismatches = []
+    for exp_row, act_row in zip(expected, actual):
+        for col, exp_val in exp_row.items():
+            if act_row.get(col) != exp_val:
+                mismatches.append(f"pair={exp_row['pair']:02d} {col}: {exp_val!r} != {act_row.get(col)!r}")
+    return mismatches
+
+
+def time_call(fn, repeat: int) -> float:
+    """Thời gian tốt nhất (giây) qua `repeat` lần chạy."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity + benchmark cho bitmap feature engine")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[120, 1000, 10000],
+                        help="Số kỳ lịch sử cần benchmark (mặc định: 120 1000 10000)")
+    parser.add_argument("--tails", type=int, default=18, help="Số giải mỗi kỳ (18 = XSMN, 27 = XSMB)")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp cho mỗi phép đo")
+    parser.add_argument("--seeds", type=int, default=5, help="Số history ngẫu nhiên để kiểm tra parity")
+    parser.add_argument("--parity-only", action="store_true", help="Chỉ kiểm tra parity, bỏ qua benchmark")
+    args = parser.parse_args()
+
+    # 1. Parity — nhiều seed, nhiều độ dài (kể cả history rất ngắn / rỗng)
+    print("🔍 Parity check: bitmap engine vs loop gốc")
+    parity_sizes = sorted(set([0, 1, 2, 10] + [s for s in args.sizes if s <= 1000]))
+    failed = 0
+    for n in parity_sizes:
+        for seed in range(args.seeds):
+            history = make_history(n, args.tails, seed)
+            target = TailSet.from_tails(np.random.default_rng(seed + 10_000).integers(0, 100, args.tails))
+            mismatches = check_parity(history, target)
+            if mismatches:
+                failed += 1
+                print(f"  ❌ n={n} seed={seed}: {len(mismatches)} giá trị lệch, ví dụ: {mismatches[0]}")
+    if failed:
+        print(f"❌ Parity FAILED ({failed} case)")
+        sys.exit(1)
+    print(f"  ✅ {len(parity_sizes) * args.seeds} case giống hệt nhau")
+
+    if args.parity_only:
+        return
+
+    # 2. Benchmark per-station
+    print(f"\n⏱️  Benchmark (1 đài, {args.tails} giải/kỳ, best of {args.repeat})")
+    print(f"  {'kỳ':>7} | {'loop gốc':>12} | {'bitmap':>10} | {'speedup':>8}")
+    for n in args.sizes:
+        history = make_history(n, args.tails, seed=0)
+        new_t = time_call(lambda: build_features_for_day(TARGET_DATE, history), args.repeat)
+        # Bản loop là O(n²) — chỉ đo 1 lần ở history dài
+        old_repeat = args.repeat if n <= 1000 else 1
+        old_t = time_call(lambda: _build_features_for_day_loop(TARGET_DATE, history), old_repeat)
+        print(f"  {n:>7} | {old_t * 1000:>10.1f}ms | {new_t * 1000:>8.2f}ms | {old_t / new_t:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+bench_parsers.py
+So sánh parser lxml (fast_parser) với parser BeautifulSoup gốc của các crawler:
+  1. Parity: prize dict phải giống hệt nhau (so sánh cả repr → đúng thứ tự key, kiểu dữ liệu)
+  2. Benchmark: thời gian parse trung bình mỗi trang cho từng backend
+
+Nguồn trang:
+  - fixtures trong repo (src/crawler/fixtures/minhngoc): trang thật tải từ Minh Ngọc bằng --save-fixtures
+    (ngày thường, ngày nghỉ Tết, ngày 4 đài, trang XSMB kiểu cũ) — luôn được kiểm tra; tên file
+    <loại>_<YYYY-MM-DD>[_holiday].html, nguồn (URL, thời điểm tải, sha256) ghi trong MANIFEST.json.
+    Chỉ file khớp manifest mới được dùng; thiếu trang nào trong FIXTURE_PAGES → exit 1
+  - HTML cache của crawler (data/html_cache, tạo bởi backfill / crawl_xsmb / crawl_xsmn) nếu có
+  - hoặc trang giả lập (--synthetic N) theo cấu trúc bảng Minh Ngọc, không cần network
+
+Fixture *_holiday phải parse ra rỗng và được nhận diện là ngày nghỉ (is_holiday_page),
+các fixture khác phải parse ra kết quả.
+
+Usage:
+  python src/scripts/bench_parsers.py                       # fixtures + trang trong data/html_cache
+  python src/scripts/bench_parsers.py --synthetic 50        # thêm 50 trang giả lập mỗi loại
+  python src/scripts/bench_parsers.py --skip-fixtures --synthetic 50   # khi chưa có fixtures trang thật
+  python src/scripts/bench_parsers.py --cache-dir /tmp/html --limit 200 --repeat 5
+  python src/scripts/bench_parsers.py --save-fixtures       # tải lại trang thật cho FIXTURE_PAGES (cần network)
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import numpy as np
+
+from src.crawler.fast_parser import LXML_AVAILABLE
+from src.crawler.page_cache import DEFAULT_CACHE_DIR, PageCache
+from src.crawler.xsmb_crawler import XSMBCrawler
+from src.crawler.xsmb_minhngoc_crawler import XSMBMinhNgocCrawler
+from src.crawler.xsmn_crawler import XSMNCrawler
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "crawler", "fixtures", "minhngoc")
+FIXTURE_MANIFEST = "MANIFEST.json"
+_FIXTURE_NAME = re.compile(r"^(xsmb_legacy|xsmb|xsmn)_(\d{4}-\d{2}-\d{2})(?:_(\w+))?\.html$")
+
+# Trang dùng làm fixture: (loại, ngày, ghi chú) — --save-fixtures tải lại đúng các trang này
+FIXTURE_PAGES = [
+    ("xsmb", date(2024, 1, 1), None),          # thứ Hai
+    ("xsmb", date(2024, 1, 5), None),          # thứ Sáu
+    ("xsmb", date(2024, 2, 10), "holiday"),    # mùng 1 Tết Giáp Thìn
+    ("xsmn", date(2024, 1, 1), None),          # 3 đài
+    ("xsmn", date(2024, 1, 6), None),          # thứ Bảy: 4 đài
+    ("xsmn", date(2024, 1, 7), None),          # Chủ Nhật (Đà Lạt)
+    ("xsmn", date(2024, 2, 10), "holiday"),
+    ("xsmb_legacy", date(2024, 1, 18), None),
+]
+
+# ==================== TRANG GIẢ LẬP ====================
+
+_FILLER = "".join(
+    f'<div class="box"><ul>{"".join(f"<li><a href=/kq/{i}-{j}.html>Kết quả xổ số {i}-{j}</a></li>" for j in range(20))}</ul>'
+    f'<table class="thongke"><tr><td>Lô tô</td><td>{i:02d}</td></tr></table></div>\n'
+    for i in range(40)
+)
+
+
+def _nums(rng, count: int, digits: int) -> list:
+    return [str(int(x)).zfill(digits) for x in rng.integers(0, 10 ** digits, count)]
+
+
+def _divs(values: list) -> str:
+    return "".join(f"<div>{v}</div>\n" for v in values)
+
+
+def _page(body: str) -> bytes:
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Minh Ngọc</title>'
+        '<script>var tpl = "<td class=\'giaidb\'>00000</td>";</script></head>'
+        f'<body><!-- header -->{_FILLER}{body}{_FILLER}</body></html>'
+    ).encode("utf-8")
+
+
+def make_xsmb_page(d: date, rng) -> bytes:
+    """Trang tra cứu mien=2 (bảng bkqmienbac)."""
+    rows = [
+        ('Giải ĐB', 'giaidb', _nums(rng, 1, 5)),
+        ('Giải nhất', 'giai1', _nums(rng, 1, 5)),
+        ('Giải nhì', 'giai2', _nums(rng, 2, 5)),
+        ('Giải ba', 'giai3', _nums(rng, 6, 5)),
+        ('Giải tư', 'giai4', _nums(rng, 4, 4)),
+        ('Giải năm', 'giai5', _nums(rng, 6, 4)),
+        ('Giải sáu', 'giai6', _nums(rng, 3, 3)),
+        ('Giải bảy', 'giai7', _nums(rng, 4, 2)),
+    ]
+    trs = "".join(
+        f'<tr>\n  <td class="txt-giai">{label}</td>\n  <td class="{cls} highlight">{_divs(vals)}</td>\n</tr>\n'
+        for label, cls, vals in rows
+    )
+    return _page(
+        f'<table class="bkqmienbac" width="100%">\n<tr><td class="ngay" colspan="2">'
+        f'Thứ {d.weekday() + 2} ngày <a href="#">{d:%d/%m/%Y}</a>&nbsp;</td></tr>\n{trs}</table>'
+    )
+
+
+def make_xsmb_holiday_page(d: date) -> bytes:
+    return _page(f"<div class='thongbao'>Miền Bắc nghỉ Tết Nguyên Đán ngày {d:%d/%m/%Y}</div>")
+
+
+def make_xsmn_page(d: date, rng) -> bytes:
+    """Trang tra cứu mien=1: bảng bkqmiennam, mỗi đài là 1 cột (table rightcl) lồng bên trong."""
+    prizes = [('giai8', 1, 2), ('giai7', 1, 3), ('giai6', 3, 4), ('giai5', 1, 4), ('giai4', 7, 5),
+              ('giai3', 2, 5), ('giai2', 1, 5), ('giai1', 1, 5), ('giaidb', 1, 6)]
+    labels = ['Giải tám', 'Giải bảy', 'Giải sáu', 'Giải năm', 'Giải tư', 'Giải ba', 'Giải nhì', 'Giải nhất', 'Giải ĐB']
+    left = "".join(f'<tr><td class="{cls}">{label}</td></tr>' for (cls, _, _), label in zip(prizes, labels))
+    cols = [f'<td><table class="leftcl"><tr><td class="thu">Thứ</td></tr>{left}</table></td>']
+    for slug in XSMNCrawler.PROVINCE_SCHEDULE[d.weekday()]:
+        name = XSMNCrawler.PROVINCE_MAP[slug]
+        cells = "".join(
+            f'<tr><td class="{cls}">{_divs(_nums(rng, count, digits))}</td></tr>\n' for cls, count, digits in prizes
+        )
+        cols.append(
+            f'<td><table class="rightcl"><tr><td class="tinh"><a href="/{slug}.html">{name}</a></td></tr>'
+            f'<tr><td class="matinh">XS{slug.upper()}</td></tr>\n{cells}</table></td>\n'
+        )
+    return _page(f'<table class="bkqmiennam" width="100%"><tr>{"".join(cols)}</tr></table>')
+
+
+def make_xsmb_legacy_page(d: date, rng) -> bytes:
+    """Trang ket-qua-xo-so/mien-bac (XSMBMinhNgocCrawler): nhận diện bảng theo text."""
+    rows = [('Đặc biệt', 5), ('Giải nhất', 5), ('Giải nhì', 10), ('Giải ba', 30),
+            ('Giải tư', 16), ('Giải năm', 24), ('Giải sáu', 9), ('Giải bảy', 8)]
+    trs = "".join(
+        f'<tr><th>{label}</th><td>{" - ".join(_nums(rng, n // 5 if n % 5 == 0 else n // 4, 5 if n % 5 == 0 else 4))}</td></tr>'
+        for label, n in rows
+    )
+    older = (d - timedelta(days=1)).strftime('%d/%m/%Y')
+    return _page(
+        f'<table class="box"><tr><td>Ngày: {older} Giải ĐB 00000</td></tr></table>'
+        f'<table class="kq"><caption>XSMB Ngày: {d:%d/%m/%Y}</caption>{trs}</table>'
+    )
+
+
+def synthetic_pages(n: int) -> list:
+    """[(kind, date, html)] giả lập, seed cố định."""
+    rng = np.random.default_rng(0)
+    start = date(2024, 1, 1)
+    pages = []
+    for i in range(n):
+        d = start + timedelta(days=i)
+        pages.append(("xsmb", d, make_xsmb_page(d, rng)))
+        pages.append(("xsmn", d, make_xsmn_page(d, rng)))
+        pages.append(("xsmb_legacy", d, make_xsmb_legacy_page(d, rng)))
+    pages.append(("xsmb", start, make_xsmb_holiday_page(start)))
+    return pages
+
+
+def fixture_name(kind: str, d: date, note) -> str:
+    return f"{kind}_{d.isoformat()}" + (f"_{note}" if note else "") + ".html"
+
+
+def load_manifest(fixture_dir: str = FIXTURE_DIR) -> dict:
+    path = os.path.join(fixture_dir, FIXTURE_MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def fixture_pages(fixture_dir: str = FIXTURE_DIR) -> list:
+    """
+    [(kind, date, html, note)] từ thư mục fixtures (note = 'holiday' | None).
+    Chỉ lấy file có trong MANIFEST.json với sha256 khớp (trang đã tải bằng --save-fixtures).
+    """
+    manifest = load_manifest(fixture_dir)
+    pages = []
+    for name in sorted(os.listdir(fixture_dir)) if os.path.isdir(fixture_dir) else []:
+        m = _FIXTURE_NAME.match(name)
+        if m is None:
+            continue
+        with open(os.path.join(fixture_dir, name), "rb") as f:
+            html = f.read()
+        entry = manifest.get(name)
+        if entry is None or entry.get("sha256") != hashlib.sha256(html).hexdigest():
+            print(f"  ⚠️  Bỏ qua {name}: không có trong {FIXTURE_MANIFEST} hoặc sha256 không khớp (không phải trang đã tải)")
+            continue
+        pages.append((m.group(1), date.fromisoformat(m.group(2)), html, m.group(3)))
+    return pages
+
+
+def save_fixtures(fixture_dir: str = FIXTURE_DIR) -> int:
+    """
+    Tải trang thật của FIXTURE_PAGES từ Minh Ngọc (bỏ qua cache), ghi đè fixtures
+    và ghi nguồn vào MANIFEST.json. Trả về số trang tải lỗi.
+    """
+    os.makedirs(fixture_dir, exist_ok=True)
+    crawlers = {"xsmb": XSMBCrawler(page_cache=None), "xsmn": XSMNCrawler(page_cache=None)}
+    legacy = XSMBMinhNgocCrawler()
+    manifest = load_manifest(fixture_dir)
+    failed = 0
+    for kind, d, note in FIXTURE_PAGES:
+        name = fixture_name(kind, d, note)
+        try:
+            if kind == "xsmb_legacy":
+                url = legacy.base_url.format(date=d.strftime('%d-%m-%Y'))
+                response = legacy.transport.get(url, headers=legacy.headers)
+                html = response.content if response.status_code == 200 else None
+            else:
+                url = crawlers[kind].build_url(d)
+                html = crawlers[kind].fetch_page(d, read_cache=False)
+        except Exception as e:
+            failed += 1
+            print(f"  ❌ {name}: {e}")
+            continue
+        if html is None:
+            failed += 1
+            print(f"  ❌ {name}: không tải được")
+            continue
+        with open(os.path.join(fixture_dir, name), "wb") as f:
+            f.write(html)
+        manifest[name] = {
+            "url":        url,
+            "fetched_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
+            "bytes":      len(html),
+            "sha256":     hashlib.sha256(html).hexdigest(),
+        }
+        print(f"  ✅ {name} ({len(html) // 1024} KB)")
+    if failed < len(FIXTURE_PAGES):
+        with open(os.path.join(fixture_dir, FIXTURE_MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(manifest.items())), f, indent=2, ensure_ascii=False)
+            f.write("\n")
+    return failed
+
+
+def check_fixtures(pages: list) -> int:
+    """Fixture *_holiday: không có kết quả + is_holiday_page; fixture khác: có kết quả. Trả về số trang sai."""
+    detectors = {"xsmb": XSMBCrawler(parser="bs4"), "xsmn": XSMNCrawler(parser="bs4")}
+    parsers = make_parsers("bs4")
+    failed = 0
+    for kind, d, html, note in pages:
+        result = quiet(parsers[kind], html, d)
+        found = bool(result[0] if kind == "xsmn" else result)
+        if note == "holiday":
+            ok = not found and quiet(detectors[kind].is_holiday_page, html)
+        else:
+            ok = found
+        if not ok:
+            failed += 1
+            print(f"  ❌ fixture {kind} {d}{' (holiday)' if note else ''}: parse ra {result!r}")
+    return failed
+
+
+def cached_pages(cache_dir: str, limit: int) -> list:
+    """[(kind, date, html)] từ HTML cache của crawler."""
+    cache = PageCache(cache_dir, replay=True)
+    pages = []
+    for kind, mien in (("xsmb", XSMBCrawler.MIEN), ("xsmn", XSMNCrawler.MIEN)):
+        index_dir = os.path.join(cache_dir, "index", f"mien{mien}")
+        if not os.path.isdir(index_dir):
+            continue
+        for name in sorted(os.listdir(index_dir))[-limit:]:
+            d = date.fromisoformat(name[:-len(".json")])
+            html = cache.get(mien, d)
+            if html is not None:
+                pages.append((kind, d, html))
+    return pages
+
+
+# ==================== PARITY + BENCHMARK ====================
+
+def make_parsers(backend: str) -> dict:
+    """kind → hàm parse(html, date) cho 1 backend."""
+    xsmb = XSMBCrawler(parser=backend)
+    xsmn = XSMNCrawler(parser=backend)
+    legacy = XSMBMinhNgocCrawler(parser=backend)
+
+    def parse_xsmn(html, d):
+        batch = xsmn.parse_batch_results(html, d)
+        single = [xsmn.parse_province_results(html, d, slug) for slug in xsmn.get_provinces_for_date(d)]
+        return batch, single
+
+    return {"xsmb": xsmb.parse_results, "xsmn": parse_xsmn, "xsmb_legacy": legacy.parse_results}
+
+
+def quiet(fn, *args):
+    """Gọi parser nhưng nuốt log print."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity + benchmark cho parser lxml vs BeautifulSoup")
+    parser.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR,
+                        help=f"Thư mục HTML cache (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--limit", type=int, default=500, help="Số trang tối đa mỗi miền lấy từ cache")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Thêm N trang giả lập mỗi loại (dùng khi chưa có cache)")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp cho mỗi phép đo")
+    parser.add_argument("--fixtures", type=str, default=FIXTURE_DIR,
+                        help=f"Thư mục fixtures (default: {FIXTURE_DIR})")
+    parser.add_argument("--skip-fixtures", action="store_true",
+                        help="Không bắt buộc fixtures trang thật (chỉ benchmark cache / --synthetic)")
+    parser.add_argument("--save-fixtures", action="store_true",
+                        help="Tải lại trang thật cho FIXTURE_PAGES vào thư mục fixtures rồi thoát")
+    args = parser.parse_args()
+
+    if args.save_fixtures:
+        print(f"💾 Tải {len(FIXTURE_PAGES)} trang fixture → {args.fixtures}")
+        sys.exit(1 if save_fixtures(args.fixtures) else 0)
+
+    if not LXML_AVAILABLE:
+        print("❌ Chưa cài lxml")
+        sys.exit(1)
+
+    fixtures = [] if args.skip_fixtures else fixture_pages(args.fixtures)
+    have = {fixture_name(kind, d, note) for kind, d, _, note in fixtures}
+    missing = [fixture_name(*page) for page in FIXTURE_PAGES if fixture_name(*page) not in have]
+    if missing and not args.skip_fixtures:
+        print(f"❌ Thiếu {len(missing)}/{len(FIXTURE_PAGES)} fixture trang thật trong {args.fixtures}: {', '.join(missing)}")
+        print("   Chạy `python src/scripts/bench_parsers.py --save-fixtures` (cần network) rồi commit thư mục fixtures")
+        sys.exit(1)
+    if fixtures:
+        print(f"🧷 {len(fixtures)} fixtures trong {args.fixtures}")
+        bad = check_fixtures(fixtures)
+        if bad:
+            print(f"❌ {bad} fixture parse sai kỳ vọng")
+            sys.exit(1)
+    pages = [(kind, d, html) for kind, d, html, _ in fixtures]
+    pages += cached_pages(args.cache_dir, args.limit)
+    if args.synthetic:
+        pages += synthetic_pages(args.synthetic)
+    if not pages:
+        print(f"⚠️ Không có trang nào trong {args.fixtures} / {args.cache_dir} — chạy backfill trước hoặc dùng --synthetic N")
+        sys.exit(1)
+
+    by_kind = {}
+    for kind, d, html in pages:
+        by_kind.setdefault(kind, []).append((d, html))
+    print(f"📄 {len(pages)} trang: " + ", ".join(f"{k}={len(v)}" for k, v in by_kind.items()))
+
+    old, new = make_parsers("bs4"), make_parsers("lxml")
+
+    # 1. Parity
+    print("🔍 Parity check: lxml vs BeautifulSoup")
+    failed = 0
+    for kind, items in by_kind.items():
+        for d, html in items:
+            expected = quiet(old[kind], html, d)
+            actual = quiet(new[kind], html, d)
+            if repr(expected) != repr(actual):
+                failed += 1
+                print(f"  ❌ {kind} {d}:\n     bs4  = {expected!r}\n     lxml = {actual!r}")
+    if failed:
+        print(f"❌ Parity FAILED ({failed} trang)")
+        sys.exit(1)
+    print(f"  ✅ {len(pages)} trang cho kết quả giống hệt nhau")
+
+    # 2. Benchmark
+    print(f"\n⏱️  Benchmark (ms/trang, best of {args.repeat})")
+    print(f"  {'loại':>12} | {'trang':>6} | {'bs4':>9} | {'lxml':>9} | {'speedup':>8}")
+    for kind, items in by_kind.items():
+        timings = {}
+        for backend, parsers in (("bs4", old), ("lxml", new)):
+            best = float("inf")
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                for d, html in items:
+                    quiet(parsers[kind], html, d)
+                best = min(best, time.perf_counter() - t0)
+            timings[backend] = best / len(items) * 1000
+        print(f"  {kind:>12} | {len(items):>6} | {timings['bs4']:>7.2f}ms | {timings['lxml']:>7.2f}ms | "
+              f"{timings['bs4'] / timings['lxml']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
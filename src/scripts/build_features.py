@@ -1,6 +1,7 @@
 """
 build_features.py
-Tính pair_features cho 100 cặp (00–99) từ dữ liệu tails_2d.
+Tính pair_features cho 100 cặp (00–99) từ dữ liệu tails_2d
+(hoặc draw_tails khi TAILS_LAYOUT=bitmap — 1 row / kỳ thay vì ~27 row / kỳ).
 Chạy: sau build_tails.py trong pipeline nightly (01-daily-crawl.yml)
       hoặc thủ công để backfill.
 
@@ -8,6 +9,8 @@ Usage:
   python src/scripts/build_features.py             # ngày hôm nay
   python src/scripts/build_features.py --backfill  # toàn bộ lịch sử
   python src/scripts/build_features.py --date 2026-02-19
+  python src/scripts/build_features.py --incremental            # dùng state đã lưu (data/feature_state)
+  python src/scripts/build_features.py --incremental --verify-state
 """
 
 import argparse
@@ -16,14 +19,21 @@ import os
 from datetime import date, timedelta
 from typing import List
 
+import pandas as pd
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.database.supabase_client import LotteryDB
 from src.features.feature_builder import (
-    _extract_history,
+    COMPACT_TABLE,
     build_features_for_day,
+    build_features_from_bitmap,
+    encode_compact,
+    history_to_bitmap,
+    pair_features_layout,
 )
-from src.features.tail_extractor import build_tail_set
+from src.features.rolling_state import DEFAULT_STATE_DIR, PairRollingState
+from src.features.tail_set import TailSet
+from src.utils.draw_calendar import DrawCalendar
 
 
 # Danh sách (region, province) cần tính feature
@@ -53,6 +63,45 @@ STATIONS = [
 ]
 
 HISTORY_DAYS = 120  # Lấy 120 kỳ lịch sử để tính features
+UPSERT_CHUNK = 5000  # Số feature rows mỗi request upsert khi backfill (= 50 ngày)
+
+
+def fetch_history(db: LotteryDB, region: str, province: str | None, target_date: date) -> pd.DataFrame:
+    """
+    Lấy đúng HISTORY_DAYS kỳ gần nhất TRƯỚC target_date (DataFrame của _extract_history, tails_2d hoặc draw_tails).
+    tail_history(limit=) không bị giới hạn 1000 rows/request của Supabase cắt cụt cửa sổ (~27 tails / kỳ).
+    """
+    return db.tail_history(region, province, before=target_date, limit=HISTORY_DAYS)
+
+
+def fetch_tail_set(db: LotteryDB, region: str, province: str | None, target_date: date) -> TailSet | None:
+    """TAIL_SET của target_date (để tính label hit). None nếu chưa có KQXS."""
+    history = db.tail_history(region, province, on=target_date)
+    return history["tail_set"].iloc[-1] if len(history) else None
+
+
+def compact_payload(region: str, province: str | None, feature_rows: List[dict]) -> List[dict]:
+    """Feature rows (bội 100, mỗi ngày 100 rows liền nhau) → rows pair_features_compact."""
+    return [encode_compact(feature_rows[i:i + 100], region, province) for i in range(0, len(feature_rows), 100)]
+
+
+def upsert_feature_rows(db: LotteryDB, region: str, province: str | None, feature_rows: List[dict]):
+    """Thêm region/province vào mỗi row rồi upsert vào pair_features (hoặc pair_features_compact)."""
+    if pair_features_layout() == "compact":
+        db.supabase.table(COMPACT_TABLE).upsert(
+            compact_payload(region, province, feature_rows),
+            on_conflict="feature_date,region,province"
+        ).execute()
+        return
+
+    for row in feature_rows:
+        row["region"] = region
+        row["province"] = province
+
+    db.supabase.table("pair_features").upsert(
+        feature_rows,
+        on_conflict="feature_date,region,province,pair"
+    ).execute()
 
 
 def build_features_for_station(
@@ -68,53 +117,21 @@ def build_features_for_station(
     label = f"{region}/{province or 'all'}"
 
     # Lấy lịch sử tails_2d (tất cả ngày TRƯỚC target_date)
-    query = db.supabase.table("tails_2d")\
-        .select("draw_date,tail_2d")\
-        .eq("region", region)\
-        .lt("draw_date", target_date.isoformat())\
-        .order("draw_date", desc=True)\
-        .limit(HISTORY_DAYS * 30)  # 30 tail/kỳ trung bình
-
-    if province:
-        query = query.eq("province", province)
-    else:
-        query = query.is_("province", "null")
-
-    history_rows = query.execute().data
-    history_df = _extract_history(history_rows, max_rows=HISTORY_DAYS)
+    history_df = fetch_history(db, region, province, target_date)
 
     if len(history_df) < 10:
         print(f"  ⚠️  {label}: không đủ lịch sử ({len(history_df)} kỳ) cho {target_date}")
         return 0
 
     # Lấy TAIL_SET của target_date (để tính label hit)
-    tail_query = db.supabase.table("tails_2d")\
-        .select("tail_2d")\
-        .eq("region", region)\
-        .eq("draw_date", target_date.isoformat())
-
-    if province:
-        tail_query = tail_query.eq("province", province)
-    else:
-        tail_query = tail_query.is_("province", "null")
-
-    tail_rows = tail_query.execute().data
-    target_tail_set = frozenset(r["tail_2d"] for r in tail_rows) if tail_rows else None
+    target_tail_set = fetch_tail_set(db, region, province, target_date)
 
     # Tính 100 feature rows
     feature_rows = build_features_for_day(target_date, history_df, target_tail_set)
 
-    # Thêm region/province vào mỗi row
-    for row in feature_rows:
-        row["region"] = region
-        row["province"] = province
-
     # Upsert vào pair_features
     try:
-        db.supabase.table("pair_features").upsert(
-            feature_rows,
-            on_conflict="feature_date,region,province,pair"
-        ).execute()
+        upsert_feature_rows(db, region, province, feature_rows)
         print(f"  ✅ {label} | {target_date} | 100 pairs | history={len(history_df)}kỳ | tail_set={len(target_tail_set) if target_tail_set else 0}")
         return 100
     except Exception as e:
@@ -122,63 +139,189 @@ def build_features_for_station(
         return 0
 
 
-def get_available_dates(db: LotteryDB, region: str, province: str | None) -> List[str]:
-    """Lấy danh sách ngày có tails_2d cho 1 station (có pagination)."""
-    all_dates = set()
-    offset = 0
-    while True:
-        query = db.supabase.table("tails_2d")\
-            .select("draw_date")\
-            .eq("region", region)\
-            .order("draw_date")\
-            .range(offset, offset + 999)
-
-        if province:
-            query = query.eq("province", province)
+def build_features_incremental(
+    db: LotteryDB,
+    region: str,
+    province: str | None,
+    target_date: date,
+    state_dir: str = DEFAULT_STATE_DIR,
+    verify: bool = False,
+) -> int:
+    """
+    Như build_features_for_station nhưng dùng PairRollingState đã lưu:
+    chỉ tải các kỳ mới từ sau state.last_date, tính features từ state rồi
+    áp dụng kỳ target_date vào state và lưu lại.
+    Nếu chưa có state (hoặc state đã chứa target_date) → dựng lại từ lịch sử.
+    Với verify=True: so state với full recompute, nếu drift thì dựng lại state.
+    """
+    label = f"{region}/{province or 'all'}"
+    state = PairRollingState.load(region, province, state_dir)
+
+    if state is not None and state.last_date is not None and state.last_date < target_date.isoformat():
+        # Catch-up: chỉ tải các kỳ mới (last_date, target_date)
+        new_draws = db.tail_history(region, province, after=state.last_date, before=target_date, limit=HISTORY_DAYS)
+        for draw_date, tail_set in zip(new_draws["draw_date"], new_draws["tail_set"]):
+            state.apply_draw(draw_date.date(), tail_set)
+    else:
+        if state is not None:
+            print(f"  ♻️  {label}: state (last={state.last_date}) không dùng được cho {target_date}, dựng lại")
+        state = PairRollingState.from_history(
+            region, province, fetch_history(db, region, province, target_date), window=HISTORY_DAYS
+        )
+
+    if verify:
+        drift = state.verify(fetch_history(db, region, province, target_date))
+        if drift:
+            print(f"  ⚠️  {label}: state drift — {'; '.join(drift)} → dựng lại từ lịch sử")
+            state = PairRollingState.from_history(
+                region, province, fetch_history(db, region, province, target_date), window=HISTORY_DAYS
+            )
         else:
-            query = query.is_("province", "null")
+            print(f"  🔎 {label}: state khớp full recompute ({len(state)} kỳ)")
+
+    if len(state) < 10:
+        print(f"  ⚠️  {label}: không đủ lịch sử ({len(state)} kỳ) cho {target_date}")
+        return 0
+
+    target_tail_set = fetch_tail_set(db, region, province, target_date)
+    feature_rows = state.features(target_date, target_tail_set)
+
+    try:
+        upsert_feature_rows(db, region, province, feature_rows)
+    except Exception as e:
+        print(f"  ❌ {label} | {target_date}: {e}")
+        return 0
+
+    # Chỉ đưa target_date vào state khi đã có KQXS (tránh ghi nhận kỳ rỗng)
+    if target_tail_set is not None:
+        state.apply_draw(target_date, target_tail_set)
+    state.save(state_dir)
+
+    print(f"  ✅ {label} | {target_date} | 100 pairs | state={len(state)}kỳ (incremental) | tail_set={len(target_tail_set) if target_tail_set else 0}")
+    return 100
+
 
-        batch = query.execute().data
-        if not batch:
-            break
-        for row in batch:
-            all_dates.add(row["draw_date"])
-        if len(batch) < 1000:
-            break
-        offset += 1000
+def get_available_dates(db: LotteryDB, region: str, province: str | None) -> List[str]:
+    """Lấy danh sách ngày có tails_2d cho 1 station (keyset pagination)."""
+    all_dates = set()
+    for page in db.stream(
+        "tails_2d",
+        columns="draw_date",
+        filters={"region": region, "province": province},
+        key=("draw_date", "id"),
+        output="pages",
+    ):
+        all_dates.update(row["draw_date"] for row in page)
 
     return sorted(all_dates)
 
 
+def backfill_station(db: LotteryDB, region: str, province: str | None) -> int:
+    """
+    Backfill pair_features cho toàn bộ lịch sử của 1 station trong 1 lượt:
+    tải tails của station 1 lần, dựng bitmap, trượt cửa sổ HISTORY_DAYS kỳ qua từng ngày
+    và upsert theo chunk UPSERT_CHUNK rows.
+    Kết quả giống hệt gọi build_features_for_station cho từng ngày.
+    """
+    label = f"{region}/{province or 'all'}"
+    history = db.tail_history(region, province)
+    if history.empty:
+        print(f"\n📊 {label}: không có tails")
+        return 0
+
+    bitmap = history_to_bitmap(history)
+    draw_dates = history["draw_date"].dt.date.tolist()
+    tail_sets = history["tail_set"].tolist()
+    n_tails = sum(ts.total for ts in tail_sets)
+    print(f"\n📊 {label}: {len(draw_dates)} ngày cần xử lý ({n_tails} tails)")
+
+    total = 0
+    pending = []
+    compact = pair_features_layout() == "compact"
+
+    def flush():
+        nonlocal total, pending
+        if not pending:
+            return
+        if compact:
+            outcomes = db.upsert_many(
+                COMPACT_TABLE, compact_payload(region, province, pending),
+                on_conflict="feature_date,region,province",
+                chunk_size=UPSERT_CHUNK // 100,
+            )
+            saved = 100 * sum(1 for o in outcomes if o["ok"])
+        else:
+            outcomes = db.upsert_many(
+                "pair_features", pending,
+                on_conflict="feature_date,region,province,pair",
+                chunk_size=UPSERT_CHUNK,
+            )
+            saved = sum(1 for o in outcomes if o["ok"])
+        total += saved
+        print(f"  ✅ {label} | upsert {saved}/{len(pending)} rows (đến {pending[-1]['feature_date']})")
+        pending = []
+
+    for i, target_date in enumerate(draw_dates):
+        window = bitmap[max(0, i - HISTORY_DAYS):i]
+        if len(window) < 10:
+            continue  # không đủ lịch sử — giống build_features_for_station
+
+        feature_rows = build_features_from_bitmap(target_date, window, tail_sets[i])
+        for row in feature_rows:
+            row["region"] = region
+            row["province"] = province
+        pending.extend(feature_rows)
+
+        if len(pending) >= UPSERT_CHUNK:
+            flush()
+
+    flush()
+    return total
+
+
 def main():
     parser = argparse.ArgumentParser(description="Build pair_features from tails_2d")
     parser.add_argument("--backfill", action="store_true", help="Backfill toàn bộ lịch sử")
     parser.add_argument("--date", type=str, help="Ngày cụ thể (YYYY-MM-DD)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Dùng PairRollingState đã lưu thay vì tính lại từ 120 kỳ")
+    parser.add_argument("--verify-state", action="store_true",
+                        help="(với --incremental) So state với full recompute để phát hiện drift")
+    parser.add_argument("--state-dir", type=str, default=DEFAULT_STATE_DIR,
+                        help=f"Thư mục lưu state (mặc định: {DEFAULT_STATE_DIR})")
     args = parser.parse_args()
 
+    def build_station(region, province, target):
+        if args.incremental:
+            return build_features_incremental(db, region, province, target, args.state_dir, args.verify_state)
+        return build_features_for_station(db, region, province, target)
+
+    def drawing_stations(target):
+        # Chỉ các đài quay ngày target (lịch tuần + ngày nghỉ + kỳ đã crawl) — đài khác không có label/dự đoán
+        calendar = DrawCalendar.from_db(db, since=target, until=target)
+        stations = [s for s in STATIONS if calendar.draws_on(s, target)]
+        print(f"  🗓️  {len(stations)}/{len(STATIONS)} đài quay ngày {target}")
+        return stations
+
     db = LotteryDB()
     total = 0
 
     if args.date:
         target = date.fromisoformat(args.date)
         print(f"📅 Building features for {target}...")
-        for region, province in STATIONS:
-            total += build_features_for_station(db, region, province, target)
+        for region, province in drawing_stations(target):
+            total += build_station(region, province, target)
 
     elif args.backfill:
-        print("🔄 Backfilling all pair_features...")
+        print("🔄 Backfilling all pair_features (single-pass sliding window)...")
         for region, province in STATIONS:
-            label = f"{region}/{province or 'all'}"
-            available_dates = get_available_dates(db, region, province)
-            print(f"\n📊 {label}: {len(available_dates)} ngày cần xử lý")
-            for d_str in available_dates:
-                total += build_features_for_station(db, region, province, date.fromisoformat(d_str))
+            total += backfill_station(db, region, province)
 
     else:
         target = date.today()
         print(f"🌙 Nightly build features for {target}...")
-        for region, province in STATIONS:
-            total += build_features_for_station(db, region, province, target)
+        for region, province in drawing_stations(target):
+            total += build_station(region, province, target)
 
     print(f"\n✅ Done. Total feature rows inserted/updated: {total}")
 
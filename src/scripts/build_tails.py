@@ -1,37 +1,114 @@
 """
 build_tails.py
-Trích xuất 2 số cuối từ lottery_draws và lưu vào bảng tails_2d.
+Trích xuất 2 số cuối từ lottery_draws và lưu vào bảng tails_2d
+(hoặc draw_tails khi TAILS_LAYOUT=bitmap: 1 row / kỳ = bitmask 100 cặp + số lần xuất hiện).
 Chạy: nightly sau crawl (bước cuối trong 01-daily-crawl.yml)
       hoặc thủ công để backfill toàn bộ lịch sử.
 
 Usage:
-  python src/scripts/build_tails.py            # xử lý ngày hôm nay (nightly)
-  python src/scripts/build_tails.py --backfill  # toàn bộ lịch sử
+  python src/scripts/build_tails.py            # sync tăng dần: mọi kỳ mới sau checkpoint (nightly)
+  python src/scripts/build_tails.py --backfill  # quét lại toàn bộ kỳ chưa có tails (bỏ qua watermark)
   python src/scripts/build_tails.py --date 2026-02-19
+
+Kỳ chưa xử lý được tìm ngay trên server qua view anti-join `pending_tail_draws`
+(database/migrations/03_create_sync_checkpoints.sql; `pending_draw_tails` của migration 05
+cho draw_tails), đọc theo trang keyset theo id.
+Nightly chỉ lấy id > watermark trong `sync_checkpoints` → chi phí tỉ lệ với số kỳ mới,
+không phụ thuộc kích thước bảng. Tails được trích hàng loạt (extract_tails_batch) rồi
+bulk insert theo chunk. Chưa chạy migration thì quay về diff draw_id phía client.
+Mỗi bảng đích có checkpoint riêng → chuyển layout rồi --backfill để dựng draw_tails từ lottery_draws.
 """
 
 import argparse
 import sys
 import os
+import time
 from datetime import date, timedelta
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.database.supabase_client import LotteryDB
-from src.features.tail_extractor import extract_tails_from_draw
+from src.features.tail_extractor import (
+    DRAW_TAILS_TABLE,
+    draw_tail_rows,
+    extract_tails_batch,
+    tail_rows,
+    tails_layout,
+)
+
+INSERT_CHUNK = 1000
+# Bảng đích theo TAILS_LAYOUT: (bảng, view anti-join, tên checkpoint)
+SYNC_TARGETS = {
+    "rows":   ("tails_2d", "pending_tail_draws", "tails_2d"),
+    "bitmap": (DRAW_TAILS_TABLE, "pending_draw_tails", DRAW_TAILS_TABLE),
+}
 
 
-def get_existing_draw_ids(db: LotteryDB, draw_ids: list) -> set:
-    """Lấy các draw_id đã có trong tails_2d để skip."""
+def get_existing_draw_ids(db: LotteryDB, draw_ids: list, table: str = "tails_2d") -> set:
+    """Lấy các draw_id đã có trong tails_2d (hoặc draw_tails) để skip."""
     if not draw_ids:
         return set()
-    result = db.supabase.table("tails_2d")\
+    result = db.supabase.table(table)\
         .select("draw_id")\
         .in_("draw_id", draw_ids)\
         .execute()
     return {r["draw_id"] for r in result.data}
 
 
+def insert_tails(db: LotteryDB, columns: dict, chunk_size: int = INSERT_CHUNK) -> tuple:
+    """
+    Bulk insert output của extract_tails_batch theo chunk (chỉ cắt ở ranh giới kỳ); báo lỗi theo draw.
+    Kỳ có row lỗi bị coi là lỗi trọn vẹn: các tails đã ghi được của kỳ đó bị xóa, để
+    pending_tail_draws (anti-join "đã có tail nào chưa") vẫn thấy kỳ chưa xử lý và lần sau ghi lại.
+
+    Returns:
+        (số tails đã ghi, set draw_id bị lỗi)
+    """
+    inserted = 0
+    failed_draws = set()
+    for chunk in tail_rows(columns, chunk_size):
+        outcomes = db.upsert_many("tails_2d", chunk, chunk_size=max(chunk_size, len(chunk)))
+        chunk_failed = {}
+        for tail, outcome in zip(chunk, outcomes):
+            if not outcome["ok"]:
+                chunk_failed.setdefault(tail["draw_id"], outcome["error"])
+        partial = {t["draw_id"] for t, o in zip(chunk, outcomes) if o["ok"] and t["draw_id"] in chunk_failed}
+        if partial:
+            try:
+                db.supabase.table("tails_2d").delete().in_("draw_id", sorted(partial)).execute()
+            except Exception as e:
+                print(f"  ⚠️  Không xóa được tails dở dang của {len(partial)} draws: {e}")
+        inserted += sum(1 for t in chunk if t["draw_id"] not in chunk_failed)
+        for draw_id, error in chunk_failed.items():
+            failed_draws.add(draw_id)
+            print(f"  ❌ Draw {draw_id}: {error}")
+    return inserted, failed_draws
+
+
+def insert_draw_tails(db: LotteryDB, columns: dict, chunk_size: int = INSERT_CHUNK) -> tuple:
+    """
+    Như insert_tails nhưng ghi draw_tails: 1 row / kỳ (upsert theo draw_id).
+
+    Returns:
+        (số kỳ đã ghi, set draw_id bị lỗi)
+    """
+    rows = draw_tail_rows(columns)
+    outcomes = db.upsert_many(DRAW_TAILS_TABLE, rows, on_conflict="draw_id", chunk_size=chunk_size)
+    failed_draws = set()
+    for row, outcome in zip(rows, outcomes):
+        if not outcome["ok"]:
+            failed_draws.add(row["draw_id"])
+            print(f"  ❌ Draw {row['draw_id']}: {outcome['error']}")
+    return len(rows) - len(failed_draws), failed_draws
+
+
+def write_tails(db: LotteryDB, columns: dict, layout: str = None) -> tuple:
+    """Ghi output của extract_tails_batch vào bảng của layout (tails_2d | draw_tails)."""
+    if tails_layout(layout) == "bitmap":
+        return insert_draw_tails(db, columns)
+    return insert_tails(db, columns)
+
+
 def build_tails_for_date(db: LotteryDB, target_date: date) -> int:
     """Xử lý tất cả bản ghi lottery_draws cho ngày target_date."""
     draws = db.supabase.table("lottery_draws")\
@@ -42,35 +119,120 @@ def build_tails_for_date(db: LotteryDB, target_date: date) -> int:
     if not draws:
         return 0
 
+    table = SYNC_TARGETS[tails_layout()][0]
     draw_ids = [d["id"] for d in draws]
-    already_done = get_existing_draw_ids(db, draw_ids)
+    already_done = get_existing_draw_ids(db, draw_ids, table)
 
-    inserted = 0
     label = draws[0].get("region", "?")
 
-    for draw in draws:
-        if draw["id"] in already_done:
-            continue  # skip nếu đã có
+    # Gom tails của mọi draw chưa xử lý → 1 bulk insert
+    pending = [d for d in draws if d["id"] not in already_done]
+    inserted, _ = write_tails(db, extract_tails_batch(pending))
+
+    if inserted > 0:
+        print(f"  ✅ {target_date} | {label} | {len(draws)} draws | {inserted} → {table}")
+    return inserted
+
+
+def get_all_done_draw_ids(db: LotteryDB, table: str = "tails_2d") -> set:
+    """Mọi draw_id đã có trong tails_2d / draw_tails (keyset pagination, không bị giới hạn 1000 rows/request)."""
+    done = set()
+    key = ("draw_id",) if table == DRAW_TAILS_TABLE else ("id",)
+    for chunk in db.stream(table, columns="draw_id", key=key, output="numpy"):
+        done.update(chunk["draw_id"].tolist())
+    return done
+
 
-        tails = extract_tails_from_draw(draw)
-        if not tails:
-            continue
+def _pending_view_available(db: LotteryDB, view: str) -> bool:
+    try:
+        db.supabase.table(view).select("id").limit(1).execute()
+        return True
+    except Exception as e:
+        print(f"  ⚠️  Không đọc được view {view} (chưa chạy migration?): {e}")
+        return False
 
+
+def _load_checkpoint(db: LotteryDB, name: str):
+    try:
+        return db.get_sync_checkpoint(name)
+    except Exception as e:
+        print(f"  ⚠️  Không đọc được sync_checkpoints (chưa chạy migration 03?): {e}")
+        return None
+
+
+def _max_draw_id(db: LotteryDB):
+    rows = db.supabase.table("lottery_draws").select("id,draw_date").order("id", desc=True).limit(1).execute().data
+    return (rows[0]["id"], rows[0]["draw_date"]) if rows else (None, None)
+
+
+def _pending_pages(db: LotteryDB, table: str, view: str, watermark, page_size: int):
+    """Trang các kỳ chưa có trong `table` (id tăng dần): anti-join trên server, hoặc diff draw_id phía client."""
+    if _pending_view_available(db, view):
+        where = (lambda q: q.gt("id", watermark)) if watermark is not None else None
+        yield from db.stream(view, columns="*", where=where, key=("id",),
+                             page_size=page_size, output="pages")
+        return
+
+    done_ids = get_all_done_draw_ids(db, table)
+    print(f"  {table} hiện có: {len(done_ids)} draw_ids đã xử lý")
+    where = (lambda q: q.gt("id", watermark)) if watermark is not None else None
+    for page in db.stream("lottery_draws", columns="*", where=where, key=("id",),
+                          page_size=page_size, output="pages"):
+        pending = [d for d in page if d["id"] not in done_ids]
+        if pending:
+            yield pending
+
+
+def sync_tails(db: LotteryDB, full: bool = False, page_size: int = 1000, layout: str = None) -> int:
+    """
+    Dựng tails_2d (hoặc draw_tails theo layout) cho các kỳ chưa xử lý rồi ghi checkpoint.
+
+    Args:
+        full: True = quét mọi kỳ chưa có tails (backfill); False = chỉ id > watermark
+        layout: None → env TAILS_LAYOUT
+    """
+    layout = tails_layout(layout)
+    table, view, checkpoint_name = SYNC_TARGETS[layout]
+    started = time.perf_counter()
+    checkpoint = _load_checkpoint(db, checkpoint_name)
+    watermark = None if full or checkpoint is None else checkpoint.get("last_id")
+    print(f"  {table} | watermark: {'toàn bộ' if watermark is None else f'id > {watermark}'}")
+
+    # Chốt id lớn nhất TRƯỚC khi quét: kỳ được thêm trong lúc chạy có id lớn hơn → lần sau vẫn thấy
+    max_id, max_date = _max_draw_id(db)
+
+    total = processed = 0
+    first_failed = None
+    last_ok = (watermark, checkpoint.get("last_date") if checkpoint and watermark is not None else None)
+    for pending in _pending_pages(db, table, view, watermark, page_size):
+        processed += len(pending)
+        inserted, failed = write_tails(db, extract_tails_batch(pending), layout)
+        total += inserted
+        for d in pending:
+            if d["id"] in failed:
+                first_failed = d["id"] if first_failed is None else min(first_failed, d["id"])
+            elif first_failed is None:
+                last_ok = (d["id"], d["draw_date"])
+        print(f"  ✅ id {pending[0]['id']} → {pending[-1]['id']} | {len(pending)} draws | {inserted} rows")
+
+    # Watermark chỉ tiến tới trước kỳ lỗi đầu tiên; không lỗi → tới id lớn nhất đã chốt
+    if first_failed is None and max_id is not None and (last_ok[0] is None or max_id > last_ok[0]):
+        last_ok = (max_id, max_date)
+    if checkpoint is not None or last_ok[0] is not None:
         try:
-            db.supabase.table("tails_2d").insert(tails).execute()
-            inserted += len(tails)
+            db.save_sync_checkpoint(checkpoint_name, last_ok[0], last_ok[1], rows_processed=total)
         except Exception as e:
-            print(f"  ❌ Draw {draw['id']}: {e}")
-
-    if inserted > 0:
-        print(f"  ✅ {target_date} | {label} | {len(draws)} draws | {inserted} tails")
-    return inserted
+            print(f"  ⚠️  Không ghi được checkpoint: {e}")
 
+    print(f"  Đã xử lý: {processed} draws | {total} rows | checkpoint id={last_ok[0]} "
+          f"| {time.perf_counter() - started:.1f}s")
+    return total
 
 
 def main():
     parser = argparse.ArgumentParser(description="Build tails_2d from lottery_draws")
-    parser.add_argument("--backfill", action="store_true", help="Backfill toàn bộ lịch sử")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Quét mọi kỳ chưa có tails (bỏ qua watermark)")
     parser.add_argument("--date", type=str, help="Xử lý ngày cụ thể (YYYY-MM-DD)")
     args = parser.parse_args()
 
@@ -84,43 +246,14 @@ def main():
 
     elif args.backfill:
         print("🔄 Backfilling all tails_2d from lottery_draws...")
-
-        # Lấy set draw_ids đã có trong tails_2d
-        done_ids_result = db.supabase.table("tails_2d").select("draw_id").execute()
-        done_ids = {r["draw_id"] for r in done_ids_result.data}
-        print(f"  tails_2d hiện có: {len(done_ids)} draw_ids đã xử lý")
-
-        # Lấy tất cả draws chưa có trong tails_2d (theo batches 1000)
-        all_draws = []
-        offset = 0
-        while True:
-            batch = db.supabase.table("lottery_draws")\
-                .select("id,draw_date,region")\
-                .order("draw_date")\
-                .range(offset, offset + 999)\
-                .execute().data
-            if not batch:
-                break
-            all_draws.extend(batch)
-            offset += 1000
-            if len(batch) < 1000:
-                break
-
-        pending = [d for d in all_draws if d["id"] not in done_ids]
-        print(f"  lottery_draws total: {len(all_draws)} | Cần xử lý: {len(pending)}")
-
-        # Nhóm theo date để insert cùng lúc
-        from itertools import groupby
-        for draw_date, group in groupby(pending, key=lambda d: d["draw_date"]):
-            total += build_tails_for_date(db, date.fromisoformat(draw_date))
+        total = sync_tails(db, full=True)
 
     else:
-        # Nightly: xử lý ngày hôm nay
-        target = date.today()
-        print(f"🌙 Nightly build tails for {target}...")
-        total = build_tails_for_date(db, target)
+        # Nightly: mọi kỳ mới sau checkpoint (kể cả các ngày bị lỡ)
+        print("🌙 Nightly tails sync...")
+        total = sync_tails(db)
 
-    print(f"\n✅ Done. Total tails inserted/updated: {total}")
+    print(f"\n✅ Done. Total {SYNC_TARGETS[tails_layout()][0]} rows inserted/updated: {total}")
 
 
 
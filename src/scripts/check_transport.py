@@ -0,0 +1,127 @@
+"""
+check_transport.py
+Kiểm tra CrawlerTransport tải được trang HTTPS với kiểm tra chứng chỉ bật.
+
+Dựng 1 server TLS local (chứng chỉ tự ký cho 'localhost', tạo bằng openssl CLI) rồi GET
+https://localhost:<port>/ qua transport với verify=<chứng chỉ đó>:
+  - SNI + hostname trong chứng chỉ phải khớp 'localhost' (không phải IP đã resolve)
+  - server chỉ nghe 127.0.0.1 → nếu localhost resolve ra ::1 trước, urllib3 phải tự thử tiếp IPv4
+  - request thứ 2 phải reuse kết nối keep-alive, timing có đủ các pha
+
+Usage:
+    python src/scripts/check_transport.py
+    # Thêm 1 URL thật (cần network)
+    python src/scripts/check_transport.py --url https://www.minhngoc.net/
+"""
+
+import argparse
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.crawler.transport import CrawlerTransport
+
+BODY = b"<html><body>ok</body></html>"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_cert(workdir: str) -> tuple:
+    """Chứng chỉ tự ký CN/SAN = localhost. Trả về (cert_path, key_path)."""
+    cert, key = os.path.join(workdir, "cert.pem"), os.path.join(workdir, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", key, "-out", cert, "-subj", "/CN=localhost",
+         "-addext", "subjectAltName=DNS:localhost"],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+def check_local_tls() -> bool:
+    if shutil.which("openssl") is None:
+        print("⏭️  Bỏ qua check TLS local: không có openssl CLI")
+        return True
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cert, key = make_cert(workdir)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        url = f"https://localhost:{server.server_address[1]}/"
+        transport = CrawlerTransport(retries=0)
+        try:
+            first = transport.get(url, verify=cert)
+            second = transport.get(url, verify=cert)
+        except Exception as e:
+            print(f"❌ HTTPS {url} qua transport lỗi: {e}")
+            return False
+        finally:
+            transport.close()
+            server.shutdown()
+            server.server_close()
+
+    ok = True
+    for name, passed in (
+        ("status 200", first.status_code == 200 and second.status_code == 200),
+        ("body đầy đủ", first.content == BODY and second.content == BODY),
+        ("kết nối đầu là kết nối mới", not first.timing["reused"]),
+        ("request 2 reuse kết nối", second.timing["reused"]),
+        ("có timing dns/connect/ttfb/download",
+         all(k in first.timing for k in ("dns", "connect", "ttfb", "download"))),
+    ):
+        print(f"  {'✅' if passed else '❌'} {name}")
+        ok &= passed
+    print(f"{'✅' if ok else '❌'} HTTPS local (verify chứng chỉ 'localhost'): {first.timing}")
+    return ok
+
+
+def check_url(url: str) -> bool:
+    transport = CrawlerTransport()
+    try:
+        response = transport.get(url)
+    except Exception as e:
+        print(f"❌ {url}: {e}")
+        return False
+    finally:
+        transport.close()
+    print(f"{'✅' if response.ok else '❌'} {url}: HTTP {response.status_code} | {response.timing}")
+    return response.ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra CrawlerTransport với HTTPS + verify chứng chỉ")
+    parser.add_argument("--url", action="append", default=[],
+                        help="URL HTTPS thật để kiểm tra thêm (cần network, lặp lại được)")
+    args = parser.parse_args()
+
+    ok = check_local_tls()
+    for url in args.url:
+        ok &= check_url(url)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
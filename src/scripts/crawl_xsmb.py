@@ -1,6 +1,7 @@
 """
 Script crawl XSMB (Miền Bắc) - chạy bởi GitHub Actions job 01
 """
+import argparse
 import asyncio
 import sys
 import os
@@ -9,13 +10,15 @@ from datetime import datetime, timedelta
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from src.crawler.xsmb_crawler import XSMBCrawler
+from src.crawler.page_cache import DEFAULT_CACHE_DIR, configure_page_cache
 from src.database.supabase_client import LotteryDB
 from src.bot.telegram_bot import LotteryNotifier
 
 
-async def main():
+async def main(args):
     print('🚀 Starting XSMB crawler...')
 
+    configure_page_cache(None if args.no_cache else args.cache_dir, replay=args.replay)
     crawler = XSMBCrawler()
     db = LotteryDB()
     try:
@@ -26,7 +29,7 @@ async def main():
 
     # Use Vietnam Time (UTC+7)
     vn_time = datetime.utcnow() + timedelta(hours=7)
-    today = vn_time.date()
+    today = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else vn_time.date()
     print(f'Current Vietnam Time: {vn_time}')
     print(f'Crawling for date: {today}')
 
@@ -80,4 +83,15 @@ async def main():
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description='Crawl XSMB results')
+    parser.add_argument('--date', type=str, default=None,
+                        help='Ngày cần crawl YYYY-MM-DD (default: hôm nay theo giờ VN)')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR,
+                        help=f'Thư mục cache HTML (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true', help='Không đọc/ghi cache HTML')
+    parser.add_argument('--replay', action='store_true',
+                        help='Chỉ parse lại từ cache HTML, không gọi network')
+    args = parser.parse_args()
+    if args.replay and args.no_cache:
+        parser.error('--replay cần cache, không dùng chung với --no-cache')
+    asyncio.run(main(args))
@@ -1,6 +1,7 @@
 """
 Script crawl XSMN (Miền Nam) - chạy bởi GitHub Actions job 01
 """
+import argparse
 import asyncio
 import sys
 import os
@@ -9,13 +10,15 @@ from datetime import datetime, timedelta
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from src.crawler.xsmn_crawler import XSMNCrawler
+from src.crawler.page_cache import DEFAULT_CACHE_DIR, configure_page_cache
 from src.database.supabase_client import LotteryDB
 from src.bot.telegram_bot import LotteryNotifier
 
 
-async def main():
+async def main(args):
     print('🚀 Starting XSMN crawler...')
 
+    configure_page_cache(None if args.no_cache else args.cache_dir, replay=args.replay)
     crawler = XSMNCrawler()
     db = LotteryDB()
     try:
@@ -26,7 +29,7 @@ async def main():
 
     # Use Vietnam Time (UTC+7)
     vn_time = datetime.utcnow() + timedelta(hours=7)
-    today = vn_time.date()
+    today = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else vn_time.date()
     print(f'Current Vietnam Time: {vn_time}')
     print(f'Crawling for date: {today}')
 
@@ -35,13 +38,14 @@ async def main():
 
     success_count = 0
     if results_list:
-        for res in results_list:
-            try:
-                db.upsert_draw(res)
+        # 1 request cho tất cả đài trong ngày
+        outcomes = db.upsert_draws(results_list)
+        for res, outcome in zip(results_list, outcomes):
+            if outcome['ok']:
                 success_count += 1
                 print(f"   ✅ Saved {res['province']}")
-            except Exception as e:
-                print(f"   ❌ Error saving {res['province']}: {e}")
+            else:
+                print(f"   ❌ Error saving {res['province']}: {outcome['error']}")
 
     if success_count > 0:
         db.log_crawler_status({
@@ -73,4 +77,15 @@ async def main():
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description='Crawl XSMN results')
+    parser.add_argument('--date', type=str, default=None,
+                        help='Ngày cần crawl YYYY-MM-DD (default: hôm nay theo giờ VN)')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR,
+                        help=f'Thư mục cache HTML (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true', help='Không đọc/ghi cache HTML')
+    parser.add_argument('--replay', action='store_true',
+                        help='Chỉ parse lại từ cache HTML, không gọi network')
+    args = parser.parse_args()
+    if args.replay and args.no_cache:
+        parser.error('--replay cần cache, không dùng chung với --no-cache')
+    asyncio.run(main(args))
@@ -0,0 +1,102 @@
+"""
+migrate_pair_features.py
+Chuyển pair_features (1 row / cặp) sang pair_features_compact (1 row / ngày / đài, mảng 100 phần tử)
+và kiểm tra 2 layout đọc ra giống hệt nhau.
+
+Trên Supabase có thể chạy thẳng phần INSERT ... SELECT của
+database/migrations/04_create_pair_features_compact.sql; script này làm cùng việc qua API
+(dùng được cả với backend SQLite offline) rồi so sánh cột theo (feature_date, pair).
+
+Usage:
+  python src/scripts/migrate_pair_features.py                 # convert mọi station
+  python src/scripts/migrate_pair_features.py --verify-only   # chỉ so sánh 2 layout
+  python src/scripts/migrate_pair_features.py --region XSMN --province tp-hcm
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from src.database.supabase_client import LotteryDB
+from src.features.feature_builder import COMPACT_ARRAY_COLS, COMPACT_TABLE, encode_compact
+from src.scripts.build_features import STATIONS, UPSERT_CHUNK
+
+COMPARE_COLS = ["feature_date", "pair", *COMPACT_ARRAY_COLS, "is_even", "is_high", "sum_digits", "day_of_week", "hit"]
+
+
+def convert_station(db: LotteryDB, region: str, province: str | None) -> int:
+    """Gom rows pair_features của 1 station theo ngày → upsert pair_features_compact. Trả về số ngày ghi được."""
+    days, skipped = [], 0
+    current = []
+    for row in db.stream("pair_features", columns="*", filters={"region": region, "province": province},
+                         key=("feature_date", "pair", "id")):
+        if current and row["feature_date"] != current[0]["feature_date"]:
+            days.append(current)
+            current = []
+        current.append(row)
+    if current:
+        days.append(current)
+
+    payload = []
+    for rows in days:
+        try:
+            payload.append(encode_compact(rows, region, province))
+        except ValueError:
+            skipped += 1  # ngày thiếu / thừa cặp — giống HAVING count(*) = 100 của migration
+
+    outcomes = db.upsert_many(COMPACT_TABLE, payload, on_conflict="feature_date,region,province",
+                              chunk_size=UPSERT_CHUNK // 100)
+    saved = sum(1 for o in outcomes if o["ok"])
+    print(f"  ✅ {region}/{province or 'all'} | {saved}/{len(days)} ngày" + (f" | bỏ qua {skipped}" if skipped else ""))
+    return saved
+
+
+def verify_station(db: LotteryDB, region: str, province: str | None) -> bool:
+    """Đọc 1 station qua cả 2 layout (stream_pair_features) và so sánh từng cột."""
+    label = f"{region}/{province or 'all'}"
+    loaded = {}
+    for layout in ("rows", "compact"):
+        chunks = list(db.stream_pair_features(COMPARE_COLS, filters={"region": region, "province": province},
+                                              layout=layout))
+        loaded[layout] = {col: np.concatenate([c[col] for c in chunks]) if chunks else np.array([])
+                          for col in COMPARE_COLS}
+
+    rows, compact = loaded["rows"], loaded["compact"]
+    if len(rows["pair"]) != len(compact["pair"]):
+        print(f"  ❌ {label}: rows={len(rows['pair'])} vs compact={len(compact['pair'])}")
+        return False
+    bad = [col for col in COMPARE_COLS if rows[col].tolist() != compact[col].tolist()]
+    if bad:
+        print(f"  ❌ {label}: lệch cột {bad}")
+        return False
+    print(f"  ✅ {label}: {len(rows['pair'])} rows khớp")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pair_features → pair_features_compact")
+    parser.add_argument("--verify-only", action="store_true", help="Chỉ so sánh 2 layout, không ghi")
+    parser.add_argument("--region", type=str, help="Chỉ 1 region (XSMB / XSMN)")
+    parser.add_argument("--province", type=str, help="Chỉ 1 province (cùng --region)")
+    args = parser.parse_args()
+
+    db = LotteryDB()
+    stations = [(args.region, args.province)] if args.region else STATIONS
+
+    if not args.verify_only:
+        print(f"🔄 Converting pair_features → {COMPACT_TABLE} ({len(stations)} stations)...")
+        total = sum(convert_station(db, region, province) for region, province in stations)
+        print(f"  Đã ghi {total} ngày")
+
+    print("🔍 Verifying rows vs compact...")
+    ok = all([verify_station(db, region, province) for region, province in stations])
+    print("\n✅ Done." if ok else "\n❌ Có station lệch giữa 2 layout.")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,13 @@
 predict_v3.py
 Dự đoán 3 cặp số (00–99) cho mỗi đài hôm nay bằng XGBoost.
 
-Flow:
+Flow (batch cho tất cả đài):
   1. Xác định các đài cần dự đoán hôm nay
-  2. Với mỗi đài: load model .pkl từ Supabase Storage (cache local)
-  3. Build feature vector 100 cặp cho ngày D
-  4. top_k(k=3) → 3 cặp số
-  5. Upsert vào prediction_results
+  2. 1 query model_registry → model active của mọi đài; load mỗi model 1 lần
+     (cache đĩa data/model_cache giữa các lần chạy — model không đổi không tải lại)
+  3. 1 query pair_features → feature vector 100 cặp ngày D của mọi đài
+  4. Mỗi model: predict 1 lần trên ma trận feature ghép → top_k(k=3) từng đài
+  5. 1 bulk upsert vào prediction_results
   6. Gửi 1 Telegram XSMB + 1 Telegram XSMN gộp tất cả đài
 
 Usage:
@@ -19,7 +20,6 @@ import argparse
 import asyncio
 import os
 import sys
-import tempfile
 from datetime import date, datetime, timedelta
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
@@ -28,107 +28,111 @@ import pandas as pd
 
 from src.database.supabase_client import LotteryDB
 from src.models.xgb_model import LotteryXGB, FEATURE_COLS
+from src.utils.model_cache import ModelCache, registry_fingerprint
 from src.utils.storage import LotteryStorage
 from src.bot.telegram_bot import LotteryNotifier
 from src.crawler.xsmn_crawler import XSMNCrawler
-from src.features.feature_builder import _extract_history, build_features_for_day
+from src.features.feature_builder import build_features_for_day
+from src.utils.draw_calendar import DrawCalendar
 
 HISTORY_DAYS = 100  # số kỳ lịch sử để build feature
 
-# Cache model đã download trong session
+# Model đã load trong process (key = (file_path, fingerprint)); file model cache trên đĩa qua ModelCache
 _model_cache: dict = {}
 
 
-def get_active_model(db: LotteryDB, region: str, province: str | None, weekday: int | None = None) -> dict | None:
-    """Lấy model active mới nhất từ model_registry.
-    
-    Ưu tiên:
-    1. Model weekday-specific (weekday == target weekday)
-    2. Fallback: model cũ không có weekday (weekday IS NULL)
-    """
-    def _build_base_query():
-        q = db.supabase.table("model_registry")\
-            .select("*")\
-            .eq("region", region)\
-            .eq("status", "active")\
-            .order("trained_at", desc=True)\
-            .limit(1)
-        if province:
-            q = q.eq("province", province)
-        else:
-            q = q.is_("province", "null")
-        return q
+Station = tuple  # (region, province | None)
+
 
-    # 1. Tìm model weekday-specific
-    if weekday is not None:
-        result = _build_base_query().eq("weekday", weekday).execute()
-        if result.data:
-            return result.data[0]
+def get_active_models(db: LotteryDB, stations: list[Station], weekday: int) -> dict[Station, dict]:
+    """Lấy model active cho tất cả đài bằng 1 query model_registry.
 
-    # 2. Fallback: model không có weekday (legacy)
-    result = _build_base_query().is_("weekday", "null").execute()
-    return result.data[0] if result.data else None
+    Với mỗi đài, ưu tiên:
+    1. Model weekday-specific (weekday == target weekday) mới nhất
+    2. Fallback: model cũ không có weekday (weekday IS NULL) mới nhất
+    """
+    wanted = set(stations)
+    rows = db.stream(
+        "model_registry",
+        filters={"status": "active", "region": sorted({region for region, _ in stations})},
+        where=lambda q: q.or_(f"weekday.eq.{weekday},weekday.is.null"),
+        key=("id",),
+    )
+
+    best: dict[Station, dict] = {}
+    for row in rows:
+        station = (row["region"], row["province"])
+        if station not in wanted:
+            continue
+        rank = (row.get("weekday") is not None, row.get("trained_at") or "")
+        current = best.get(station)
+        if current is None or rank > (current.get("weekday") is not None, current.get("trained_at") or ""):
+            best[station] = row
+    return best
 
 
 def load_model_cached(
     storage: LotteryStorage,
-    file_path: str,
-    tmpdir: str,
+    registry: dict,
+    model_cache: ModelCache,
 ) -> LotteryXGB | None:
-    """Download và load model, cache trong session."""
-    if file_path in _model_cache:
-        return _model_cache[file_path]
-
-    local_path = os.path.join(tmpdir, os.path.basename(file_path))
-    if not storage.download_model(file_path, local_path):
+    """Load model của 1 row registry: RAM (trong run) → cache đĩa (giữa các run) → Supabase Storage."""
+    file_path = registry["file_path"]
+    fingerprint = registry_fingerprint(registry)
+    if (file_path, fingerprint) in _model_cache:
+        return _model_cache[(file_path, fingerprint)]
+
+    local_path = model_cache.get(
+        file_path, fingerprint, fetch=lambda tmp_path: storage.download_model(file_path, tmp_path)
+    )
+    if local_path is None:
         return None
 
     model = LotteryXGB()
-    model.load(local_path)
-    _model_cache[file_path] = model
+    try:
+        model.load(local_path)
+    except Exception as e:
+        print(f"  ❌ Model cache hỏng ({file_path}): {e}")
+        model_cache.invalidate(file_path, fingerprint)
+        return None
+    _model_cache[(file_path, fingerprint)] = model
     return model
 
 
-def get_feature_df(db: LotteryDB, region: str, province: str | None, target_date: date) -> pd.DataFrame | None:
+def get_feature_frames(db: LotteryDB, stations: list[Station], target_date: date) -> dict[Station, pd.DataFrame]:
     """
-    Ưu tiên lấy từ pair_features DB (đã build sẵn).
-    Fallback: tính on-the-fly từ tails_2d.
+    Feature 100 cặp của ngày D cho tất cả đài.
+    Ưu tiên lấy từ pair_features DB (1 query cho mọi đài, layout rows hoặc compact).
+    Fallback: tính on-the-fly từ tails cho đài chưa có sẵn.
     """
-    # Try DB first
-    query = db.supabase.table("pair_features")\
-        .select(",".join(FEATURE_COLS + ["pair"]))\
-        .eq("feature_date", target_date.isoformat())\
-        .eq("region", region)\
-        .order("pair")
-
-    if province:
-        query = query.eq("province", province)
-    else:
-        query = query.is_("province", "null")
-
-    result = query.execute()
-    if result.data and len(result.data) == 100:
-        return pd.DataFrame(result.data)
-
-    # Fallback: build on-the-fly
-    print(f"  ⚠️  pair_features không có sẵn, tính on-the-fly...")
-    q2 = db.supabase.table("tails_2d")\
-        .select("draw_date,tail_2d")\
-        .eq("region", region)\
-        .lt("draw_date", target_date.isoformat())\
-        .order("draw_date", desc=True)\
-        .limit(HISTORY_DAYS * 30)
-
-    if province:
-        q2 = q2.eq("province", province)
-    else:
-        q2 = q2.is_("province", "null")
-
-    history_rows = q2.execute().data
-    if not history_rows:
-        return None
-
-    history_df = _extract_history(history_rows, max_rows=HISTORY_DAYS)
+    if not stations:
+        return {}
+    wanted = set(stations)
+    pages = [pd.DataFrame(chunk) for chunk in db.stream_pair_features(
+        FEATURE_COLS + ["pair", "region", "province"],
+        filters={"feature_date": target_date, "region": sorted({region for region, _ in stations})},
+    )]
+
+    frames: dict[Station, pd.DataFrame] = {}
+    if pages:
+        df = pd.concat(pages, ignore_index=True)
+        for (region, province), group in df.groupby(["region", "province"], dropna=False, sort=False):
+            station = (region, None if pd.isna(province) else province)
+            if station in wanted and len(group) == 100:
+                frames[station] = group.sort_values("pair").reset_index(drop=True)
+
+    for station in stations:
+        if station not in frames:
+            feat_df = build_feature_df_on_the_fly(db, *station, target_date)
+            if feat_df is not None:
+                frames[station] = feat_df
+    return frames
+
+
+def build_feature_df_on_the_fly(db: LotteryDB, region: str, province: str | None, target_date: date) -> pd.DataFrame | None:
+    """Tính feature từ tails (tails_2d / draw_tails) khi pair_features chưa có ngày D."""
+    print(f"  ⚠️  {region}/{province or 'all'}: pair_features không có sẵn, tính on-the-fly...")
+    history_df = db.tail_history(region, province, before=target_date, limit=HISTORY_DAYS)
     if len(history_df) < 5:
         return None
 
@@ -136,63 +140,77 @@ def get_feature_df(db: LotteryDB, region: str, province: str | None, target_date
     return pd.DataFrame(feature_rows)
 
 
-async def predict_station(
+def predict_stations(
     db: LotteryDB,
     storage: LotteryStorage,
-    region: str,
-    province: str | None,
+    stations: list[Station],
     target_date: date,
-    tmpdir: str,
-) -> dict | None:
+    model_cache: ModelCache,
+) -> list[dict]:
     """
-    Predict top-3 pairs cho 1 station.
-    Returns: {'pair_1': int, 'pair_2': int, 'pair_3': int, 'prob_1': float, ...}
+    Predict top-3 pairs cho nhiều đài cùng lúc:
+      1 query registry + 1 query pair_features cho tất cả đài,
+      mỗi model chỉ load 1 lần và predict 1 lần trên ma trận feature ghép của các đài dùng nó.
+
+    Returns: list row prediction_results theo thứ tự `stations` (bỏ qua đài lỗi)
     """
-    label = f"{region}/{province or 'all'}"
     weekday = target_date.weekday()  # 0=Mon..6=Sun
 
-    # 1. Lấy model (uu tien weekday-specific, fallback legacy)
-    registry = get_active_model(db, region, province, weekday)
-    if not registry:
-        print(f"  ⚠️  {label}: không có model active")
-        return None
-
-    model_wd = registry.get("weekday")
-    wd_note = f" [wd={model_wd}]" if model_wd is not None else " [legacy]"
-    model = load_model_cached(storage, registry["file_path"], tmpdir)
-    if model is None:
-        print(f"  ❌ {label}: không load được model{wd_note}")
-        return None
-
-    # 2. Lấy feature vector
-    feat_df = get_feature_df(db, region, province, target_date)
-    if feat_df is None or len(feat_df) < 100:
-        print(f"  ❌ {label}: không đủ feature data")
-        return None
-
-    # 3. Predict top-3
-    top3 = model.top_k(feat_df, k=3)
-    pair_1, prob_1 = top3[0]
-    pair_2, prob_2 = top3[1]
-    pair_3, prob_3 = top3[2]
-
-    print(f"  ✅ {label}{wd_note}: [{pair_1:02d}, {pair_2:02d}, {pair_3:02d}] probs=[{prob_1:.3f}, {prob_2:.3f}, {prob_3:.3f}]")
-
-    return {
-        "prediction_date": target_date.isoformat(),
-        "region":   region,
-        "province": province,
-        "pair_1":   pair_1,
-        "pair_2":   pair_2,
-        "pair_3":   pair_3,
-        "prob_1":   prob_1,
-        "prob_2":   prob_2,
-        "prob_3":   prob_3,
-        "model_version": registry["version"],
-        "hit":      None,
-        "matched_pairs": None,
-        "tail_set": None,
-    }
+    # 1. Model cho mọi đài (ưu tiên weekday-specific, fallback legacy)
+    registries = get_active_models(db, stations, weekday)
+    for region, province in stations:
+        if (region, province) not in registries:
+            print(f"  ⚠️  {region}/{province or 'all'}: không có model active")
+
+    # 2. Feature vector cho các đài có model
+    features = get_feature_frames(db, [s for s in stations if s in registries], target_date)
+
+    # 3. Gom đài theo model → 1 lần predict cho mỗi model
+    by_model: dict[tuple, list[Station]] = {}
+    for station in stations:
+        if station not in registries:
+            continue
+        if station not in features or len(features[station]) < 100:
+            print(f"  ❌ {station[0]}/{station[1] or 'all'}: không đủ feature data")
+            continue
+        registry = registries[station]
+        by_model.setdefault((registry["file_path"], registry_fingerprint(registry)), []).append(station)
+
+    results: dict[Station, dict] = {}
+    for (file_path, _), group in by_model.items():
+        model = load_model_cached(storage, registries[group[0]], model_cache)
+        if model is None:
+            for region, province in group:
+                print(f"  ❌ {region}/{province or 'all'}: không load được model {file_path}")
+            continue
+
+        X = pd.concat([features[station] for station in group], ignore_index=True)
+        for station, top3 in zip(group, model.top_k_batch(X, k=3)):
+            registry = registries[station]
+            model_wd = registry.get("weekday")
+            wd_note = f" [wd={model_wd}]" if model_wd is not None else " [legacy]"
+            (pair_1, prob_1), (pair_2, prob_2), (pair_3, prob_3) = top3
+            region, province = station
+            print(f"  ✅ {region}/{province or 'all'}{wd_note}: [{pair_1:02d}, {pair_2:02d}, {pair_3:02d}] "
+                  f"probs=[{prob_1:.3f}, {prob_2:.3f}, {prob_3:.3f}]")
+
+            results[station] = {
+                "prediction_date": target_date.isoformat(),
+                "region":   region,
+                "province": province,
+                "pair_1":   pair_1,
+                "pair_2":   pair_2,
+                "pair_3":   pair_3,
+                "prob_1":   prob_1,
+                "prob_2":   prob_2,
+                "prob_3":   prob_3,
+                "model_version": registry["version"],
+                "hit":      None,
+                "matched_pairs": None,
+                "tail_set": None,
+            }
+
+    return [results[station] for station in stations if station in results]
 
 
 async def main():
@@ -215,31 +233,36 @@ async def main():
     all_results = {"XSMB": None, "XSMN": []}
     date_str = target_date.strftime("%d/%m/%Y")
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        print(f"\n📅 Predicting for {target_date}")
-        print("=" * 50)
-
-        # 1. XSMB
-        print("\n🎯 XSMB:")
-        xsmb_result = await predict_station(db, storage, "XSMB", None, target_date, tmpdir)
-        if xsmb_result:
-            all_results["XSMB"] = xsmb_result
-            db.supabase.table("prediction_results").upsert(
-                xsmb_result, on_conflict="prediction_date,region,province"
-            ).execute()
-
-        # 2. XSMN — các đài hôm nay
-        crawler = XSMNCrawler()
-        provinces = crawler.get_provinces_for_date(target_date)
-        print(f"\n🎯 XSMN ({len(provinces)} đài): {provinces}")
-
-        for province in provinces:
-            result = await predict_station(db, storage, "XSMN", province, target_date, tmpdir)
-            if result:
-                all_results["XSMN"].append(result)
-                db.supabase.table("prediction_results").upsert(
-                    result, on_conflict="prediction_date,region,province"
-                ).execute()
+    # Các đài cần dự đoán hôm nay: XSMB + các đài XSMN theo lịch (bỏ ngày nghỉ Tết / NO_DRAW_DATES /
+    # no_draw_dates, cộng kỳ đã quan sát) — cùng lịch với verify_v3 / build_features
+    calendar = DrawCalendar.from_db(db, since=target_date, until=target_date)
+    stations: list[Station] = calendar.stations_on(target_date)
+    provinces = [province for region, province in stations if region == "XSMN"]
+    if not stations:
+        print(f"🎌 {target_date}: không đài nào quay (ngày nghỉ), bỏ qua")
+        return
+
+    print(f"\n📅 Predicting for {target_date}")
+    print("=" * 50)
+    print(f"🎯 XSMB + XSMN ({len(provinces)} đài): {provinces}")
+
+    model_cache = ModelCache()
+    predictions = predict_stations(db, storage, stations, target_date, model_cache)
+    print(f"📦 Model cache: {model_cache.stats['hits']} hits | {model_cache.stats['downloads']} downloads")
+
+    # Ghi tất cả đài trong 1 bulk upsert
+    if predictions:
+        outcomes = db.upsert_many(
+            "prediction_results", predictions, on_conflict="prediction_date,region,province"
+        )
+        saved = sum(1 for o in outcomes if o["ok"])
+        print(f"💾 Saved {saved}/{len(predictions)} predictions")
+
+    for r in predictions:
+        if r["region"] == "XSMB":
+            all_results["XSMB"] = r
+        else:
+            all_results["XSMN"].append(r)
 
     # 3. Gửi Telegram
     # XSMB
@@ -9,6 +9,10 @@ Logic:
 Usage:
   python src/scripts/retrain_weekday_models.py           # trigger qua gh CLI
   python src/scripts/retrain_weekday_models.py --local   # train trực tiếp (không qua GitHub Actions)
+  python src/scripts/retrain_weekday_models.py --local --workers 4 --threads-per-job 2
+
+--local: train song song trong 1 process (src/models/train_scheduler.py),
+data mỗi tỉnh chỉ load 1 lần cho mọi weekday của tỉnh đó.
 """
 
 import argparse
@@ -21,7 +25,11 @@ from datetime import date
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.database.supabase_client import LotteryDB
+from src.features.feature_store import DEFAULT_FEATURE_STORE_DIR, open_feature_store
 from src.bot.telegram_bot import LotteryNotifier
+from src.models.train_scheduler import TrainingScheduler
+from src.scripts.train_xgb import default_version, load_training_data, train_and_register
+from src.utils.storage import LotteryStorage
 
 
 # Map weekday → danh sách tỉnh XSMN quay ngày đó (khớp với verify_v3.py)
@@ -61,23 +69,28 @@ def trigger_via_gh(region: str, province: str, weekday: int) -> bool:
         return False
 
 
-async def train_local(region: str, province: str, weekday: int):
-    """Train trực tiếp tại local (không dùng gh CLI)."""
-    prov_arg = province if province else "all"
-    cmd = [
-        sys.executable,
-        "src/scripts/train_xgb.py",
-        "--region", region,
-        "--province", prov_arg,
-        "--weekday", str(weekday),
-        "--force",  # allow ít data hơn 1000 rows khi train theo weekday
-    ]
-    print(f"\n🚀 Training: {region}/{province} [{DOW_NAMES[weekday]}]")
-    result = subprocess.run(cmd, timeout=600)
-    if result.returncode != 0:
-        print(f"  ❌ Training failed (exit code {result.returncode})")
-        return False
-    return True
+def train_local(db: LotteryDB, jobs: list, workers: int | None, threads_per_job: int, store_dir: str | None) -> list:
+    """Train trực tiếp tại local (không dùng gh CLI): các job chạy song song trong process này."""
+    storage = LotteryStorage()
+    store = open_feature_store(store_dir)
+
+    def train_job(data, job, n_jobs):
+        region, province, weekday = job
+        # --force như trước: cho phép ít data hơn 1000 rows khi train theo weekday
+        return train_and_register(
+            db, storage, data, region, province, weekday, default_version(weekday),
+            min_rows=100, n_jobs=n_jobs,
+        )
+
+    scheduler = TrainingScheduler(
+        load_fn=lambda region, province: load_training_data(db, region, province, store=store),
+        train_fn=train_job,
+        workers=workers,
+        threads_per_job=threads_per_job,
+    )
+    reports = scheduler.run(jobs)
+    scheduler.print_summary(reports)
+    return reports
 
 
 async def main():
@@ -88,6 +101,14 @@ async def main():
                         help="Chỉ train weekday cụ thể (mặc định: tất cả)")
     parser.add_argument("--province", type=str, default=None,
                         help="Chỉ train province cụ thể")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="--local: số model train đồng thời (mặc định: số core / threads-per-job)")
+    parser.add_argument("--threads-per-job", type=int, default=1,
+                        help="--local: số thread XGBoost mỗi model (default: 1)")
+    parser.add_argument("--feature-store", type=str, default=DEFAULT_FEATURE_STORE_DIR,
+                        help=f"--local: snapshot Parquet của pair_features (default: {DEFAULT_FEATURE_STORE_DIR})")
+    parser.add_argument("--no-feature-store", action="store_true",
+                        help="--local: đọc pair_features trực tiếp từ Supabase")
     args = parser.parse_args()
 
     db = LotteryDB()
@@ -111,12 +132,14 @@ async def main():
 
     print("\n" + "=" * 60)
 
-    for wd, prov in jobs:
-        if args.local:
-            ok = await train_local("XSMN", prov, wd)
-        else:
-            ok = trigger_via_gh("XSMN", prov, wd)
+    if args.local:
+        store_dir = None if args.no_feature_store else args.feature_store
+        reports = train_local(db, [("XSMN", prov, wd) for wd, prov in jobs], args.workers, args.threads_per_job, store_dir)
+        outcomes = [report["ok"] for report in reports]
+    else:
+        outcomes = [trigger_via_gh("XSMN", prov, wd) for wd, prov in jobs]
 
+    for (wd, prov), ok in zip(jobs, outcomes):
         if ok:
             triggered.append(f"XSMN/{prov} [{DOW_NAMES[wd]}]")
         else:
@@ -18,130 +18,112 @@ from datetime import date, datetime
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
-import pandas as pd
-from sklearn.model_selection import train_test_split
-
 from src.database.supabase_client import LotteryDB
-from src.models.xgb_model import LotteryXGB, FEATURE_COLS
+from src.features.feature_store import DEFAULT_FEATURE_STORE_DIR, FeatureStore, open_feature_store
+from src.models.training_data import TrainingFrame
+from src.models.xgb_model import LotteryXGB, sidecar_path
 from src.utils.storage import LotteryStorage
 from src.bot.telegram_bot import LotteryNotifier
 
 
 def load_training_data(
-    db: LotteryDB, region: str, province: str | None, weekday: int | None = None
-) -> pd.DataFrame:
+    db: LotteryDB,
+    region: str,
+    province: str | None,
+    weekday: int | None = None,
+    store: FeatureStore | None = None,
+) -> TrainingFrame:
     """
-    Load pair_features từ Supabase cho 1 station (có pagination).
-    Chỉ lấy rows có label hit != NULL.
-    Nếu weekday được chỉ định, chỉ lấy các kỳ có day_of_week == weekday.
+    Load pair_features cho 1 station, chỉ rows có label hit != NULL.
+    Có store: sync phần mới hơn watermark vào snapshot Parquet rồi đọc local;
+    không có: page toàn bộ từ Supabase.
+    Luôn load mọi weekday 1 lần; nếu weekday được chỉ định thì trả về view các kỳ có day_of_week == weekday.
     """
-    label = f"{region}/{province or 'all'}"
-    weekday_label = f" | weekday={weekday}" if weekday is not None else ""
-    print(f"📥 Loading training data: {label}{weekday_label}...")
-
-    cols = ",".join(FEATURE_COLS + ["pair", "feature_date", "hit"])
-    all_data = []
-    offset = 0
-
-    while True:
-        query = db.supabase.table("pair_features")\
-            .select(cols)\
-            .eq("region", region)\
-            .not_.is_("hit", "null")\
-            .order("feature_date")\
-            .range(offset, offset + 999)
-
-        if province:
-            query = query.eq("province", province)
-        else:
-            query = query.is_("province", "null")
-
-        # Filter theo weekday nếu được chỉ định
-        if weekday is not None:
-            query = query.eq("day_of_week", weekday)
-
-        batch = query.execute().data
-        if not batch:
-            break
-        all_data.extend(batch)
-        if len(batch) < 1000:
-            break
-        offset += 1000
-
-    df = pd.DataFrame(all_data)
-    n_ky = len(df) // 100 if len(df) > 0 else 0
-    print(f"  ✅ Loaded {len(df)} rows ({n_ky} kỳ){weekday_label}")
-    return df
+    if store is not None:
+        data = store.load_synced(db, region, province)
+    else:
+        data = TrainingFrame.load(db, region, province)
+    if weekday is not None:
+        data = data.weekday(weekday)
+        print(f"  📆 weekday={weekday}: {len(data)} rows ({data.n_draws} kỳ)")
+    return data
 
 
-def time_based_split(df: pd.DataFrame, val_ratio: float = 0.2):
+def time_based_split(data: TrainingFrame, val_ratio: float = 0.2):
     """Split theo thời gian (không shuffle) để tránh leakage."""
-    dates = sorted(df["feature_date"].unique())
-    split_idx = int(len(dates) * (1 - val_ratio))
-    train_dates = set(dates[:split_idx])
-    val_dates = set(dates[split_idx:])
+    train, val = data.time_split(val_ratio)
+    print(f"  Train: {train.n_draws} kỳ ({len(train)} rows) | Val: {val.n_draws} kỳ ({len(val)} rows)")
+    return train, val
 
-    X_train = df[df["feature_date"].isin(train_dates)][FEATURE_COLS]
-    y_train = df[df["feature_date"].isin(train_dates)]["hit"].astype(int)
-    X_val = df[df["feature_date"].isin(val_dates)][FEATURE_COLS]
-    y_val = df[df["feature_date"].isin(val_dates)]["hit"].astype(int)
 
-    print(f"  Train: {len(train_dates)} kỳ ({len(X_train)} rows) | Val: {len(val_dates)} kỳ ({len(X_val)} rows)")
-    return X_train, y_train, X_val, y_val
+DOW_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
 
-async def main():
-    parser = argparse.ArgumentParser(description="Train XGBoost V3")
-    parser.add_argument("--region", required=True, choices=["XSMB", "XSMN"])
-    parser.add_argument("--province", default=None, help="Slug tỉnh, hoặc 'all' cho XSMB")
-    parser.add_argument("--version", default=None, help="Version string, mặc định = ngày hôm nay")
-    parser.add_argument("--force", action="store_true", help="Force train dù ít dữ liệu (<1000 rows)")
-    parser.add_argument("--weekday", type=int, default=None, choices=list(range(7)),
-                        help="Ngày trong tuần để train riêng (0=T2..6=CN). Mặc định: train tất cả")
-    args = parser.parse_args()
-
-    province = None if args.province in (None, "all", "") else args.province
-    weekday  = args.weekday  # None = không phân biệt
+def default_version(weekday: int | None) -> str:
     wd_suffix = f"_wd{weekday}" if weekday is not None else ""
-    version = args.version or f"v3_{date.today().strftime('%Y%m%d')}{wd_suffix}"
-    label = f"{args.region}/{province or 'all'}"
+    return f"v3_{date.today().strftime('%Y%m%d')}{wd_suffix}"
+
+
+def station_label(region: str, province: str | None, weekday: int | None) -> str:
+    label = f"{region}/{province or 'all'}"
     if weekday is not None:
-        DOW_NAMES = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
         label += f" [{DOW_NAMES[weekday]}]"
+    return label
+
+
+def train_and_register(
+    db: LotteryDB,
+    storage: LotteryStorage,
+    data: TrainingFrame,
+    region: str,
+    province: str | None,
+    weekday: int | None,
+    version: str,
+    min_rows: int = 1000,
+    n_jobs: int | None = None,
+) -> dict:
+    """
+    Train 1 model từ pair_features đã load, upload lên Storage và active trong model_registry.
+    Dùng chung cho CLI (main) và scheduler train song song (retrain_weekday_models --local).
 
-    db = LotteryDB()
-    storage = LotteryStorage()
-    notifier = LotteryNotifier()
-
-    print(f"\n🚀 Training XGBoost V3: {label} | version={version}")
-    print("=" * 60)
+    Args:
+        data: TrainingFrame của đúng station/weekday cần train (view, không copy)
+        n_jobs: số thread XGBoost (None = mặc định của XGBoost)
 
-    # 1. Load data
-    df = load_training_data(db, args.region, province, weekday)
+    Returns:
+        {"ok", "label", "error", "metrics", "storage_path", "dates", "version"}
+    """
+    label = station_label(region, province, weekday)
+    result = {"ok": False, "label": label, "error": None, "metrics": {}, "version": version}
 
-    min_rows = 100 if args.force else 1000
-    if len(df) < min_rows:
-        msg = f"❌ Không đủ data để train {label}: {len(df)} rows (cần ≥ {min_rows})"
-        print(msg)
-        await notifier.send_error_alert(msg)
-        return
+    if len(data) < min_rows:
+        result["error"] = f"Không đủ data để train {label}: {len(data)} rows (cần ≥ {min_rows})"
+        return result
 
     # 2. Split
-    X_train, y_train, X_val, y_val = time_based_split(df)
+    train, val = time_based_split(data)
 
     # 3. Train
-    print("\n🏋️ Training XGBoost...")
+    print(f"\n🏋️ Training XGBoost: {label}...")
     model = LotteryXGB(
         n_estimators=300,
         max_depth=4,
         learning_rate=0.05,
+        n_jobs=n_jobs,
     )
-    metrics = model.train(X_train, y_train, X_val, y_val)
-    print(f"  AUC: {metrics.get('auc', 'N/A')} | Hit@3: {metrics.get('hit_rate_top3', 'N/A')}")
+    metrics = model.train(
+        train.features, train.labels, val.features, val.labels,
+        val_groups=val.feature_date,
+        region=region,
+    )
+    result["metrics"] = metrics
+    print(f"  {label} | AUC: {metrics.get('auc', 'N/A')} | Hit@1: {metrics.get('hit_rate_top1', 'N/A')} | "
+          f"Hit@3: {metrics.get('hit_rate_top3', 'N/A')} | Hit@5: {metrics.get('hit_rate_top5', 'N/A')} | "
+          f"Lãi TB/kỳ (top-3): {metrics.get('profit_mean_top3', 'N/A')}")
 
     # 4. Save model locally
     with tempfile.TemporaryDirectory() as tmpdir:
-        model_filename = f"{province or 'all'}_{version}.pkl"
+        model_filename = f"{province or 'all'}_{version}.ubj"
         local_path = os.path.join(tmpdir, model_filename)
         model.save(local_path)
 
@@ -150,21 +132,25 @@ async def main():
         # Bucket "models" + path "models/XSMN/..." → actual path trong bucket là "models/XSMN/..."
         # (consistent với các model cũ đã lưu theo format này)
         if weekday is not None:
-            region_folder = f"models/{args.region}/wd{weekday}"
+            region_folder = f"models/{region}/wd{weekday}"
         else:
-            region_folder = f"models/{args.region}"
+            region_folder = f"models/{region}"
         storage_path = f"{region_folder}/{model_filename}"
         print(f"\n📤 Uploading to Supabase Storage: {storage_path}...")
-        if not storage.upload_model(local_path, storage_path):
-            msg = f"❌ Upload thất bại cho {label}"
-            print(msg)
-            await notifier.send_error_alert(msg)
-            return
+        # Sidecar meta (feature_cols) upload kèm; predict chỉ cần file .ubj
+        # vì feature_cols cũng được ghi trong booster
+        uploaded = storage.upload_model(local_path, storage_path) and storage.upload_model(
+            sidecar_path(local_path), sidecar_path(storage_path)
+        )
+        if not uploaded:
+            result["error"] = f"Upload thất bại cho {label}"
+            return result
+    result["storage_path"] = storage_path
 
     # 6. Deprecate model cũ (chỉ deprecate model cùng weekday)
     dep_query = db.supabase.table("model_registry")\
         .update({"status": "deprecated"})\
-        .eq("region", args.region)\
+        .eq("region", region)\
         .eq("status", "active")
     if province is not None:
         dep_query = dep_query.eq("province", province)
@@ -178,9 +164,10 @@ async def main():
     dep_query.execute()
 
     # 7. Insert vào model_registry
-    dates_used = sorted(df["feature_date"].unique())
+    dates_used = [str(d) for d in data.dates]
+    result["dates"] = (dates_used[0], dates_used[-1])
     db.supabase.table("model_registry").insert({
-        "region":           args.region,
+        "region":           region,
         "province":         province,
         "weekday":          weekday,       # None = không phân biệt
         "version":          version,
@@ -188,7 +175,7 @@ async def main():
         "file_path":        storage_path,
         "train_start_date": dates_used[0],
         "train_end_date":   dates_used[-1],
-        "train_draws":      len(df) // 100,
+        "train_draws":      data.n_draws,
         "metric_auc":       metrics.get("auc"),
         "metric_hit_rate":  metrics.get("hit_rate_top3"),
         "trained_at":       datetime.utcnow().isoformat(),
@@ -197,7 +184,7 @@ async def main():
     # 8. Update training_queue
     tq_upd = db.supabase.table("training_queue")\
         .update({"status": "done", "completed_at": datetime.utcnow().isoformat()})\
-        .eq("region", args.region)\
+        .eq("region", region)\
         .eq("status", "triggered")
     if province is not None:
         tq_upd = tq_upd.eq("province", province)
@@ -205,16 +192,63 @@ async def main():
         tq_upd = tq_upd.is_("province", "null")
     tq_upd.execute()
 
+    result["ok"] = True
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Train XGBoost V3")
+    parser.add_argument("--region", required=True, choices=["XSMB", "XSMN"])
+    parser.add_argument("--province", default=None, help="Slug tỉnh, hoặc 'all' cho XSMB")
+    parser.add_argument("--version", default=None, help="Version string, mặc định = ngày hôm nay")
+    parser.add_argument("--force", action="store_true", help="Force train dù ít dữ liệu (<1000 rows)")
+    parser.add_argument("--weekday", type=int, default=None, choices=list(range(7)),
+                        help="Ngày trong tuần để train riêng (0=T2..6=CN). Mặc định: train tất cả")
+    parser.add_argument("--feature-store", type=str, default=DEFAULT_FEATURE_STORE_DIR,
+                        help=f"Thư mục snapshot Parquet của pair_features (default: {DEFAULT_FEATURE_STORE_DIR})")
+    parser.add_argument("--no-feature-store", action="store_true",
+                        help="Đọc pair_features trực tiếp từ Supabase (không dùng snapshot)")
+    args = parser.parse_args()
+
+    province = None if args.province in (None, "all", "") else args.province
+    weekday  = args.weekday  # None = không phân biệt
+    version = args.version or default_version(weekday)
+    label = station_label(args.region, province, weekday)
+
+    db = LotteryDB()
+    storage = LotteryStorage()
+    notifier = LotteryNotifier()
+
+    print(f"\n🚀 Training XGBoost V3: {label} | version={version}")
+    print("=" * 60)
+
+    # 1. Load data
+    store = None if args.no_feature_store else open_feature_store(args.feature_store)
+    data = load_training_data(db, args.region, province, weekday, store=store)
+
+    # 2–8. Split, train, upload, registry
+    result = train_and_register(
+        db, storage, data, args.region, province, weekday, version,
+        min_rows=100 if args.force else 1000,
+    )
+    if not result["ok"]:
+        msg = f"❌ {result['error']}"
+        print(msg)
+        await notifier.send_error_alert(msg)
+        return
+
     # 9. Gửi Telegram
+    metrics = result["metrics"]
     hit_pct = int(metrics.get("hit_rate_top3", 0) * 100)
     auc = metrics.get("auc", 0)
+    start_date, end_date = result["dates"]
     wd_info = f" | Weekday: {weekday}" if weekday is not None else ""
     msg = (
         f"✅ <b>Training xong: {label}</b>\n\n"
         f"📊 AUC: <code>{auc}</code>\n"
         f"🎯 Hit@3: <code>{hit_pct}%</code>\n"
-        f"📅 Data: {dates_used[0]} → {dates_used[-1]}{wd_info}\n"
-        f"🔢 Kỳ train: {len(df)//100} | Version: {version}\n\n"
+        f"📅 Data: {start_date} → {end_date}{wd_info}\n"
+        f"🔢 Kỳ train: {data.n_draws} | Version: {version}\n\n"
         f"<i>Model đã được set active trong registry.</i>"
     )
     await notifier.send_message(msg)
@@ -7,7 +7,7 @@ TAIL_SET = tất cả 2 số cuối mọi giải của đài đó trong ngày đ
 
 Flow:
   1. Lấy prediction_results của hôm nay (chưa verify)
-  2. Với mỗi đài: build TAIL_SET từ tails_2d
+  2. Với mỗi đài: build TAIL_SET từ tails_2d (hoặc draw_tails khi TAILS_LAYOUT=bitmap)
   3. Check hit, ghi lại matched_pairs + tail_set
   4. Gửi Telegram: hit/miss report tổng hợp
 
@@ -28,17 +28,21 @@ from src.database.supabase_client import LotteryDB
 from src.bot.telegram_bot import LotteryNotifier
 from src.crawler.xsmn_crawler import XSMNCrawler
 
-# Constants for Profit Calculation
-XSMN_TIER_POINTS = [3, 2, 2]
-XSMN_COST_PER_POINT = 14000
-XSMN_REVENUE_PER_HIT_POINT = 70000
+from src.features.tail_set import TailSet
+from src.utils.draw_calendar import DrawCalendar
+from src.models.evaluation import TIER_SCHEMES
 
-XSMB_TIER_POINTS = [2, 1, 1]
-XSMB_COST_PER_POINT = 23000
-XSMB_REVENUE_PER_HIT_POINT = 80000
+# Constants for Profit Calculation (dùng chung với backtest trong src/models/evaluation.py)
+XSMN_TIER_POINTS = TIER_SCHEMES["XSMN"]["tier_points"]
+XSMN_COST_PER_POINT = TIER_SCHEMES["XSMN"]["cost_per_point"]
+XSMN_REVENUE_PER_HIT_POINT = TIER_SCHEMES["XSMN"]["revenue_per_hit_point"]
 
-def calculate_station_profit(region, pairs, tail_rows):
-    """Calculate cost, revenue, profit, and hit details for a station per pair."""
+XSMB_TIER_POINTS = TIER_SCHEMES["XSMB"]["tier_points"]
+XSMB_COST_PER_POINT = TIER_SCHEMES["XSMB"]["cost_per_point"]
+XSMB_REVENUE_PER_HIT_POINT = TIER_SCHEMES["XSMB"]["revenue_per_hit_point"]
+
+def calculate_station_profit(region, pairs, tail_set: TailSet):
+    """Calculate cost, revenue, profit, and hit details for a station per pair (tail_set: TailSet của đài trong ngày)."""
     region_lower = region.lower()
     if region_lower == "xsmn":
         tie_points = XSMN_TIER_POINTS
@@ -52,14 +56,13 @@ def calculate_station_profit(region, pairs, tail_rows):
         return []
 
     results = []
-    tails_list = [r["tail_2d"] for r in tail_rows]
 
     for idx, pair in enumerate(pairs):
         if pair is None:
             continue
             
         cost = tie_points[idx] * cost_per_pt
-        occurrences = tails_list.count(pair)
+        occurrences = tail_set.count(pair)
         revenue = tie_points[idx] * occurrences * rev_per_pt
         profit = revenue - cost
         
@@ -101,31 +104,26 @@ async def verify_date(db: LotteryDB, notifier: LotteryNotifier, target_date: dat
         return
 
     results_summary = []
+    calendar = DrawCalendar.from_db(db, since=target_date, until=target_date)
 
     for pred in preds:
         region   = pred["region"]
         province = pred["province"]
         label    = f"{region}/{province or 'all'}"
 
-        # Build TAIL_SET từ tails_2d
-        tail_query = db.supabase.table("tails_2d")\
-            .select("tail_2d")\
-            .eq("region", region)\
-            .eq("draw_date", target_date.isoformat())
-
-        if province:
-            tail_query = tail_query.eq("province", province)
-        else:
-            tail_query = tail_query.is_("province", "null")
+        if not calendar.draws_on((region, province), target_date):
+            print(f"  ⚠️  {label}: không quay ngày {target_date} (nghỉ), bỏ qua")
+            continue
 
-        tail_rows = tail_query.execute().data
-        if not tail_rows:
+        # Build TAIL_SET từ tails_2d (hoặc draw_tails: 1 row / kỳ)
+        history = db.tail_history(region, province, on=target_date)
+        if history.empty:
             print(f"  ⚠️  {label}: không có KQXS để verify (holiday?)")
             continue
 
-        tail_set = {r["tail_2d"] for r in tail_rows}
+        tail_set = history["tail_set"].iloc[-1]
         pairs = [pred["pair_1"], pred["pair_2"], pred["pair_3"]]
-        matched = [p for p in pairs if p in tail_set]
+        matched = tail_set.intersection(pairs)
         hit = len(matched) > 0
 
         # Update DB for prediction_results
@@ -133,7 +131,7 @@ async def verify_date(db: LotteryDB, notifier: LotteryNotifier, target_date: dat
             .update({
                 "hit":          hit,
                 "matched_pairs": matched,
-                "tail_set":     list(tail_set),
+                "tail_set":     tail_set.to_db(),
                 "verified_at":  "now()",
             })\
             .eq("id", pred["id"])\
@@ -154,7 +152,7 @@ async def verify_date(db: LotteryDB, notifier: LotteryNotifier, target_date: dat
                 is_tracking_enabled = True
 
         if is_tracking_enabled:
-            pair_results = calculate_station_profit(region, pairs, tail_rows)
+            pair_results = calculate_station_profit(region, pairs, tail_set)
 
             for p_res in pair_results:
                 # Upsert profit_tracking per pair
@@ -0,0 +1,260 @@
+"""
+draw_calendar.py
+Lịch quay: đài nào quay ngày D, kỳ trước / kỳ sau của 1 đài — tra O(1).
+
+Nguồn (theo thứ tự ưu tiên):
+  1. Lịch sử thật (lottery_draws): ngày đã có kết quả thì chắc chắn có quay
+  2. Ngày nghỉ đã biết: Tết Nguyên Đán (TET_DATES × TET_OFF_DAYS), biến môi trường
+     NO_DRAW_DATES (danh sách ISO, cách nhau dấu phẩy), tham số no_draw và bảng no_draw_dates
+     (ngày backfill đã tải trang có thông báo nghỉ — theo region, hoặc đài có lịch tuần nhưng
+     không có trên trang kết quả — theo đài) → không quay
+  3. Lịch tuần: XSMB quay mọi ngày, XSMN theo XSMNCrawler.PROVINCE_SCHEDULE
+
+DrawCalendar dựng sẵn bảng theo ngày trong khoảng [start, end] (mặc định từ kỳ sớm nhất đã
+quan sát tới hôm nay + 1 năm): mỗi đài 1 mảng bool "có quay" và 2 mảng chỉ số kỳ trước / kỳ sau
+→ mỗi truy vấn là 1 lần index mảng. Ngoài khoảng đó thì dò theo lịch tuần (tối đa vài ngày).
+"""
+
+import os
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from src.crawler.xsmn_crawler import XSMNCrawler
+
+Station = Tuple[str, Optional[str]]  # (region, province | None)
+XSMB_STATION: Station = ("XSMB", None)
+
+# Mùng 1 Tết Nguyên Đán (dương lịch)
+TET_DATES = {
+    2019: date(2019, 2, 5),
+    2020: date(2020, 1, 25),
+    2021: date(2021, 2, 12),
+    2022: date(2022, 2, 1),
+    2023: date(2023, 1, 22),
+    2024: date(2024, 2, 10),
+    2025: date(2025, 1, 29),
+    2026: date(2026, 2, 17),
+    2027: date(2027, 2, 6),
+    2028: date(2028, 1, 26),
+    2029: date(2029, 2, 13),
+    2030: date(2030, 2, 3),
+}
+TET_OFF_DAYS = (0, 1, 2)  # nghỉ quay mùng 1–3 (cả 2 miền)
+
+FALLBACK_SEARCH_DAYS = 400  # giới hạn dò ngoài khoảng đã dựng
+
+
+def _as_date(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def tet_holidays() -> Set[date]:
+    """Các ngày nghỉ quay dịp Tết đã biết."""
+    return {tet + timedelta(days=k) for tet in TET_DATES.values() for k in TET_OFF_DAYS}
+
+
+def env_no_draw_dates() -> Set[date]:
+    """Ngày nghỉ bổ sung từ env NO_DRAW_DATES (vd '2026-04-30,2026-05-01')."""
+    raw = os.getenv("NO_DRAW_DATES", "")
+    return {date.fromisoformat(d.strip()) for d in raw.split(",") if d.strip()}
+
+
+def normalize_station(region: str, province: Optional[str]) -> Station:
+    """XSMB là 1 đài quốc gia (province trong lottery_draws chỉ là tỉnh quay ngày đó) → province None."""
+    return (region, None) if region == "XSMB" else (region, province)
+
+
+def all_stations(schedule: Optional[Dict[int, Sequence[str]]] = None) -> List[Station]:
+    """XSMB + các đài XSMN theo thứ tự xuất hiện trong lịch tuần (như STATIONS của build_features)."""
+    schedule = XSMNCrawler.PROVINCE_SCHEDULE if schedule is None else schedule
+    provinces = list(dict.fromkeys(p for weekday in sorted(schedule) for p in schedule[weekday]))
+    return [XSMB_STATION] + [("XSMN", p) for p in provinces]
+
+
+class DrawCalendar:
+    """Lịch quay của mọi đài: stations_on(d), draws_on(station, d), previous_draw / next_draw."""
+
+    def __init__(
+        self,
+        observed: Iterable[Tuple[str, Optional[str], object]] = (),
+        no_draw: Iterable[date] = (),
+        no_draw_by_region: Optional[Dict[str, Iterable[date]]] = None,
+        no_draw_by_station: Optional[Dict[Station, Iterable[date]]] = None,
+        schedule: Optional[Dict[int, Sequence[str]]] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ):
+        """
+        Args:
+            observed: các kỳ đã có (region, province, draw_date) — vd từ lottery_draws
+            no_draw: ngày chắc chắn không quay (ngoài Tết / NO_DRAW_DATES), mọi region
+            no_draw_by_region: {region: [ngày]} không quay của riêng 1 region (vd từ no_draw_dates)
+            no_draw_by_station: {(region, province): [ngày]} không quay của riêng 1 đài (no_draw_dates.province)
+            schedule: lịch tuần XSMN {weekday: [province]} (mặc định XSMNCrawler.PROVINCE_SCHEDULE)
+            start / end: khoảng ngày dựng bảng tra
+        """
+        self.schedule = {wd: list(ps) for wd, ps in (XSMNCrawler.PROVINCE_SCHEDULE if schedule is None else schedule).items()}
+        self.stations = all_stations(self.schedule)
+        self.no_draw = tet_holidays() | env_no_draw_dates() | set(no_draw)
+        self.no_draw_by_region = {region: {_as_date(d) for d in dates} for region, dates in (no_draw_by_region or {}).items()}
+        self.no_draw_by_station = {normalize_station(*station): {_as_date(d) for d in dates}
+                                   for station, dates in (no_draw_by_station or {}).items()}
+
+        self.observed: Dict[Station, Set[date]] = {}
+        self._observed_by_day: Dict[date, Set[Station]] = {}
+        for region, province, draw_date in observed:
+            d = _as_date(draw_date)
+            station = normalize_station(region, province)
+            self.observed.setdefault(station, set()).add(d)
+            self._observed_by_day.setdefault(d, set()).add(station)
+            if station not in self.stations:
+                self.stations.append(station)
+
+        first_seen = min((min(ds) for ds in self.observed.values()), default=None)
+        self.start = start or first_seen or date.today() - timedelta(days=366)
+        self.end = end or date.today() + timedelta(days=366)
+        self._build()
+
+    @classmethod
+    def from_db(
+        cls,
+        db,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        region: Optional[str] = None,
+        load_no_draw: bool = True,
+        **kwargs,
+    ) -> "DrawCalendar":
+        """
+        Lịch kèm các kỳ đã có trong lottery_draws (chỉ đọc draw_date, region, province)
+        và các ngày nghỉ đã xác nhận trong no_draw_dates (load_no_draw=False để bỏ qua).
+        """
+        def where(q):
+            if since:
+                q = q.gte("draw_date", since.isoformat())
+            return q.lte("draw_date", until.isoformat()) if until else q
+
+        filters = {"region": region} if region else None
+        observed = []
+        for chunk in db.stream("lottery_draws", columns="draw_date,region,province", filters=filters, where=where,
+                               key=("draw_date", "id"), output="numpy"):
+            observed.extend(zip(chunk["region"].tolist(), chunk["province"].tolist(), chunk["draw_date"].tolist()))
+
+        no_draw_by_region: Dict[str, Set[date]] = {}
+        no_draw_by_station: Dict[Station, Set[date]] = {}
+        if load_no_draw:
+            try:
+                for row in db.get_no_draw_dates(region=region, since=since, until=until):
+                    d = _as_date(row["draw_date"])
+                    if row.get("province"):
+                        no_draw_by_station.setdefault((row["region"], row["province"]), set()).add(d)
+                    else:
+                        no_draw_by_region.setdefault(row["region"], set()).add(d)
+            except Exception as e:
+                print(f"  ⚠️  Không đọc được no_draw_dates (chưa chạy migration 06 / 07?): {e}")
+
+        kwargs.setdefault("start", since)
+        return cls(observed=observed, no_draw_by_region=no_draw_by_region,
+                   no_draw_by_station=no_draw_by_station, **kwargs)
+
+    # ==================== BUILD ====================
+
+    def _scheduled(self, station: Station, d: date) -> bool:
+        """Theo lịch tuần + ngày nghỉ (không xét lịch sử)."""
+        region, province = station
+        if d in self.no_draw or d in self.no_draw_by_region.get(region, ()):
+            return False
+        if d in self.no_draw_by_station.get(station, ()):
+            return False
+        if region == "XSMB":
+            return True
+        return province in self.schedule.get(d.weekday(), ())
+
+    def _rule(self, station: Station, d: date) -> bool:
+        return d in self.observed.get(station, ()) or self._scheduled(station, d)
+
+    def _build(self):
+        n = max(0, (self.end - self.start).days + 1)
+        days = [self.start + timedelta(days=i) for i in range(n)]
+        matrix = np.array([[self._rule(s, d) for s in self.stations] for d in days], dtype=bool).reshape(n, len(self.stations))
+
+        positions = np.arange(n)
+        self._draws: Dict[Station, np.ndarray] = {}
+        self._prev: Dict[Station, np.ndarray] = {}
+        self._next: Dict[Station, np.ndarray] = {}
+        for k, station in enumerate(self.stations):
+            idx = np.flatnonzero(matrix[:, k])
+            self._draws[station] = matrix[:, k]
+            # kỳ gần nhất < i và > i; -1 = không có trong khoảng đã dựng
+            before = np.searchsorted(idx, positions, side="left") - 1
+            after = np.searchsorted(idx, positions, side="right")
+            padded = np.append(idx, -1)
+            self._prev[station] = np.where(before >= 0, padded[before], -1)
+            self._next[station] = padded[after]
+        self._by_day = [tuple(self.stations[k] for k in np.flatnonzero(row)) for row in matrix]
+
+    def _index(self, d: date) -> Optional[int]:
+        i = (d - self.start).days
+        return i if 0 <= i < len(self._by_day) else None
+
+    # ==================== QUERY ====================
+
+    def stations_on(self, d: date, region: Optional[str] = None) -> List[Station]:
+        """Các đài quay ngày d (lọc theo region nếu có), theo thứ tự self.stations."""
+        i = self._index(d)
+        stations = self._by_day[i] if i is not None else [s for s in self.stations if self._rule(s, d)]
+        return [s for s in stations if region is None or s[0] == region]
+
+    def draws_on(self, station: Station, d: date) -> bool:
+        station = normalize_station(*station)
+        i = self._index(d)
+        if i is None or station not in self._draws:
+            return self._rule(station, d)
+        return bool(self._draws[station][i])
+
+    def region_draws_on(self, region: str, d: date) -> bool:
+        """Có ít nhất 1 đài của region quay ngày d."""
+        return bool(self.stations_on(d, region))
+
+    def scheduled_on(self, d: date, region: Optional[str] = None) -> List[Station]:
+        """Các đài quay ngày d theo lịch tuần + ngày nghỉ, KHÔNG tính kỳ đã quan sát."""
+        return [s for s in self.stations if (region is None or s[0] == region) and self._scheduled(s, d)]
+
+    def observed_on(self, d: date, region: Optional[str] = None) -> Set[Station]:
+        """Các đài đã có kỳ ngày d trong lottery_draws (lọc theo region nếu có)."""
+        return {s for s in self._observed_by_day.get(d, ()) if region is None or s[0] == region}
+
+    def has_observed(self, region: str, d: date) -> bool:
+        """lottery_draws đã có ít nhất 1 kỳ của region ngày d."""
+        return bool(self.observed_on(d, region))
+
+    def missing_on(self, d: date, region: Optional[str] = None) -> List[Station]:
+        """Các đài có lịch quay ngày d (scheduled_on) nhưng chưa có kỳ nào trong lottery_draws."""
+        observed = self.observed_on(d, region)
+        return [s for s in self.scheduled_on(d, region) if s not in observed]
+
+    def previous_draw(self, station: Station, d: date) -> Optional[date]:
+        """Kỳ gần nhất của đài TRƯỚC ngày d."""
+        return self._neighbour(normalize_station(*station), d, self._prev, -1)
+
+    def next_draw(self, station: Station, d: date) -> Optional[date]:
+        """Kỳ gần nhất của đài SAU ngày d."""
+        return self._neighbour(normalize_station(*station), d, self._next, 1)
+
+    def _neighbour(self, station: Station, d: date, table: Dict[Station, np.ndarray], step: int) -> Optional[date]:
+        i = self._index(d)
+        if i is not None and station in table:
+            j = int(table[station][i])
+            if j >= 0:
+                return self.start + timedelta(days=j)
+        # Ngoài khoảng đã dựng (hoặc không có kỳ nào trong khoảng) → dò theo lịch
+        for k in range(1, FALLBACK_SEARCH_DAYS + 1):
+            candidate = d + timedelta(days=step * k)
+            if self._index(candidate) is not None and station in self._draws:
+                if self._draws[station][self._index(candidate)]:
+                    return candidate
+            elif self._rule(station, candidate):
+                return candidate
+        return None
@@ -0,0 +1,184 @@
+"""
+Model Cache
+Cache model trên đĩa dùng chung giữa các lần chạy (và giữa nhiều process).
+
+- Key = model_registry.file_path + fingerprint (version / trained_at / id của registry),
+  nên model không đổi sẽ không bao giờ phải tải lại từ Supabase Storage;
+  train lại ghi đè cùng file_path sẽ có fingerprint mới → tải bản mới.
+- Ghi atomic: tải vào file tạm rồi os.replace, kèm sha256 để phát hiện file hỏng.
+- fcntl.flock: lock theo key khi tải (2 process không tải trùng), lock chung khi dọn cache.
+- LRU theo dung lượng: vượt max_bytes thì xóa các model lâu không dùng nhất.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows: không lock liên process
+    FCNTL_AVAILABLE = False
+
+DEFAULT_MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join("data", "model_cache"))
+DEFAULT_MAX_BYTES = int(float(os.getenv("MODEL_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+
+def registry_fingerprint(registry: Dict) -> str:
+    """Fingerprint của 1 row model_registry: đổi khi model được train lại."""
+    return "|".join(str(registry.get(k) or "") for k in ("version", "trained_at", "id"))
+
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ModelCache:
+    """Cache file model theo (file_path, fingerprint), LRU theo dung lượng."""
+
+    def __init__(self, root: str = DEFAULT_MODEL_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "downloads": 0, "evicted": 0}
+        os.makedirs(os.path.join(root, "locks"), exist_ok=True)
+
+    # ==================== PATHS / LOCKS ====================
+
+    @staticmethod
+    def cache_key(file_path: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{file_path}\0{fingerprint}".encode()).hexdigest()[:32]
+
+    def _blob_path(self, key: str, file_path: str) -> str:
+        ext = os.path.splitext(file_path)[1]
+        return os.path.join(self.root, f"{key}{ext}")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.meta.json")
+
+    @contextlib.contextmanager
+    def _lock(self, name: str):
+        """Lock độc quyền liên process (no-op nếu không có fcntl)."""
+        path = os.path.join(self.root, "locks", f"{name}.lock")
+        with open(path, "a") as f:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if FCNTL_AVAILABLE:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write_meta(self, key: str, meta: Dict):
+        path = self._meta_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def _read_meta(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._meta_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # ==================== API ====================
+
+    def get(self, file_path: str, fingerprint: str, fetch: Callable[[str], bool]) -> Optional[str]:
+        """
+        Đường dẫn local của model; nếu chưa có trong cache thì gọi fetch(tmp_path) để tải.
+
+        Args:
+            file_path: đường dẫn trong Storage (model_registry.file_path)
+            fingerprint: registry_fingerprint(row) — đổi khi model được train lại
+            fetch: hàm tải file về tmp_path, trả về True nếu thành công
+
+        Returns:
+            Đường dẫn file trong cache, hoặc None nếu tải lỗi
+        """
+        key = self.cache_key(file_path, fingerprint)
+        blob = self._blob_path(key, file_path)
+
+        with self._lock(key):
+            meta = self._read_meta(key)
+            if meta is not None and os.path.exists(blob) and os.path.getsize(blob) == meta["size"]:
+                meta["last_used"] = time.time()
+                self._write_meta(key, meta)
+                self.stats["hits"] += 1
+                print(f"📦 Model cache hit: {file_path}")
+                return blob
+
+            tmp_path = f"{blob}.{os.getpid()}.tmp"
+            try:
+                if not fetch(tmp_path):
+                    return None
+                sha256 = _sha256_file(tmp_path)
+                size = os.path.getsize(tmp_path)
+                os.replace(tmp_path, blob)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            self._write_meta(key, {
+                "file_path":   file_path,
+                "fingerprint": fingerprint,
+                "sha256":      sha256,
+                "size":        size,
+                "last_used":   time.time(),
+            })
+            self.stats["downloads"] += 1
+
+        self.evict(keep=key)
+        return blob
+
+    def verify(self, file_path: str, fingerprint: str) -> bool:
+        """Kiểm tra sha256 của file trong cache (True = còn nguyên vẹn)."""
+        key = self.cache_key(file_path, fingerprint)
+        meta = self._read_meta(key)
+        blob = self._blob_path(key, file_path)
+        return meta is not None and os.path.exists(blob) and _sha256_file(blob) == meta["sha256"]
+
+    def invalidate(self, file_path: str, fingerprint: str):
+        """Xóa 1 model khỏi cache (vd file hỏng, không load được)."""
+        key = self.cache_key(file_path, fingerprint)
+        with self._lock(key):
+            for path in (self._blob_path(key, file_path), self._meta_path(key)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def entries(self) -> List[Dict]:
+        """Metadata các model đang cache (kèm 'key')."""
+        result = []
+        for name in os.listdir(self.root):
+            if name.endswith(".meta.json"):
+                key = name[:-len(".meta.json")]
+                meta = self._read_meta(key)
+                if meta is not None:
+                    result.append({**meta, "key": key})
+        return result
+
+    def evict(self, keep: Optional[str] = None):
+        """Xóa model lâu không dùng nhất cho tới khi tổng dung lượng <= max_bytes (trừ key `keep`)."""
+        with self._lock("evict"):
+            entries = sorted(self.entries(), key=lambda m: m["last_used"])
+            total = sum(m["size"] for m in entries)
+            for meta in entries:
+                if total <= self.max_bytes:
+                    break
+                key = meta["key"]
+                if key == keep:
+                    continue
+                with self._lock(key):
+                    for path in (self._blob_path(key, meta["file_path"]), self._meta_path(key)):
+                        if os.path.exists(path):
+                            os.remove(path)
+                total -= meta["size"]
+                self.stats["evicted"] += 1
+                print(f"🗑️  Model cache evict: {meta['file_path']}")
@@ -7,17 +7,24 @@ import os
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from src.database.instrumentation import instrument_client
+from src.database.sqlite_backend import LocalStorageClient, use_sqlite_backend
+
 class LotteryStorage:
     def __init__(self):
         load_dotenv()
+        self.bucket = "models"   # Supabase Storage bucket for V3 models (.ubj + .meta.json, .pkl cũ)
+        if use_sqlite_backend():
+            # Backend offline: bucket "models" là thư mục LOTTERY_STORAGE_DIR/models
+            self.supabase = instrument_client(LocalStorageClient())
+            return
         url = os.getenv("SUPABASE_URL")
         key = os.getenv("SUPABASE_SERVICE_KEY")
-        self.bucket = "models"   # Supabase Storage bucket for V3 .pkl files
         
         if not url or not key:
             raise ValueError("Missing Supabase credentials")
             
-        self.supabase: Client = create_client(url, key)
+        self.supabase: Client = instrument_client(create_client(url, key))
 
     def upload_model(self, local_path: str, storage_path: str):
         """Upload .h5 file to storage"""